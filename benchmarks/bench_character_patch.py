@@ -0,0 +1,73 @@
+"""
+Benchmark: character frame bytes per turn over a scripted 40-turn game,
+sending the full `character_update` every turn against CharacterSync
+(a full update on connect, then JSON Patch deltas or nothing).
+
+    python -m benchmarks.bench_character_patch
+"""
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from web.game.session import GameSession
+from web.game.character_sync import CharacterSync
+
+TURNS = 40
+STARTING_ITEMS = 25
+
+
+def make_session() -> GameSession:
+    session = GameSession("bench", "bench")
+    character = session.player_character
+    character.create_character(
+        name="Aria", lore="A wandering bard who sings of forgotten kings. " * 4,
+        level_and_experience={"level": 3, "experience": 4, "experience_to_next_level": 40},
+        health_and_mana={"current_health": 30, "max_health": 30, "current_mana": 12, "max_mana": 12},
+        equipment={"main_hand": {"name": "Lute", "description": "Well tuned", "weight": 2.0}},
+    )
+    for i in range(STARTING_ITEMS):
+        character.add_item(f"Trinket {i}", f"A small trinket picked up on day {i}", 0.2)
+    return session
+
+
+def play_turn(character, turn: int, rng: random.Random):
+    """Applies what a typical turn does to the character; many turns change nothing."""
+    roll = rng.random()
+    if roll < 0.4:
+        return
+    if roll < 0.7:
+        character.health_and_mana["current_health"] = max(1, character.health_and_mana["current_health"] - 3)
+        character.level_and_experience["experience"] += 2
+    elif roll < 0.9:
+        character.add_item(f"Loot {turn}", "Something found on the road", 1.0)
+    else:
+        character.equip("head", f"Trinket {turn % STARTING_ITEMS}")
+
+
+def main():
+    rng = random.Random(7)
+    session = make_session()
+    sync = CharacterSync()
+    full_bytes = 0
+    for turn in range(TURNS + 1):
+        if turn:
+            play_turn(session.player_character, turn, rng)
+        data = session.get_character_data()
+        full_bytes += len(json.dumps({"type": "character_update", "data": data}).encode("utf-8"))
+        sync.frame(data)
+    stats = sync.stats()
+    print(f"{TURNS} turns plus the connect, {STARTING_ITEMS}+ inventory items")
+    print(f"{'mode':<22}{'frames':>8}{'bytes':>10}{'bytes/turn':>12}")
+    print(f"{'full every turn':<22}{TURNS + 1:>8}{full_bytes:>10}{full_bytes / (TURNS + 1):>12.0f}")
+    frames = stats["full_updates"] + stats["patches"]
+    print(f"{'patches':<22}{frames:>8}{stats['bytes_sent']:>10}{stats['bytes_sent'] / (TURNS + 1):>12.0f}")
+    print(f"unchanged turns skipped: {stats['unchanged']}, "
+          f"bytes saved: {1 - stats['bytes_sent'] / full_bytes:.0%}")
+
+
+if __name__ == "__main__":
+    main()
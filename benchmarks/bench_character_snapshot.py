@@ -0,0 +1,91 @@
+"""
+Benchmark: serialize and restore throughput of a character with a
+1,000-item inventory, for the legacy character dict (inventory saved as
+display text, not restorable), the snapshot encoded with the standard json
+module, and the snapshot encoded with orjson.
+
+    python -m benchmarks.bench_character_snapshot
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.rpg.Character import Character
+
+ITEMS = 1000
+ROUNDS = 200
+
+
+def make_character() -> Character:
+    character = Character()
+    character.create_character(
+        name="Aria", lore="A wandering bard. " * 20,
+        level_and_experience={"level": 7, "experience": 120, "experience_to_next_level": 640},
+        health_and_mana={"current_health": 40, "max_health": 52, "current_mana": 18, "max_mana": 30},
+        equipment={"main_hand": {"name": "Lute", "description": "Well tuned", "weight": 2.0}},
+    )
+    for i in range(ITEMS):
+        character.add_item(f"Item {i}", f"Description of item {i}, found somewhere", 0.5 + i % 7,
+                           amount=1 + i % 3, rarity=("Common", "Rare", "Epic")[i % 3])
+    return character
+
+
+def legacy_dump(character) -> bytes:
+    return json.dumps({
+        "name": character.name,
+        "lore": character.lore,
+        "health": character.see_health_and_mana(),
+        "level": character.see_level_and_experience(),
+        "equipment": character.serialize_equipment(),
+        "inventory": character.see_inventory(),
+    }).encode("utf-8")
+
+
+def legacy_load(data: bytes) -> Character:
+    char = json.loads(data)
+    character = Character()
+    character.create_character(char["name"], char["lore"], char["level"], char["health"], char["equipment"])
+    return character
+
+
+def json_dump(character) -> bytes:
+    return json.dumps(character.to_snapshot(), separators=(",", ":")).encode("utf-8")
+
+
+def json_load(data: bytes) -> Character:
+    return Character.from_snapshot(json.loads(data))
+
+
+FORMATS = (
+    ("legacy dict + json", legacy_dump, legacy_load),
+    ("snapshot + json", json_dump, json_load),
+    ("snapshot + orjson", Character.dump_snapshot, Character.from_snapshot),
+)
+
+
+def throughput(func, arg):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        result = func(arg)
+    return ROUNDS / (time.perf_counter() - start), result
+
+
+def main():
+    character = make_character()
+    print(f"Character with {ITEMS} inventory items, {ROUNDS} rounds per format")
+    print(f"{'format':<22}{'bytes':>10}{'dumps/s':>10}{'loads/s':>10}{'dump MB/s':>11}{'load MB/s':>11}"
+          f"{'items back':>12}")
+    for label, dump, load in FORMATS:
+        dump_rate, data = throughput(dump, character)
+        load_rate, restored = throughput(load, data)
+        size = len(data)
+        print(f"{label:<22}{size:>10}{dump_rate:>10.0f}{load_rate:>10.0f}"
+              f"{dump_rate * size / 1e6:>11.1f}{load_rate * size / 1e6:>11.1f}{len(restored.inventory.items):>12}")
+    assert restored.see_inventory() == character.see_inventory()
+
+
+if __name__ == "__main__":
+    main()
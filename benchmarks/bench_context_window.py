@@ -0,0 +1,63 @@
+"""
+Benchmark: prompt size sent to the main model over a 500-turn synthetic session.
+
+Each turn adds a player message, an assistant tool call with its ToolMessage,
+the descriptive tool message and a narration. The summarizer is a stand-in
+that answers instantly, so only the context manager itself is measured.
+
+    python -m benchmarks.bench_context_window
+"""
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from langchain_core.messages.tool import ToolMessage
+
+from web.game import context
+from web.game.context import ContextWindow, count_message_tokens
+
+TURNS = 500
+REPORT_EVERY = 50
+
+
+class InstantSummarizer:
+    async def ainvoke(self, messages):
+        return AIMessage(content="The hero crossed the valley, fought wolves and found a map. " * 8)
+
+
+def add_turn(history, turn):
+    call_id = str(uuid.uuid4())
+    history.append(HumanMessage(content=f"Turn {turn}: I search the ruins for anything useful."))
+    history.append(AIMessage(content="", tool_calls=[
+        {"name": "add_item", "args": {"name": f"Relic {turn}", "description": "An old relic", "weight": 1.0}, "id": call_id}
+    ]))
+    history.append(ToolMessage(content=f"Added Relic {turn} to your inventory.", tool_call_id=call_id))
+    history.append(AIMessage(content=f"Tool AI called Tool add_item and got response:\n Added Relic {turn}"))
+    history.append(AIMessage(content="You brush the dust off an ancient relic. " * 15))
+
+
+async def main():
+    window = ContextWindow(summarizer=InstantSummarizer())
+    history = [SystemMessage(content="RPG Game Master Guidelines " * 50)]
+    print(f"token budget {window.budget}, tiktoken {'available' if context._get_encoding() else 'unavailable (estimated counts)'}")
+    print(f"{'turn':>6}{'history msgs':>14}{'full tokens':>13}{'prompt tokens':>15}{'prompt msgs':>13}{'build ms':>10}")
+    for turn in range(1, TURNS + 1):
+        add_turn(history, turn)
+        start = time.perf_counter()
+        prompt = window.build(history)
+        elapsed = time.perf_counter() - start
+        # Let the background summary run, as it would between turns
+        await asyncio.sleep(0)
+        if turn % REPORT_EVERY == 0 or turn == 1:
+            full = sum(count_message_tokens(m) for m in history)
+            print(f"{turn:>6}{len(history):>14}{full:>13}{window.prompt_tokens(prompt):>15}"
+                  f"{len(prompt):>13}{elapsed * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+"""
+Benchmark: websocket frames and bytes for one streamed narration, sent
+frame-per-token as before and through FrameBatcher.
+
+The stand-in model emits TOKENS tokens every TOKEN_INTERVAL seconds (about
+the pace of a streaming chat model).
+
+    python -m benchmarks.bench_frame_batching
+"""
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.game.frames import FrameBatcher
+
+TOKENS = 400
+TOKEN_INTERVAL = 0.005
+
+
+class CountingWebSocket:
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    async def send_text(self, text):
+        self.frames += 1
+        self.bytes += len(text.encode("utf-8"))
+
+
+async def stream(send_chunk):
+    for i in range(TOKENS):
+        await send_chunk(f" word{i}")
+        await asyncio.sleep(TOKEN_INTERVAL)
+
+
+async def per_token():
+    websocket = CountingWebSocket()
+
+    async def send_chunk(content):
+        await websocket.send_text(json.dumps({"type": "ai_chunk", "content": content}))
+
+    await stream(send_chunk)
+    return websocket
+
+
+async def batched(interval):
+    websocket = CountingWebSocket()
+    frames = FrameBatcher(websocket, interval=interval)
+    await stream(frames.send_chunk)
+    await frames.close()
+    return websocket
+
+
+async def main():
+    print(f"{TOKENS} tokens, one every {TOKEN_INTERVAL * 1000:.0f} ms")
+    print(f"{'sending':<22}{'frames':>8}{'bytes':>9}{'json encodes':>14}")
+    websocket = await per_token()
+    print(f"{'frame per token':<22}{websocket.frames:>8}{websocket.bytes:>9}{websocket.frames:>14}")
+    for interval in (0.01, 0.03, 0.1):
+        websocket = await batched(interval)
+        label = f"batched, {interval * 1000:.0f} ms"
+        print(f"{label:<22}{websocket.frames:>8}{websocket.bytes:>9}{websocket.frames:>14}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+"""
+Benchmark: queue wait of players' turns while one user creates a burst of
+stories, with model calls admitted first come first served against the
+LLM scheduler's priority classes and per-user turns.
+
+The model is a stand-in: every call holds a slot for a fixed latency.
+CREATORS story creations (two CREATION calls each, like api_create_story)
+start at once, then PLAYERS players each take TURNS turns (one
+INTERACTIVE call, plus an OBSERVATION call alongside it).
+
+    python -m benchmarks.bench_llm_scheduler
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.game.scheduler import LLMScheduler, INTERACTIVE, OBSERVATION, CREATION
+
+MAX_CONCURRENCY = 4
+CREATORS = 24
+PLAYERS = 6
+TURNS = 4
+CREATION_LATENCY = 0.2
+TURN_LATENCY = 0.05
+THINK_TIME = 0.05
+
+
+async def call(scheduler, user, priority, latency, waits=None):
+    start = time.perf_counter()
+    async with scheduler.slot(user, priority):
+        if waits is not None:
+            waits.append(time.perf_counter() - start)
+        await asyncio.sleep(latency)
+
+
+async def create_story(scheduler, fair):
+    user = "creator" if fair else None
+    priority = CREATION if fair else INTERACTIVE
+    await call(scheduler, user, priority, CREATION_LATENCY)
+    await call(scheduler, user, priority, CREATION_LATENCY)
+
+
+async def play(scheduler, player, fair, waits):
+    user = player if fair else None
+    for _ in range(TURNS):
+        await asyncio.sleep(THINK_TIME)
+        await asyncio.gather(
+            call(scheduler, user, INTERACTIVE, TURN_LATENCY, waits),
+            call(scheduler, user, OBSERVATION if fair else INTERACTIVE, TURN_LATENCY),
+        )
+
+
+async def run(fair):
+    scheduler = LLMScheduler(max_concurrency=MAX_CONCURRENCY)
+    waits = []
+    start = time.perf_counter()
+    creations = [asyncio.create_task(create_story(scheduler, fair)) for _ in range(CREATORS)]
+    await asyncio.sleep(0)
+    await asyncio.gather(*(play(scheduler, f"player{i}", fair, waits) for i in range(PLAYERS)))
+    turns_done = time.perf_counter() - start
+    await asyncio.gather(*creations)
+    return waits, turns_done, time.perf_counter() - start
+
+
+def main():
+    print(f"{CREATORS} story creations, {PLAYERS} players x {TURNS} turns, {MAX_CONCURRENCY} model slots")
+    print(f"{'admission':<20}{'turn wait p50':>15}{'turn wait p95':>15}{'turns done':>12}{'all done':>10}")
+    for label, fair in (("first come", False), ("scheduler", True)):
+        waits, turns_done, total = asyncio.run(run(fair))
+        waits.sort()
+        p95 = waits[int(len(waits) * 0.95)]
+        print(f"{label:<20}{statistics.median(waits) * 1000:>13.0f}ms{p95 * 1000:>13.0f}ms"
+              f"{turns_done:>11.2f}s{total:>9.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark: LLM calls, prompt tokens and latency per turn with the observation
+model (OBSERVATION_MODE=llm) against the local state digest (digest).
+
+Stand-in models with fixed latencies: the main model reaches its first chunk
+after MAIN_FIRST_TOKEN seconds, the observation model answers a see_health
+and see_inventory call after OBSERVATION_LATENCY seconds. Every other turn
+the main model first calls add_item. Prompt tokens count every message sent
+to either model plus the observation model's tool definitions (the main
+model's tool definitions are the same in both modes and left out).
+
+    python -m benchmarks.bench_observation_modes
+"""
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.schema import HumanMessage
+from langchain_core.messages import AIMessageChunk
+
+from web.game import helpers
+from web.game import tools
+from web.game.context import count_message_tokens, count_text_tokens
+from web.game.session import GameSession
+
+TURNS = 20
+MAIN_FIRST_TOKEN = 0.4
+OBSERVATION_LATENCY = 0.5
+CHUNKS = 20
+CHUNK_INTERVAL = 0.015
+OBSERVATION_SCHEMA_TOKENS = count_text_tokens(json.dumps(tools.OBSERVATION_TOOL_SCHEMAS))
+
+
+class Meter:
+    def __init__(self):
+        self.calls = 0
+        self.tokens = 0
+
+    def record(self, messages, extra_tokens=0):
+        self.calls += 1
+        self.tokens += sum(count_message_tokens(m) for m in messages) + extra_tokens
+
+
+class FakeMainModel:
+    def __init__(self, meter):
+        self.meter = meter
+        self.turn = 0
+
+    async def astream(self, messages):
+        self.meter.record(messages)
+        await asyncio.sleep(MAIN_FIRST_TOKEN)
+        last_human = max(i for i, m in enumerate(messages) if m.type == "human")
+        answered = any(m.type == "tool" for m in messages[last_human:])
+        if self.turn % 2 == 0 and not answered:
+            args = json.dumps({"name": f"Relic {self.turn}", "description": "An old relic", "weight": 1.0})
+            yield AIMessageChunk(content="", tool_call_chunks=[
+                {"name": "add_item", "args": args, "id": f"call-{self.turn}", "index": 0}])
+            return
+        for i in range(CHUNKS):
+            yield AIMessageChunk(content=f"word{i} ")
+            await asyncio.sleep(CHUNK_INTERVAL)
+
+
+class FakeObservationModel:
+    def __init__(self, meter):
+        self.meter = meter
+
+    async def astream(self, messages):
+        self.meter.record(messages, OBSERVATION_SCHEMA_TOKENS)
+        await asyncio.sleep(OBSERVATION_LATENCY)
+        yield AIMessageChunk(content="", tool_call_chunks=[
+            {"name": "see_health", "args": "{}", "id": "obs-1", "index": 0},
+            {"name": "see_inventory", "args": "{}", "id": "obs-2", "index": 1}])
+
+
+class TimingWebSocket:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token = None
+
+    async def send_text(self, text):
+        if self.first_token is None and '"ai_chunk"' in text:
+            self.first_token = time.perf_counter() - self.start
+
+
+async def measure(mode, pipeline):
+    helpers.OBSERVATION_MODE = mode
+    helpers.TURN_PIPELINE = pipeline
+    meter = Meter()
+    session = GameSession("bench", "bench")
+    main_model = FakeMainModel(meter)
+    session.llm_main = main_model
+    session.llm_observation = FakeObservationModel(meter)
+    first_tokens, turns = [], []
+    for turn in range(TURNS):
+        main_model.turn = turn
+        session.chat_history.append(HumanMessage(content=f"Turn {turn}: I search the ruins."))
+        websocket = TimingWebSocket()
+        await helpers.run_turn(websocket, session)
+        turns.append(time.perf_counter() - websocket.start)
+        first_tokens.append(websocket.first_token)
+    return meter, statistics.mean(first_tokens), statistics.mean(turns)
+
+
+async def main():
+    print(f"{TURNS} turns per row; main first token {MAIN_FIRST_TOKEN}s, observation {OBSERVATION_LATENCY}s")
+    print(f"{'mode':<20}{'LLM calls/turn':>16}{'prompt tokens/turn':>20}{'first token ms':>16}{'turn ms':>10}")
+    for label, mode, pipeline in (
+            ("llm, sequential", "llm", "sequential"),
+            ("llm, concurrent", "llm", "concurrent"),
+            ("digest", "digest", "concurrent")):
+        meter, first_token, turn = await measure(mode, pipeline)
+        print(f"{label:<20}{meter.calls / TURNS:>16.2f}{meter.tokens / TURNS:>20.0f}"
+              f"{first_token * 1000:>16.0f}{turn * 1000:>10.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
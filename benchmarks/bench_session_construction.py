@@ -0,0 +1,97 @@
+"""
+Benchmark: GameSession construction time, memory and HTTP pools per session.
+
+  per-session  every session builds its own ChatOpenAI clients and tools (original)
+  pooled       shared clients, tools still built and bound per session
+  shared       shared clients, tools and tool bindings (current)
+
+    python -m benchmarks.bench_session_construction
+"""
+import gc
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.tools import StructuredTool
+from langchain_openai import ChatOpenAI
+
+from web.game import session as session_module
+from web.game import tools as game_tools
+from web.game.llm import LLMClientRegistry
+
+SESSIONS = 100
+
+
+def fresh_tools(schemas):
+    """Rebuilds tools (and their argument schemas) from scratch, as each session used to."""
+    return [StructuredTool.from_function(game_tools.ALL_TOOLS[s["function"]["name"]].func) for s in schemas]
+
+
+class PerSessionTools(LLMClientRegistry):
+    """Shared clients, but tools are rebuilt and bound again for every session."""
+    def bind_tools(self, model_name, tools, tools_key=None, **settings):
+        if tools_key == "action":
+            self._action_tools = fresh_tools(tools)
+            tools = self._action_tools
+        elif tools_key == "observation":
+            # Observation tools were the session's action tools, not separate objects
+            names = {s["function"]["name"] for s in tools}
+            tools = [t for t in self._action_tools if t.name in names]
+        else:
+            tools = fresh_tools(tools)
+        return self.chat_model(model_name, **settings).bind_tools(tools)
+
+
+class UnpooledClients(PerSessionTools):
+    """Builds a new ChatOpenAI (with its own HTTP pool) for every request, like sessions used to."""
+    def chat_model(self, model_name, **settings):
+        return ChatOpenAI(model_name=model_name, **settings)
+
+
+def http_pools(sessions):
+    pools = set()
+    for s in sessions:
+        for runnable in (s.llm_main, s.llm_creation, s.llm_observation, s.context.summarizer):
+            model = getattr(runnable, "bound", runnable)
+            pools.add(id(model.root_client._client))
+            pools.add(id(model.root_async_client._client))
+    return len(pools)
+
+
+def run(label, clients):
+    session_module.llm_clients = clients
+    # Warm up imports and shared state outside the measurement
+    session_module.GameSession("warmup", "bench")
+    timings = []
+    for i in range(SESSIONS):
+        start = time.perf_counter()
+        session_module.GameSession(f"story-{i}", "bench")
+        timings.append(time.perf_counter() - start)
+
+    # Memory is measured separately, tracemalloc slows construction down a lot
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = [session_module.GameSession(f"story-{i}", "bench") for i in range(SESSIONS)]
+    gc.collect()
+    memory = (tracemalloc.get_traced_memory()[0] - before) / SESSIONS
+    tracemalloc.stop()
+    print(f"{label:<12}{statistics.median(timings) * 1000:>12.3f}{statistics.mean(timings) * 1000:>12.3f}"
+          f"{memory / 1024:>14.1f}{http_pools(sessions) / SESSIONS:>16.2f}")
+
+
+def main():
+    print(f"{SESSIONS} sessions")
+    print(f"{'setup':<12}{'median ms':>12}{'mean ms':>12}{'KiB/session':>14}{'pools/session':>16}")
+    run("per-session", UnpooledClients())
+    run("pooled", PerSessionTools())
+    run("shared", LLMClientRegistry())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark: cost of GameSession.save_session() as the chat history grows.
+
+Compares the journal save mode (append the new message) with the snapshot
+mode (rewrite the whole story file) for histories of 10 to 10,000 messages.
+
+    python -m benchmarks.bench_story_save
+"""
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ["USERS_DIR"] = tempfile.mkdtemp(prefix="bench_users_")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.schema import HumanMessage, AIMessage
+
+from web.user_management import register_user, create_story
+from web.utils import story_utils
+from web.game.session import GameSession
+
+SIZES = [10, 100, 1000, 10000]
+SAVES = 50
+
+
+async def build_session(username, size):
+    story_id = create_story(username, "A misty valley", "A wandering bard")["story_data"]["id"]
+    session = GameSession(story_id, username)
+    for i in range(size):
+        cls = HumanMessage if i % 2 else AIMessage
+        session.chat_history.append(cls(content=f"Message {i}: " + "lorem ipsum " * 20))
+    with contextlib.redirect_stdout(io.StringIO()):
+        await session.save_session()
+    return session
+
+
+async def time_saves(session):
+    timings = []
+    for i in range(SAVES):
+        session.chat_history.append(HumanMessage(content=f"Turn {i}: I look around."))
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            await session.save_session()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def main():
+    register_user("bench", "bench")
+    print(f"{'mode':<10}{'messages':>10}{'median ms':>12}{'mean ms':>12}{'max ms':>12}")
+    for mode in ("journal", "snapshot"):
+        story_utils.STORY_SAVE_MODE = mode
+        for size in SIZES:
+            timings = await time_saves(await build_session("bench", size))
+            print(f"{mode:<10}{size:>10}"
+                  f"{statistics.median(timings) * 1000:>12.3f}"
+                  f"{statistics.mean(timings) * 1000:>12.3f}"
+                  f"{max(timings) * 1000:>12.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+"""
+Benchmark: merging a synthetic 5,000-chunk stream with `gathered + chunk`
+against StreamAccumulator, for a narration and for a tool call whose
+arguments arrive in 5,000 fragments.
+
+    python -m benchmarks.bench_stream_accumulator
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessageChunk
+
+from web.game.streaming import StreamAccumulator
+
+CHUNKS = 5000
+
+
+def narration_stream():
+    return [AIMessageChunk(content=f"word{i} ", id="run-1") for i in range(CHUNKS)]
+
+
+def tool_call_stream():
+    description = "".join(f"fragment{i} " for i in range(CHUNKS - 2))
+    pieces = ['{"name": "Relic", "weight": 1.0, "description": "'] + \
+        [f"fragment{i} " for i in range(CHUNKS - 2)] + ['"}']
+    chunks = [AIMessageChunk(content="", id="run-1", tool_call_chunks=[
+        {"name": "add_item" if i == 0 else None, "args": piece, "id": "call-1" if i == 0 else None, "index": 0}])
+        for i, piece in enumerate(pieces)]
+    return chunks, description
+
+
+def merge_with_add(chunks):
+    gathered_msg = None
+    response_content = ""
+    for chunk in chunks:
+        if chunk.content:
+            response_content += chunk.content
+        gathered_msg = chunk if not gathered_msg else gathered_msg + chunk
+    return gathered_msg
+
+
+def merge_with_accumulator(chunks):
+    stream = StreamAccumulator()
+    for chunk in chunks:
+        stream.add(chunk)
+    return stream.message()
+
+
+def timed(func, chunks):
+    start = time.perf_counter()
+    message = func(chunks)
+    return time.perf_counter() - start, message
+
+
+def main():
+    print(f"{CHUNKS} chunks per stream")
+    print(f"{'stream':<12}{'gathered + chunk ms':>22}{'accumulator ms':>16}{'speedup':>10}")
+    tool_chunks, description = tool_call_stream()
+    for label, chunks in (("narration", narration_stream()), ("tool call", tool_chunks)):
+        add_time, added = timed(merge_with_add, chunks)
+        acc_time, accumulated = timed(merge_with_accumulator, chunks)
+        assert added.content == accumulated.content
+        assert json.dumps(added.tool_calls, sort_keys=True) == json.dumps(accumulated.tool_calls, sort_keys=True)
+        print(f"{label:<12}{add_time * 1000:>22.1f}{acc_time * 1000:>16.1f}{add_time / acc_time:>9.0f}x")
+    assert accumulated.tool_calls[0]["args"]["description"] == description
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: time to first token and full turn latency of the sequential turn
+pipeline (observation pass first) against the concurrent one.
+
+The models are stand-ins with fixed latencies: the main model takes
+MAIN_FIRST_TOKEN seconds to its first chunk then streams CHUNKS chunks, the
+observation model answers a see_health call after OBSERVATION_LATENCY
+seconds. In the "tool round" scenario the main model first calls
+adjust_health, then narrates.
+
+    python -m benchmarks.bench_turn_pipeline
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.schema import HumanMessage
+from langchain_core.messages import AIMessageChunk
+
+from web.game import helpers
+from web.game.session import GameSession
+
+TURNS = 5
+MAIN_FIRST_TOKEN = 0.4
+OBSERVATION_LATENCY = 0.5
+CHUNKS = 20
+CHUNK_INTERVAL = 0.015
+
+
+def last_human_index(messages):
+    return max(i for i, m in enumerate(messages) if m.type == "human")
+
+
+class FakeMainModel:
+    def __init__(self, tool_round):
+        self.tool_round = tool_round
+
+    async def astream(self, messages):
+        await asyncio.sleep(MAIN_FIRST_TOKEN)
+        answered = any(m.type == "tool" for m in messages[last_human_index(messages):])
+        if self.tool_round and not answered:
+            yield AIMessageChunk(content="", tool_call_chunks=[
+                {"name": "adjust_health", "args": '{"amount": -1}', "id": "call-1", "index": 0}])
+            return
+        for i in range(CHUNKS):
+            yield AIMessageChunk(content=f"word{i} ")
+            await asyncio.sleep(CHUNK_INTERVAL)
+
+
+class FakeObservationModel:
+    def __init__(self):
+        self.calls = 0
+
+    async def astream(self, messages):
+        self.calls += 1
+        await asyncio.sleep(OBSERVATION_LATENCY)
+        yield AIMessageChunk(content="", tool_call_chunks=[
+            {"name": "see_health", "args": "{}", "id": "obs-1", "index": 0}])
+
+
+class TimingWebSocket:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token = None
+
+    async def send_text(self, text):
+        if self.first_token is None and '"ai_chunk"' in text:
+            self.first_token = time.perf_counter() - self.start
+
+
+async def measure(pipeline, tool_round, always_observe):
+    helpers.TURN_PIPELINE = pipeline
+    session = GameSession("bench", "bench")
+    session.context = None
+    session.llm_main = FakeMainModel(tool_round)
+    session.llm_observation = FakeObservationModel()
+    first_tokens, turns = [], []
+    for turn in range(TURNS):
+        session.chat_history.append(HumanMessage(content=f"I look around ({turn})"))
+        if always_observe:
+            session.observed_state = None
+        websocket = TimingWebSocket()
+        await helpers.run_turn(websocket, session)
+        turns.append(time.perf_counter() - websocket.start)
+        first_tokens.append(websocket.first_token)
+    return statistics.mean(first_tokens), statistics.mean(turns), session.llm_observation.calls
+
+
+async def main():
+    print(f"{TURNS} turns per row; main first token {MAIN_FIRST_TOKEN}s, observation {OBSERVATION_LATENCY}s")
+    print(f"{'scenario':<12}{'pipeline':<20}{'first token ms':>16}{'turn ms':>10}{'observation calls':>19}")
+    for scenario, tool_round in (("narration", False), ("tool round", True)):
+        for label, pipeline, always_observe in (
+                ("sequential", "sequential", True),
+                ("concurrent", "concurrent", True),
+                ("concurrent + skip", "concurrent", False)):
+            first_token, turn, calls = await measure(pipeline, tool_round, always_observe)
+            print(f"{scenario:<12}{label:<20}{first_token * 1000:>16.0f}{turn * 1000:>10.0f}{calls:>19}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
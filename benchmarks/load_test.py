@@ -0,0 +1,283 @@
+"""
+Load test: N simulated players, each creating a story through
+POST /api/stories and then playing scripted turns over /ws/{story_id}.
+
+By default the app is started in this process on a free local port, with
+the fake model (LLM_PROVIDER=fake, see web/game/fake_llm.py) and a fresh
+temporary users directory, so results are stable between commits and need
+no network. With --url the players run against a server already listening
+(start it with LLM_PROVIDER=fake for comparable numbers); pass its --pid to
+report its RSS.
+
+Reports story creation time, time to the first `ai_chunk` and turn
+completion time (at `ai_complete`) as p50/p95/p99, websocket frames and
+bytes, save latency (from the server's /metrics when it is remote) and
+worker RSS.
+
+    python -m benchmarks.load_test --players 20 --turns 5 --think 0.5
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --pid 1234
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import httpx
+import websockets
+
+ACTIONS = (
+    "I look around the square.",
+    "I ask the merchant what he is selling.",
+    "I pick up the coin by the fountain.",
+    "I walk towards the chapel.",
+    "I draw my lute and play a song.",
+)
+
+PERCENTILES = (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))
+
+
+class Results:
+    def __init__(self):
+        self.create = []
+        self.first_chunk = []
+        self.turns = []
+        self.frames = 0
+        self.bytes = 0
+        self.errors = []
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def rss_mb(pid=None):
+    """Resident memory of a process (this one by default), in MB."""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if pid is None:
+        import resource
+        # Peak rather than current resident memory; kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class InProcessServer:
+    """Runs the app with uvicorn on a thread of its own, so it has its own event loop."""
+
+    def __init__(self, port):
+        import uvicorn
+        from web.app import app
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("Server failed to start")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+
+async def receive(websocket, results, timeout):
+    raw = await asyncio.wait_for(websocket.recv(), timeout)
+    results.frames += 1
+    results.bytes += len(raw.encode("utf-8") if isinstance(raw, str) else raw)
+    return json.loads(raw)
+
+
+async def player(index, base_url, args, results, run_id):
+    await asyncio.sleep(args.ramp * index / max(1, args.players))
+    credentials = {"username": f"load-{run_id}-{index}", "password": "load-test"}
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout) as http:
+        await http.post("/api/register", json=credentials)
+        login = (await http.post("/api/login", json=credentials)).json()
+        if not login.get("success"):
+            results.errors.append(f"login: {login.get('message')}")
+            return
+        start = time.perf_counter()
+        created = (await http.post("/api/stories", json={
+            "world_description": "A rain-soaked harbor town ruled by a merchant council.",
+            "character_description": "A wandering bard with a lute and a debt to repay.",
+        })).json()
+        if not created.get("success"):
+            results.errors.append(f"create: {created.get('message')}")
+            return
+        results.create.append(time.perf_counter() - start)
+
+    ws_url = base_url.replace("http", "ws", 1) + f"/ws/{created['story_id']}"
+    async with websockets.connect(ws_url, max_size=None) as websocket:
+        for turn in range(args.turns):
+            await asyncio.sleep(args.think)
+            sent = time.perf_counter()
+            await websocket.send(ACTIONS[(index + turn) % len(ACTIONS)])
+            first_chunk = None
+            while True:
+                frame = await receive(websocket, results, args.timeout)
+                kind = frame.get("type")
+                if kind == "ai_chunk" and first_chunk is None:
+                    first_chunk = time.perf_counter() - sent
+                elif kind == "ai_complete":
+                    break
+                elif kind == "error" or "error" in frame:
+                    results.errors.append(f"turn: {frame.get('content') or frame.get('error')}")
+                    break
+            if first_chunk is not None:
+                results.first_chunk.append(first_chunk)
+            results.turns.append(time.perf_counter() - sent)
+        # Count the frames that follow the last answer (observation, character patch)
+        with contextlib.suppress(asyncio.TimeoutError):
+            while True:
+                await receive(websocket, results, 0.5)
+
+
+async def run_players(base_url, args, results):
+    run_id = uuid.uuid4().hex[:8]
+    outcomes = await asyncio.gather(
+        *(player(i, base_url, args, results, run_id) for i in range(args.players)),
+        return_exceptions=True)
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            results.errors.append(f"{type(outcome).__name__}: {outcome}")
+
+
+def scrape_saves(base_url):
+    """The save stats a remote server exports at /metrics, or None if it has none."""
+    prefix = "airpg_saves_"
+    try:
+        text = httpx.get(f"{base_url}/metrics", timeout=10).text
+    except httpx.HTTPError:
+        return None
+    saves = {}
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            name, value = line[len(prefix):].split(" ", 1)
+            saves[name] = float(value)
+    return saves or None
+
+
+def configure_fake_model(args):
+    """Environment of the in-process app; read when its modules are first imported."""
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ["FAKE_LLM_TTFT"] = str(args.ttft)
+    os.environ["FAKE_LLM_TOKENS_PER_SECOND"] = str(args.tokens_per_second)
+    os.environ["FAKE_LLM_ERROR_RATE"] = str(args.error_rate)
+    os.environ.setdefault("USERS_DIR", tempfile.mkdtemp(prefix="ai-rpg-load-"))
+    if not args.verbose:
+        # Disconnects and sampled turns are logged at INFO; keep the report readable
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def report(args, results, elapsed, saves, rss):
+    turns = len(results.turns)
+    summary = {
+        "players": args.players,
+        "turns": turns,
+        "elapsed_s": round(elapsed, 3),
+        "create_ms": {q: round(percentile(results.create, p) * 1000, 1) for q, p in PERCENTILES},
+        "first_chunk_ms": {q: round(percentile(results.first_chunk, p) * 1000, 1) for q, p in PERCENTILES},
+        "turn_ms": {q: round(percentile(results.turns, p) * 1000, 1) for q, p in PERCENTILES},
+        "frames": results.frames,
+        "bytes": results.bytes,
+        "saves": saves,
+        "rss_mb": round(rss, 1) if rss is not None else None,
+        "errors": len(results.errors),
+    }
+    print(f"{args.players} players x {args.turns} turns, think {args.think}s, "
+          f"{'in-process, fake model' if not args.url else args.url}: {elapsed:.2f}s")
+    print(f"{'':<18}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for label, key in (("story creation", "create_ms"), ("first ai_chunk", "first_chunk_ms"),
+                       ("turn complete", "turn_ms")):
+        values = summary[key]
+        print(f"{label:<18}" + "".join(f"{values[q]:>8.1f}ms" for q, _ in PERCENTILES))
+    print(f"frames: {results.frames} ({results.frames / max(1, turns):.1f}/turn), "
+          f"bytes: {results.bytes} ({results.bytes / max(1, turns):.0f}/turn)")
+    if saves:
+        print(f"saves: {saves['saves_written']:.0f} written, p50 {saves['save_p50_ms']:.1f}ms, "
+              f"p95 {saves['save_p95_ms']:.1f}ms, max {saves['save_max_ms']:.1f}ms")
+    else:
+        print("saves: not measured (the server exports no /metrics)")
+    print(f"worker RSS: {summary['rss_mb']} MB" if rss is not None else "worker RSS: unknown (pass --pid)")
+    if results.errors:
+        print(f"errors: {len(results.errors)}, e.g. {results.errors[0]}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--players", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--think", type=float, default=0.5, help="Seconds between a turn's answer and the next action")
+    parser.add_argument("--ramp", type=float, default=1.0, help="Seconds over which the players join")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--url", help="Server to test, e.g. http://127.0.0.1:8000; default: start one in-process")
+    parser.add_argument("--pid", type=int, help="Process id of the --url server, for its RSS")
+    parser.add_argument("--ttft", type=float, default=0.3, help="Fake model time to first token (in-process)")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0, help="Fake model token rate (in-process)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fake model failure rate (in-process)")
+    parser.add_argument("--json", help="Also write the summary to this file")
+    parser.add_argument("--verbose", action="store_true", help="Keep the server's output")
+    args = parser.parse_args()
+
+    results = Results()
+    server = None
+    saves = None
+    # The app prints on every turn; keep the report readable unless asked
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            configure_fake_model(args)
+            server = InProcessServer(free_port())
+            server.start()
+            base_url = f"http://127.0.0.1:{server.port}"
+        start = time.perf_counter()
+        asyncio.run(run_players(base_url, args, results))
+        elapsed = time.perf_counter() - start
+        if server is not None:
+            from web.storage.write_behind import save_scheduler
+            saves = save_scheduler.stats()
+            rss = rss_mb()
+            server.stop()
+        else:
+            saves = scrape_saves(base_url)
+            rss = rss_mb(args.pid) if args.pid else None
+
+    summary = report(args, results, elapsed, saves, rss)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""
+Micro-benchmark suite for the hot paths, with a baseline to compare against.
+
+    python -m benchmarks.suite                    # run and print the timings
+    python -m benchmarks.suite --save             # run and write the baseline
+    python -m benchmarks.suite --compare          # run and flag regressions against the baseline
+    python -m benchmarks.suite --filter inventory # only benchmarks whose name contains "inventory"
+
+Each benchmark is timed as the best of REPEAT runs of enough calls to take at
+least MIN_RUN_TIME seconds, and reported per call. With --compare, a benchmark
+more than --threshold slower than its baseline is a regression and the suite
+exits with status 1. Baselines are only comparable on the same machine; save
+one from the commit to compare against before making changes.
+"""
+import argparse
+import asyncio
+import contextlib
+import copy
+import inspect
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["USERS_DIR"] = tempfile.mkdtemp(prefix="bench_users_")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.schema import HumanMessage, AIMessage
+from langchain_core.messages import AIMessageChunk
+
+from rpg.inventory import Inventory
+from web.game import tools
+from web.game.fake_llm import FakeChatModel, FakeScript
+from web.game.helpers import process_ai_response
+from web.game.registry import load_session
+from web.game.session import GameSession
+from web.game.streaming import StreamAccumulator
+from web.rpg.Character import Character
+from web.user_management import register_user, create_story
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+MIN_RUN_TIME = 0.05
+REPEAT = 5
+DEFAULT_THRESHOLD = 0.3
+
+INVENTORY_SIZES = [10, 100, 1000, 10000]
+HISTORY_SIZES = [10, 100, 1000]
+CHARACTER_ITEMS = 50
+STREAM_CHUNKS = 400
+USERNAME = "bench"
+
+CHARACTER = {
+    "name": "Aria",
+    "lore": "A wandering bard who sings of forgotten kings.",
+    "level_and_experience": {"level": 3, "experience": 4, "experience_to_next_level": 400},
+    "health_and_mana": {"current_health": 30, "max_health": 30, "current_mana": 12, "max_mana": 12},
+    "equipment": {"main_hand": {"name": "Lute", "description": "Well tuned", "weight": 2.0}},
+}
+
+# Arguments each tool is called with; the character is set up so that every call succeeds
+TOOL_ARGS = {
+    "add_item": {"name": "Rope", "description": "Fifty feet of hemp", "weight": 0.0},
+    "remove_item": {"name": "Arrow", "amount": 1},
+    "equip_item": {"item_name": "Dagger", "slot": "off_hand"},
+    "unequip_item": {"slot": "head"},
+    "see_inventory": {},
+    "adjust_health": {"amount": -1},
+    "adjust_mana": {"amount": -1},
+    "adjust_experience": {"amount": 1},
+    "level_up": {},
+    "see_inventory_and_equipements": {},
+    "see_equipment": {},
+    "see_health": {},
+    "see_mana": {},
+    "see_level": {},
+    "see_experience": {},
+    "see_name": {},
+    "see_lore": {},
+    "create_character": CHARACTER,
+}
+
+# name -> setup; a setup prepares its data and returns the (sync or async) callable to time
+BENCHMARKS = {}
+
+
+def benchmark(name, *args):
+    def register(setup):
+        BENCHMARKS[name] = lambda: setup(*args)
+        return setup
+    return register
+
+
+def make_session(items: int = CHARACTER_ITEMS) -> GameSession:
+    session = GameSession("bench", USERNAME)
+    session.player_character.create_character(**copy.deepcopy(CHARACTER))
+    for i in range(items):
+        session.player_character.add_item(f"Trinket {i}", f"A trinket picked up on day {i}", 0.0)
+    session.character_created = True
+    return session
+
+
+def make_inventory(size: int) -> Inventory:
+    inventory = Inventory()
+    for i in range(size):
+        inventory.add_item(f"Item {i}", f"Description of item {i}", 0.0, amount=10 ** 9)
+    return inventory
+
+
+async def make_story(size: int) -> GameSession:
+    story_id = create_story(USERNAME, "A misty valley", "A wandering bard")["story_data"]["id"]
+    session = make_session()
+    session.session_id = story_id
+    for i in range(size):
+        cls = HumanMessage if i % 2 else AIMessage
+        session.chat_history.append(cls(content=f"Message {i}: " + "lorem ipsum " * 20))
+    await session.save_session()
+    return session
+
+
+@benchmark("session.construct")
+def bench_session_construct():
+    return lambda: GameSession("bench", USERNAME)
+
+
+def bench_call_tool(name):
+    session = make_session()
+    character = session.player_character
+    character.add_item("Arrow", "Fletched", 0.0, amount=10 ** 9)
+    character.add_item("Dagger", "Sharp", 0.0, amount=10 ** 9)
+    args = TOOL_ARGS[name]
+    if name == "unequip_item":
+        helmet = character.equipped["main_hand"]
+
+        def call():
+            character.equipped["head"] = helmet
+            return session.call_tool(name, args)
+        return call
+    if name == "level_up":
+        # Levels compound; start from the same one every call
+        level, health = character.level_and_experience, character.health_and_mana
+
+        def call():
+            character.level_and_experience, character.health_and_mana = dict(level), dict(health)
+            return session.call_tool(name, args)
+        return call
+    return lambda: session.call_tool(name, args)
+
+
+for tool_name in TOOL_ARGS:
+    benchmark(f"call_tool.{tool_name}", tool_name)(bench_call_tool)
+
+
+def bench_inventory_add(size):
+    inventory = make_inventory(size)
+    return lambda: inventory.add_item(f"Item {size // 2}", "", 0.0)
+
+
+def bench_inventory_remove(size):
+    inventory = make_inventory(size)
+    return lambda: inventory.remove_item(f"Item {size // 2}")
+
+
+def bench_inventory_see(size):
+    inventory = make_inventory(size)
+    return inventory.see_inventory
+
+
+for inventory_size in INVENTORY_SIZES:
+    benchmark(f"inventory.add_item[{inventory_size}]", inventory_size)(bench_inventory_add)
+    benchmark(f"inventory.remove_item[{inventory_size}]", inventory_size)(bench_inventory_remove)
+    benchmark(f"inventory.see_inventory[{inventory_size}]", inventory_size)(bench_inventory_see)
+
+
+@benchmark("character.equip_unequip")
+def bench_equip_unequip():
+    character = Character()
+    character.create_character(**copy.deepcopy(CHARACTER))
+    character.add_item("Dagger", "Sharp", 0.0)
+
+    def call():
+        character.equip("off_hand", "Dagger")
+        character.unequip("off_hand")
+    return call
+
+
+@benchmark("session.get_character_data")
+def bench_get_character_data():
+    return make_session().get_character_data
+
+
+def bench_save_session(size):
+    session = asyncio.get_event_loop().run_until_complete(make_story(size))
+
+    async def call():
+        session.chat_history.append(HumanMessage(content="I look around."))
+        await session.save_session()
+    return call
+
+
+def bench_restore(size):
+    session = asyncio.get_event_loop().run_until_complete(make_story(size))
+
+    async def call():
+        return await load_session(session.session_id)
+    return call
+
+
+for history_size in HISTORY_SIZES:
+    benchmark(f"session.save_session[{history_size}]", history_size)(bench_save_session)
+    benchmark(f"registry.restore[{history_size}]", history_size)(bench_restore)
+
+
+@benchmark("stream.accumulate")
+def bench_stream_accumulate():
+    chunks = [AIMessageChunk(content=f"word{i} ", id="run-1") for i in range(STREAM_CHUNKS)]
+
+    def call():
+        stream = StreamAccumulator()
+        for chunk in chunks:
+            stream.add(chunk)
+        return stream.message()
+    return call
+
+
+@benchmark("turn.process_ai_response")
+def bench_process_ai_response():
+    session = make_session()
+    # The fake model answers at once, so this times the turn's own work
+    session.llm_main = FakeChatModel(script=FakeScript(ttft=0, tokens_per_second=0)).bind_tools(
+        tools.ACTION_TOOL_SCHEMAS)
+    session.context.summarizer = None
+    start = session.chat_history + [HumanMessage(content="I look around the square.")]
+
+    async def call():
+        session.chat_history = list(start)
+        await process_ai_response(None, session)
+    return call
+
+
+def timer(loop, call):
+    """Returns a function timing `number` calls of `call`."""
+    if inspect.iscoroutinefunction(call):
+        async def calls(number):
+            for _ in range(number):
+                await call()
+
+        def run(number):
+            start = time.perf_counter()
+            loop.run_until_complete(calls(number))
+            return time.perf_counter() - start
+        return run
+
+    def run(number):
+        start = time.perf_counter()
+        for _ in range(number):
+            call()
+        return time.perf_counter() - start
+    return run
+
+
+def measure(run) -> float:
+    """Seconds per call: the best of REPEAT runs of enough calls to take MIN_RUN_TIME."""
+    number = 1
+    while True:
+        elapsed = run(number)
+        if elapsed >= MIN_RUN_TIME:
+            break
+        number *= 2 if elapsed > MIN_RUN_TIME / 10 else 10
+    return min([elapsed] + [run(number) for _ in range(REPEAT - 1)]) / number
+
+
+def run_suite(names):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = {}
+    # Anything the code under test still writes to stdout stays out of the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        register_user(USERNAME, USERNAME)
+        for name in names:
+            call = BENCHMARKS[name]()
+            results[name] = measure(timer(loop, call))
+            print(f"{name:<42}{format_time(results[name]):>12}", file=sys.stderr)
+    loop.close()
+    return results
+
+
+def format_time(seconds: float) -> str:
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.2f} us"
+
+
+def save_baseline(path, results):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()}",
+            "results": results,
+        }, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(path, results, threshold) -> int:
+    """Prints the timings against the baseline; returns the number of regressions."""
+    with open(path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"Baseline from {baseline.get('created')} (Python {baseline.get('python')}, {baseline.get('machine')})")
+    print(f"{'benchmark':<42}{'baseline':>12}{'current':>12}{'change':>9}")
+    regressions = 0
+    for name, seconds in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<42}{'-':>12}{format_time(seconds):>12}{'new':>9}")
+            continue
+        change = seconds / before - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{name:<42}{format_time(before):>12}{format_time(seconds):>12}{change:>+9.0%}{flag}")
+    print(f"{regressions} regression(s) over {threshold:.0%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the hot paths.")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="Write the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="Compare the results with the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Slowdown counted as a regression (0.3 = 30%%)")
+    parser.add_argument("--list", action="store_true", help="List the benchmarks and exit")
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    if args.list:
+        print("\n".join(names))
+        return 0
+    results = run_suite(names)
+    if args.save:
+        save_baseline(args.baseline, results)
+        print(f"Baseline written to {args.baseline}")
+    if args.compare:
+        return 1 if compare(args.baseline, results, args.threshold) else 0
+    if not args.save:
+        for name, seconds in results.items():
+            print(f"{name:<42}{format_time(seconds):>12}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
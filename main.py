@@ -6,6 +6,7 @@ from langchain_openai import ChatOpenAI
 from langchain.schema import AIMessage, HumanMessage, SystemMessage
 from langchain_core.messages.tool import ToolMessage
 from web.rpg.Character import Character
+from web.game.streaming import StreamAccumulator
 
 ##########################
 # Initialize Player
@@ -322,10 +323,10 @@ def call_tool(tool_name, tool_args):
 async def process_observation(chat_history):
     """Handles observation phase"""
     observation_history = [observation_system] + chat_history[-2:]
-    gathered_msg = None
+    stream = StreamAccumulator()
     async for chunk in llm_observation.astream(observation_history):
-        if chunk.tool_calls:
-            gathered_msg = chunk if not gathered_msg else gathered_msg + chunk
+        stream.add(chunk)
+    gathered_msg = stream.message()
 
     if gathered_msg and gathered_msg.tool_calls:
         for tool_call in gathered_msg.tool_calls:
@@ -337,12 +338,13 @@ async def process_observation(chat_history):
 
 async def process_response(chat_history):
     """Handles AI response and tool execution"""
-    gathered_msg = None
+    stream = StreamAccumulator()
     print(colored("\nAI: ", "green"), end="", flush=True)
     async for chunk in llm_main.astream(chat_history):
         if chunk.content:
             print(colored(chunk.content, "green"), end="", flush=True)
-        gathered_msg = chunk if not gathered_msg else gathered_msg + chunk
+        stream.add(chunk)
+    gathered_msg = stream.message()
 
     if gathered_msg:
         chat_history.append(gathered_msg)
@@ -1,3 +1,7 @@
+# Version of the snapshot format written by to_snapshot(); bump it when the format changes
+SNAPSHOT_VERSION = 1
+
+
 class Item:
     """
     Represents an RPG item with a name, description, amount, and rarity.
@@ -16,6 +20,14 @@ class Item:
             f"  {self.description}"
         )
 
+    def to_snapshot(self) -> list:
+        """Returns the item as a compact [name, description, weight, amount, rarity] list."""
+        return [self.name, self.description, self.weight, self.amount, self.rarity]
+
+    @classmethod
+    def from_snapshot(cls, data: list) -> "Item":
+        return cls(*data)
+
 
 class Inventory:
     """
@@ -99,3 +111,38 @@ class Inventory:
         for itm in self.items.values():
             lines.append(str(itm))
         return "\n".join(lines)
+
+    def to_snapshot(self) -> dict:
+        """
+        Returns the inventory in the compact snapshot format.
+
+        Returns:
+            dict: {"v": version, "mw": max weight, "it": [item snapshot, ...]}
+        """
+        return {
+            "v": SNAPSHOT_VERSION,
+            "mw": self.max_weight,
+            "it": [item.to_snapshot() for item in self.items.values()],
+        }
+
+    @classmethod
+    def from_snapshot(cls, data: dict) -> "Inventory":
+        """
+        Rebuilds an inventory from to_snapshot() output.
+
+        Raises:
+            ValueError: If the snapshot was written by a newer version
+        """
+        check_snapshot_version(data)
+        inventory = cls()
+        inventory.max_weight = data.get("mw", inventory.max_weight)
+        for item_data in data.get("it", ()):
+            item = Item.from_snapshot(item_data)
+            inventory.items[item.name.lower()] = item
+        return inventory
+
+
+def check_snapshot_version(data: dict):
+    version = data.get("v")
+    if not isinstance(version, int) or not 1 <= version <= SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {version!r}")
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pytest
+from langchain.schema import HumanMessage
+
+from web.game.helpers import process_ai_response
+from web.storage.backend import StorageBackend, set_storage
+
+
+class SlowStorage(StorageBackend):
+    """Backend whose writes block the calling thread like a stalled disk."""
+    def __init__(self, delay):
+        self.delay = delay
+        self.writes = 0
+
+    def append_story_changes(self, username, story_id, start, messages, character=None, truncate=False):
+        time.sleep(self.delay)
+        self.writes += 1
+        return {"success": True}
+
+
+class TimedWebSocket:
+    def __init__(self):
+        self.sent_at = []
+    async def send_text(self, text):
+        self.sent_at.append(time.perf_counter())
+
+
+class StreamingSession:
+    """Session whose model streams a few tokens without tool calls."""
+    def __init__(self):
+        self.chat_history = []
+        self.llm_main = self
+    async def astream(self, chat_history):
+        class Chunk:
+            def __init__(self, content):
+                self.content = content
+                self.tool_calls = []
+            def __add__(self, other):
+                return Chunk(self.content + other.content)
+        for token in ["You ", "enter ", "the ", "cave."]:
+            await asyncio.sleep(0.01)
+            yield Chunk(token)
+
+
+@pytest.fixture
+def slow_storage():
+    storage = SlowStorage(delay=0.5)
+    set_storage(storage)
+    yield storage
+    set_storage(None)
+
+
+@pytest.mark.asyncio
+async def test_slow_save_does_not_delay_other_sessions_chunks(slow_storage, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    from web.game.session import GameSession
+    saving = GameSession("story-a", "alice")
+    saving.chat_history.append(HumanMessage(content="I open the chest."))
+
+    streaming = StreamingSession()
+    websocket = TimedWebSocket()
+    start = time.perf_counter()
+    await asyncio.gather(saving.save_session(), process_ai_response(websocket, streaming))
+
+    assert slow_storage.writes == 1
+    assert time.perf_counter() - start >= 0.5
+    # Every ai_chunk (and the final ai_complete) arrived long before the save finished
+    assert len(websocket.sent_at) == 5
+    assert max(websocket.sent_at) - start < 0.25
@@ -0,0 +1,65 @@
+import orjson
+import pytest
+
+from web.rpg.Character import Character
+from rpg.inventory import Inventory, SNAPSHOT_VERSION
+
+
+def make_character():
+    character = Character()
+    character.create_character(
+        name="Aria",
+        lore="A wandering bard.",
+        level_and_experience={"level": 3, "experience": 12, "experience_to_next_level": 30},
+        health_and_mana={"current_health": 7, "max_health": 12, "current_mana": 4, "max_mana": 8},
+        equipment={"main_hand": {"name": "Lute", "description": "Well tuned", "weight": 2.0}},
+    )
+    character.add_item("Potion", "Heals 5 HP", 0.5, amount=3, rarity="Uncommon")
+    character.add_item("Rope", "Fifty feet", 2.0)
+    return character
+
+
+def test_snapshot_round_trip_restores_inventory_and_equipment():
+    character = make_character()
+    restored = Character.from_snapshot(character.dump_snapshot())
+
+    assert (restored.name, restored.lore) == ("Aria", "A wandering bard.")
+    assert restored.level_and_experience == character.level_and_experience
+    assert restored.health_and_mana == character.health_and_mana
+    assert restored.serialize_equipment() == character.serialize_equipment()
+    assert restored.see_inventory() == character.see_inventory()
+    assert restored.inventory.items["potion"].amount == 3
+    # Restored items behave like the originals
+    assert restored.equip("off_hand", "rope") == "Equipped rope in off_hand slot."
+    assert "rope" not in restored.inventory.items
+
+
+def test_snapshot_uses_short_keys_and_copies_state():
+    character = make_character()
+    snapshot = character.to_snapshot()
+    assert set(snapshot) == {"v", "n", "l", "lx", "hm", "eq", "inv"}
+    assert set(snapshot["eq"]) == {"main_hand"}
+    snapshot["hm"]["current_health"] = 0
+    assert character.health_and_mana["current_health"] == 7
+
+
+def test_newer_snapshot_versions_are_rejected():
+    data = orjson.loads(make_character().dump_snapshot())
+    data["v"] = SNAPSHOT_VERSION + 1
+    with pytest.raises(ValueError):
+        Character.from_snapshot(data)
+    with pytest.raises(ValueError):
+        Inventory.from_snapshot({"it": []})
+
+
+def test_restored_session_keeps_its_inventory(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    from web.game.registry import restore_session
+    from web.game.session import GameSession
+
+    session = GameSession("story-1", "user")
+    session.player_character = make_character()
+    story = {"character": session.get_story_character(), "chat_history": []}
+    restored = restore_session("story-1", "user", story)
+    assert restored.player_character.see_inventory() == session.player_character.see_inventory()
+    assert restored.get_story_character() == story["character"]
@@ -0,0 +1,45 @@
+import json
+
+import jsonpatch
+
+from web.game.character_sync import CharacterSync, is_resync_request
+
+
+def character(health=10, inventory="Your inventory is empty."):
+    return {"name": "Aria", "health": {"current_health": health, "max_health": 10},
+            "equipment": {"head": None}, "inventory": inventory}
+
+
+def test_full_update_first_then_patches_or_nothing():
+    sync = CharacterSync()
+    first = json.loads(sync.frame(character()))
+    assert first == {"type": "character_update", "rev": 1, "data": character()}
+
+    assert sync.frame(character()) is None
+
+    data = character(health=7)
+    patch = json.loads(sync.frame(data))
+    assert (patch["type"], patch["rev"], patch["base"]) == ("character_patch", 2, 1)
+    assert patch["ops"] == [{"op": "replace", "path": "/health/current_health", "value": 7}]
+    assert jsonpatch.apply_patch(first["data"], patch["ops"]) == data
+    assert sync.stats() == {"revision": 2, "full_updates": 1, "patches": 1, "unchanged": 1,
+                            "bytes_sent": sync.bytes_sent}
+
+
+def test_later_changes_to_live_dicts_are_still_sent():
+    sync = CharacterSync()
+    data = character()
+    sync.frame(data)
+    # get_character_data hands out the live dicts, which tools keep changing
+    data["health"]["current_health"] = 3
+    assert json.loads(sync.frame(data))["ops"][0]["value"] == 3
+
+
+def test_resync_sends_the_whole_state_again():
+    sync = CharacterSync()
+    sync.frame(character())
+    frame = json.loads(sync.frame(character(), full=True))
+    assert (frame["type"], frame["rev"]) == ("character_update", 2)
+    assert is_resync_request('{"type": "resync"}')
+    assert not is_resync_request("I open the door")
+    assert not is_resync_request('{"type": "attack"}')
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from langchain_core.messages.tool import ToolMessage
+
+from web.game import context
+from web.game.context import ContextWindow, count_message_tokens
+
+
+class FakeSummarizer:
+    def __init__(self):
+        self.calls = 0
+        self.requests = []
+    async def ainvoke(self, messages):
+        self.calls += 1
+        self.requests.append(messages)
+        return AIMessage(content=f"summary {self.calls}")
+
+
+def build_history(turns):
+    history = [SystemMessage(content="rules")]
+    for turn in range(turns):
+        call_id = f"call-{turn}"
+        history.append(HumanMessage(content=f"player action {turn} " * 10))
+        history.append(AIMessage(content="", tool_calls=[
+            {"name": "adjust_health", "args": {"amount": -1}, "id": call_id}
+        ]))
+        history.append(ToolMessage(content="Health: 9/10 " * 10, tool_call_id=call_id))
+        history.append(AIMessage(content=f"narration {turn} " * 20))
+    return history
+
+
+@pytest.mark.asyncio
+async def test_prompt_fits_budget_and_keeps_tool_pairs():
+    window = ContextWindow(summarizer=FakeSummarizer(), budget=800)
+    history = build_history(60)
+    prompt = window.build(history)
+
+    assert prompt[0] is history[0]
+    assert window.prompt_tokens(prompt) <= 800
+    assert prompt[-1] is history[-1]
+    for i, message in enumerate(prompt):
+        if isinstance(message, ToolMessage):
+            parent = prompt[i - 1]
+            assert isinstance(parent, AIMessage)
+            assert parent.tool_calls[0]["id"] == message.tool_call_id
+
+
+@pytest.mark.asyncio
+async def test_older_turns_are_folded_into_background_summary(monkeypatch):
+    monkeypatch.setattr(context, "SUMMARY_CHUNK_TOKENS", 100000)
+    summarizer = FakeSummarizer()
+    window = ContextWindow(summarizer=summarizer, budget=800)
+    history = build_history(60)
+    first = window.build(history)
+    assert not any("summary" in str(m.content) for m in first[1:2])
+    await window._summary_task
+    assert summarizer.calls == 1
+
+    prompt = window.build(history)
+    assert prompt[1].content.endswith("summary 1")
+    assert window.prompt_tokens(prompt) <= 800
+
+
+@pytest.mark.asyncio
+async def test_restored_history_is_summarized_in_bounded_chunks(monkeypatch):
+    monkeypatch.setattr(context, "SUMMARY_CHUNK_TOKENS", 500)
+    summarizer = FakeSummarizer()
+    window = ContextWindow(summarizer=summarizer, budget=800)
+    history = build_history(60)
+    window.build(history)
+    await window._summary_task
+
+    assert summarizer.calls > 1
+    for request in summarizer.requests:
+        # The transcript of one chunk, plus the summary carried over from the previous one
+        assert count_message_tokens(request[1]) < 500 + 50
+    assert summarizer.requests[1][1].content.startswith("Current summary:\nsummary 1")
+    assert window.summary == f"summary {summarizer.calls}"
+    # The prompt carries on from where the summary ends
+    prompt = window.build(history)
+    assert prompt[2:] == history[window.summary_upto:]
+
+
+@pytest.mark.asyncio
+async def test_messages_leave_the_prompt_only_once_summarized():
+    window = ContextWindow(summarizer=FakeSummarizer(), budget=800)
+    history = build_history(60)
+    for end in range(5, len(history) + 1, 4):
+        prompt = window.build(history[:end])
+        assert window.prompt_tokens(prompt) <= 800
+        kept = {id(m) for m in prompt}
+        assert all(id(m) in kept for m in history[window.summary_upto:end])
+        if window._summary_task is not None:
+            await window._summary_task
+    assert window.summary_upto > len(history) // 2
+
+
+def test_current_turn_is_kept_even_over_budget():
+    window = ContextWindow(budget=10)
+    history = build_history(3)
+    prompt = window.build(history)
+    assert prompt[1:] == history[-4:]
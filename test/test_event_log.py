@@ -0,0 +1,141 @@
+import json
+
+import pytest
+
+from web.game.events import EventLog
+from web.game.frames import FrameBatcher
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+def test_frames_are_stamped_and_replayed_from_the_gap():
+    log = EventLog(size=3)
+    for i in range(5):
+        stamped = json.loads(log.record(json.dumps({"type": "ai_chunk", "content": str(i)})))
+        assert stamped == {"seq": i + 1, "type": "ai_chunk", "content": str(i)}
+
+    assert [json.loads(f)["seq"] for f in log.since(3, log.epoch)] == [4, 5]
+    assert log.since(5, log.epoch) == []
+    # Older than the buffer, from another epoch, or from the future: not replayable
+    assert log.since(1, log.epoch) is None
+    assert log.since(3, "other") is None
+    assert log.since(6, log.epoch) is None
+
+
+@pytest.mark.asyncio
+async def test_batched_frames_go_through_the_session_log():
+    websocket, log = FakeWebSocket(), EventLog()
+    frames = FrameBatcher(websocket, interval=10, max_bytes=10_000, events=log)
+    await frames.send_chunk("Hello ")
+    await frames.send_text(json.dumps({"type": "ai_complete", "content": "Hello "}))
+    assert [(m["seq"], m["type"]) for m in websocket.sent] == [(1, "ai_chunk"), (2, "ai_complete")]
+    assert log.stats() == {"seq": 2, "buffered": 2}
+
+
+@pytest.mark.asyncio
+async def test_reconnecting_client_gets_only_the_missed_frames(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    from web.routes.websocket import resume
+
+    class Session:
+        events = EventLog()
+
+    for i in range(4):
+        Session.events.record(json.dumps({"type": "ai_chunk", "content": str(i)}))
+    websocket = FakeWebSocket()
+    await resume(websocket, Session(), (2, Session.events.epoch))
+    hello, *replayed = websocket.sent
+    assert hello == {"type": "hello", "epoch": Session.events.epoch, "head": 4, "resumed": True}
+    assert [m["content"] for m in replayed] == ["2", "3"]
+
+
+class Client:
+    """The seq bookkeeping of web/static/game.js: onmessage's dedup and the hello handler."""
+
+    def __init__(self, epoch=None, last_seq=None):
+        self.epoch = epoch
+        self.last_seq = last_seq
+        self.applied = []
+
+    def query(self):
+        return {"since": str(self.last_seq), "epoch": self.epoch}
+
+    def receive(self, message):
+        if "seq" in message:
+            if self.last_seq is not None and message["seq"] <= self.last_seq:
+                return
+            self.last_seq = message["seq"]
+        if message["type"] == "hello":
+            if message["epoch"] != self.epoch or not message["resumed"]:
+                self.last_seq = message["head"]
+            self.epoch = message["epoch"]
+        else:
+            self.applied.append(message)
+
+
+class ReconnectingWebSocket(FakeWebSocket):
+    def __init__(self, query_params):
+        super().__init__()
+        self.query_params = query_params
+
+
+@pytest.mark.asyncio
+async def test_reconnect_applies_replayed_and_live_frames(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    from web.routes.websocket import resume, resume_from
+
+    class Session:
+        session_id = "story"
+        dirty = False
+        events = EventLog()
+
+    client = Client()
+    websocket = ReconnectingWebSocket({})
+    await resume(websocket, Session(), resume_from(websocket))
+    for i in range(2):
+        websocket.sent.append(json.loads(Session.events.record(json.dumps({"type": "ai_chunk", "content": str(i)}))))
+    for message in websocket.sent:
+        client.receive(message)
+
+    # Frames sent while the client was away are replayed after the hello, in the same epoch
+    for i in range(2, 4):
+        Session.events.record(json.dumps({"type": "ai_chunk", "content": str(i)}))
+    websocket = ReconnectingWebSocket(client.query())
+    await resume(websocket, Session(), resume_from(websocket))
+    websocket.sent.append(json.loads(Session.events.record(json.dumps({"type": "ai_chunk", "content": "4"}))))
+    for message in websocket.sent:
+        client.receive(message)
+    assert [m["content"] for m in client.applied] == ["0", "1", "2", "3", "4"]
+
+
+@pytest.mark.asyncio
+async def test_reconnect_to_a_new_epoch_applies_live_frames(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    from web.routes import websocket as websocket_route
+
+    async def history_page(story_id, include_tools=False):
+        return {"messages": [{"role": "ai", "content": "from storage"}], "next_cursor": None}
+    monkeypatch.setattr(websocket_route.aio, "get_history_page", history_page)
+
+    class Session:
+        session_id = "story"
+        dirty = False
+        events = EventLog()
+
+    # The server restarted: the client's epoch is gone and its seq is past the new log's
+    Session.events.record(json.dumps({"type": "ai_chunk", "content": "before"}))
+    client = Client(epoch="stale", last_seq=9)
+    websocket = ReconnectingWebSocket(client.query())
+    await websocket_route.resume(websocket, Session(), websocket_route.resume_from(websocket))
+    websocket.sent.append(json.loads(Session.events.record(json.dumps({"type": "ai_chunk", "content": "live"}))))
+    for message in websocket.sent:
+        client.receive(message)
+    assert client.epoch == Session.events.epoch
+    assert [m["type"] for m in client.applied] == ["history", "ai_chunk"]
+    assert client.applied[-1]["content"] == "live"
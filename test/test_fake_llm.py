@@ -0,0 +1,74 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain.schema import HumanMessage
+from langchain_core.messages import AIMessage
+from langchain_core.messages.tool import ToolMessage
+
+from web.game import tools
+from web.rpg.Character import Character
+from web.game.fake_llm import FakeChatModel, FakeLLMError, FakeScript, create_server
+
+
+def fast_script(script=None, **settings):
+    return FakeScript(script, ttft=0, tokens_per_second=0, **settings)
+
+
+@pytest.mark.asyncio
+async def test_creation_model_calls_create_character():
+    model = FakeChatModel(script=fast_script()).bind_tools(tools.CREATION_TOOL_SCHEMAS)
+    response = await model.ainvoke([HumanMessage(content="A bard")])
+    assert [call["name"] for call in response.tool_calls] == ["create_character"]
+    character = Character()
+    tools.dispatch("create_character", response.tool_calls[0]["args"], character)
+    assert character.name == "Aria"
+
+
+@pytest.mark.asyncio
+async def test_main_model_ends_tool_loop():
+    script = fast_script({"main": [{"tool_calls": [{"name": "add_item", "args": {
+        "name": "Coin", "description": "Shiny", "weight": 0.1}}]}, {"content": "You pocket the coin."}]})
+    model = FakeChatModel(script=script).bind_tools(tools.ACTION_TOOL_SCHEMAS)
+    first = [chunk async for chunk in model.astream([HumanMessage(content="Look around")])]
+    assert first[0].tool_call_chunks[0]["name"] == "add_item"
+
+    call_id = first[0].tool_call_chunks[0]["id"]
+    followup = [HumanMessage(content="Look around"),
+                AIMessage(content="", tool_calls=[{"name": "add_item", "args": {}, "id": call_id}]),
+                ToolMessage(content="Added", tool_call_id=call_id)]
+    chunks = [chunk async for chunk in model.astream(followup)]
+    assert "".join(chunk.content for chunk in chunks) == "You pocket the coin."
+
+
+@pytest.mark.asyncio
+async def test_scripted_and_random_errors():
+    model = FakeChatModel(script=fast_script({"plain": [{"error": "upstream down"}]}))
+    with pytest.raises(FakeLLMError, match="upstream down"):
+        await model.ainvoke([HumanMessage(content="Summarize")])
+
+    script = fast_script(error_rate=1.0)
+    with pytest.raises(FakeLLMError):
+        await FakeChatModel(script=script).ainvoke([HumanMessage(content="Summarize")])
+    assert script.stats() == {"calls": 1, "errors": 1}
+
+
+def test_server_speaks_openai_streaming():
+    from langchain_openai import ChatOpenAI
+
+    client = TestClient(create_server(fast_script()))
+    model = ChatOpenAI(model_name="gpt-4o-mini", api_key="sk-test", base_url="http://testserver/v1",
+                       http_client=client, streaming=True)
+    chunks = list(model.bind_tools(tools.ACTION_TOOL_SCHEMAS).stream([HumanMessage(content="Hello")]))
+    assert "".join(chunk.content for chunk in chunks).startswith("The lantern light")
+
+    response = model.bind_tools(tools.ACTION_TOOL_SCHEMAS).invoke([HumanMessage(content="Hello")])
+    assert response.tool_calls[0]["name"] == "add_item"
+
+
+def test_server_injects_errors_as_http_errors():
+    client = TestClient(create_server(fast_script({"plain": [{"error": "overloaded"}]})))
+    response = client.post("/v1/chat/completions", json={
+        "model": "gpt-4o-mini", "stream": True, "messages": [{"role": "user", "content": "Hi"}]})
+    assert response.status_code == 500
+    assert json.loads(response.text)["error"]["message"] == "overloaded"
@@ -0,0 +1,41 @@
+import asyncio
+import json
+
+import pytest
+
+from web.game.frames import FrameBatcher
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_coalesced_until_the_interval():
+    websocket = RecordingWebSocket()
+    frames = FrameBatcher(websocket, interval=0.02, max_bytes=10_000)
+    for word in ["You ", "enter ", "the ", "cave."]:
+        await frames.send_chunk(word)
+    assert websocket.sent == []
+    await asyncio.sleep(0.05)
+    assert websocket.sent == [{"type": "ai_chunk", "content": "You enter the cave."}]
+    assert frames.stats() == {"chunks_buffered": 4, "frames_sent": 1,
+                              "bytes_sent": len(json.dumps(websocket.sent[0]))}
+
+
+@pytest.mark.asyncio
+async def test_other_frames_flush_buffered_chunks_first():
+    websocket = RecordingWebSocket()
+    frames = FrameBatcher(websocket, interval=10, max_bytes=8)
+    await frames.send_chunk("abc")
+    await frames.send_chunk("defgh")  # reaches max_bytes
+    await frames.send_chunk("ij")
+    await frames.send_text(json.dumps({"type": "tool_call", "name": "see_health", "args": {}}))
+    await frames.send_chunk("kl")
+    await frames.close()
+    assert [(f["type"], f.get("content")) for f in websocket.sent] == [
+        ("ai_chunk", "abcdefgh"), ("ai_chunk", "ij"), ("tool_call", None), ("ai_chunk", "kl")]
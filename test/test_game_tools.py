@@ -0,0 +1,43 @@
+from web.game import session as session_module
+from web.game import tools
+from web.game.llm import LLMClientRegistry
+
+
+def make_sessions(monkeypatch, count):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(session_module, "llm_clients", LLMClientRegistry())
+    return [session_module.GameSession(f"story-{i}", "tester") for i in range(count)]
+
+
+def test_character_is_not_part_of_tool_schemas():
+    for schema in tools.ACTION_TOOL_SCHEMAS + tools.CREATION_TOOL_SCHEMAS:
+        assert "character" not in schema["function"]["parameters"].get("properties", {})
+
+
+def test_sessions_share_tools_and_bindings(monkeypatch):
+    first, second = make_sessions(monkeypatch, 2)
+    assert first.action_tools is second.action_tools
+    assert first.llm_main is second.llm_main
+    assert first.llm_observation is second.llm_observation
+
+
+def test_tool_calls_act_on_their_own_session(monkeypatch):
+    first, second = make_sessions(monkeypatch, 2)
+    first.call_tool("add_item", {"name": "Sword", "description": "Sharp", "weight": 2.0})
+    first.call_tool("adjust_health", {"amount": -4})
+
+    assert "Sword" in first.call_tool("see_inventory", {})
+    assert "Sword" not in second.call_tool("see_inventory", {})
+    assert first.player_character.health_and_mana["current_health"] == 6
+    assert second.player_character.health_and_mana["current_health"] == 10
+    assert second.call_tool("remove_item", {}).startswith("Error executing remove_item")
+
+    assert not first.character_created
+    first.call_tool("create_character", {
+        "name": "Aria", "lore": "A ranger.",
+        "level_and_experience": {"level": 1, "experience": 0, "experience_to_next_level": 10},
+        "health_and_mana": {"current_health": 10, "max_health": 10, "current_mana": 5, "max_mana": 5},
+        "equipment": {},
+    })
+    assert first.character_created
+    assert first.player_character.name == "Aria"
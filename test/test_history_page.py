@@ -0,0 +1,99 @@
+import pytest
+
+from web import user_management
+from web.storage import json_backend
+from web.storage.backend import is_visible_message
+from web.storage.sqlite_backend import SqliteStorage
+from web.utils import history_index, story_index
+
+HISTORY = [
+    {"role": "system", "content": "RPG Game Master Guidelines"},
+    {"role": "human", "content": "World Description:\nA swamp\n\nBegin the adventure."},
+    {"role": "ai", "content": "You wake up in a swamp."},
+] + [
+    message
+    for turn in range(40)
+    for message in (
+        {"role": "human", "content": f"action {turn}"},
+        {"role": "ai", "content": ""},
+        {"role": "tool", "content": "Added"},
+        {"role": "ai", "content": f"Tool AI called Tool add_item with arguments: {{}} and got response:\n Added {turn}"},
+        {"role": "ai", "content": f"answer {turn}"},
+    )
+]
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, tmp_path, monkeypatch):
+    if request.param == "sqlite":
+        storage = SqliteStorage(str(tmp_path / "storage.db"))
+    else:
+        for module in (user_management, json_backend, story_index):
+            monkeypatch.setattr(module, "USERS_DIR", str(tmp_path))
+        monkeypatch.setattr(story_index, "INDEX_FILE", str(tmp_path / ".story_index.jsonl"))
+        monkeypatch.setattr(story_index, "_entries", {})
+        monkeypatch.setattr(story_index, "_offset", 0)
+        monkeypatch.setattr(story_index, "_loaded", False)
+        monkeypatch.setattr(history_index, "SCAN_BLOCK", 7)
+        storage = json_backend.JsonStorage()
+    storage.create_user("alice", "hash")
+    story_id = storage.create_story("alice", "A swamp", "A frog")["story_data"]["id"]
+    storage.append_story_changes("alice", story_id, 0, HISTORY[:50])
+    return storage, story_id
+
+
+def read_all(storage, story_id, include_tools, limit):
+    pages, before = [], None
+    while True:
+        page = storage.get_history_page("alice", story_id, before, limit, include_tools)
+        pages.append(page["messages"])
+        before = page["next_cursor"]
+        if before is None:
+            return pages
+
+
+@pytest.mark.parametrize("include_tools", [False, True])
+def test_pages_walk_back_through_visible_messages(storage, include_tools):
+    storage, story_id = storage
+    # Saved after the first read too, so the JSON index is both built and updated
+    storage.get_history_page("alice", story_id)
+    storage.append_story_changes("alice", story_id, 50, HISTORY[50:])
+
+    pages = read_all(storage, story_id, include_tools, limit=9)
+    assert all(len(page) == 9 for page in pages[:-1])
+    messages = [message for page in pages for message in page]
+    expected = [dict(m, seq=seq) for seq, m in enumerate(HISTORY) if is_visible_message(m, include_tools)]
+    assert messages == expected[::-1]
+    assert messages[-1]["content"] == "You wake up in a swamp."
+
+
+def test_replaced_messages_are_paged_as_saved(storage):
+    storage, story_id = storage
+    storage.get_history_page("alice", story_id)
+    # A save from position 10 replaces everything after it
+    storage.append_story_changes("alice", story_id, 10, [{"role": "human", "content": "rewound"}])
+    page = storage.get_history_page("alice", story_id, limit=3)
+    assert [m["content"] for m in page["messages"]] == ["rewound", "action 1", "answer 0"]
+    assert page["next_cursor"] == 7
+    assert storage.get_history_page("alice", story_id, before=7, limit=3)["next_cursor"] is None
+
+
+@pytest.mark.skipif(history_index.fcntl is None, reason="no flock on this platform")
+def test_index_waits_for_another_process_holding_it(tmp_path):
+    import threading
+    fcntl = history_index.fcntl
+
+    story_file = str(tmp_path / "story.json")
+    # Another worker holds the story's index, e.g. while appending a save
+    with open(history_index.lock_path(story_file), "a") as other:
+        fcntl.flock(other, fcntl.LOCK_EX)
+        rebuild = threading.Thread(target=history_index.rebuild_index, args=(story_file, HISTORY))
+        rebuild.start()
+        rebuild.join(0.2)
+        assert rebuild.is_alive()
+        assert not history_index.has_index(story_file)
+    rebuild.join(5)
+    assert history_index.has_index(story_file)
+    page = history_index.read_page(story_file, None, 1, lambda message: True)
+    assert page[0]["content"] == HISTORY[-1]["content"]
+    assert not [name for name in tmp_path.iterdir() if name.suffix == ".tmp"]
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from web.game.scheduler import LLMScheduler, INTERACTIVE, OBSERVATION, CREATION
+
+
+async def hold(scheduler, user, priority, order, release):
+    async with scheduler.slot(user, priority):
+        order.append((user, priority))
+        await release.wait()
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_concurrency_cap():
+    scheduler = LLMScheduler(max_concurrency=2)
+    order, release = [], asyncio.Event()
+    tasks = [asyncio.create_task(hold(scheduler, f"u{i}", INTERACTIVE, order, release)) for i in range(5)]
+    await settle()
+    assert len(order) == 2
+    assert scheduler.stats()["waiting"] == 3
+    release.set()
+    await asyncio.gather(*tasks)
+    assert len(order) == 5
+    assert scheduler.running == 0 and scheduler.waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_priority_then_fair_turns():
+    scheduler = LLMScheduler(max_concurrency=1)
+    gate, order = asyncio.Event(), []
+    blocker = asyncio.create_task(hold(scheduler, "blocker", INTERACTIVE, [], gate))
+    await settle()
+
+    # One user's burst of creations, then observation and interactive calls from others
+    release = asyncio.Event()
+    release.set()
+    waiters = [asyncio.create_task(hold(scheduler, "burst", CREATION, order, release)) for _ in range(3)]
+    waiters.append(asyncio.create_task(hold(scheduler, "carol", CREATION, order, release)))
+    waiters.append(asyncio.create_task(hold(scheduler, "bob", OBSERVATION, order, release)))
+    waiters.append(asyncio.create_task(hold(scheduler, "alice", INTERACTIVE, order, release)))
+    waiters.append(asyncio.create_task(hold(scheduler, "bob", INTERACTIVE, order, release)))
+    await settle()
+    gate.set()
+    await asyncio.gather(blocker, *waiters)
+
+    assert order == [
+        ("alice", INTERACTIVE), ("bob", INTERACTIVE),
+        ("bob", OBSERVATION),
+        ("burst", CREATION), ("carol", CREATION), ("burst", CREATION), ("burst", CREATION),
+    ]
+    stats = scheduler.stats()
+    assert stats["classes"]["creation"]["admitted"] == 4
+    assert stats["classes"]["creation"]["queued"] == 4
+    assert stats["classes"]["creation"]["wait_max_ms"] > 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_a_slot():
+    scheduler = LLMScheduler(max_concurrency=1)
+    gate, order = asyncio.Event(), []
+    blocker = asyncio.create_task(hold(scheduler, "a", INTERACTIVE, order, gate))
+    await settle()
+    waiter = asyncio.create_task(hold(scheduler, "b", INTERACTIVE, order, gate))
+    await settle()
+    waiter.cancel()
+    await settle()
+    assert scheduler.waiting == 0
+    gate.set()
+    await blocker
+    assert scheduler.running == 0
+    assert scheduler.stats()["cancelled"] == 1
+    async with scheduler.slot("c"):
+        assert scheduler.running == 1
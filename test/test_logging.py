@@ -0,0 +1,71 @@
+import io
+import json
+import logging
+
+import pytest
+
+from web.storage import json_backend
+from web.storage.json_backend import JsonStorage
+from web.utils import log
+
+
+@pytest.fixture
+def stream():
+    stream = io.StringIO()
+    log.configure(level="INFO", levels="", sample="", stream=stream)
+    yield stream
+    log.configure()
+
+
+class Loud(dict):
+    """A message that fails the test if anything formats it."""
+
+    def __repr__(self):
+        raise AssertionError("message formatted for a log")
+
+    __str__ = __repr__
+
+
+def test_save_serializes_only_what_it_writes(tmp_path, monkeypatch, stream):
+    story_file = tmp_path / "story.json"
+    story_file.write_text(json.dumps({"id": "s1", "chat_history": []}))
+    monkeypatch.setattr(json_backend, "story_file_path", lambda username, story_id: str(story_file))
+
+    def dumps(*args, **kwargs):
+        raise AssertionError("story serialized for a log")
+    monkeypatch.setattr(json, "dumps", dumps)
+
+    history = [Loud(role="human", content="hello")]
+    result = JsonStorage().update_story_with_character("u", "s1", {"character": Loud(name="Aria"),
+                                                                   "chat_history": history})
+    assert result["success"]
+    with open(story_file) as f:
+        assert json.load(f)["chat_history"] == [{"role": "human", "content": "hello"}]
+    assert stream.getvalue() == ""
+
+
+def test_per_module_levels(stream):
+    log.configure(level="WARNING", levels="web.storage=DEBUG", sample="", stream=stream)
+    log.get_logger("web.storage.json_backend").debug("kept %s", 1)
+    log.get_logger("web.game.session").info("dropped")
+    log.get_logger("web.game.session").warning("warned")
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2
+    assert lines[0].endswith("DEBUG web.storage.json_backend: kept 1")
+    assert lines[1].endswith("WARNING web.game.session: warned")
+
+    # Reconfiguring drops the earlier module levels
+    log.configure(level="WARNING", levels="", sample="", stream=stream)
+    assert not logging.getLogger("web.storage").isEnabledFor(logging.DEBUG)
+
+
+def test_sampling_keeps_one_in_n_per_call_site(stream):
+    log.configure(level="INFO", levels="", sample="web.game.executor=10", stream=stream)
+    logger = log.get_logger("web.game.executor")
+    for i in range(25):
+        logger.info("turn %d", i)
+    for i in range(3):
+        logger.warning("limited %d", i)
+    lines = stream.getvalue().splitlines()
+    assert [line.split(": ", 1)[1] for line in lines] == ["turn 0", "turn 10", "turn 20",
+                                                          "limited 0", "limited 1", "limited 2"]
@@ -0,0 +1,201 @@
+import asyncio
+import multiprocessing
+
+import pytest
+
+WORKERS = 4
+TURNS = 5
+
+
+def create_story(results):
+    from web import user_management
+    user_management.register_user("lease-tester", "password")
+    result = user_management.create_story("lease-tester", "A shared world", "A hero")
+    results.put(result["story_data"]["id"])
+
+
+def play_turns(name, story_id, results):
+    results.put(asyncio.run(_play_turns(name, story_id)))
+
+
+async def _play_turns(name, story_id):
+    from langchain.schema import HumanMessage
+    from web.game.registry import SessionRegistry
+    from web.storage.write_behind import SaveScheduler
+
+    # Sessions stay cached between turns, so a worker must notice when another one wrote the story
+    registry = SessionRegistry(max_sessions=10, idle_ttl=3600, saver=SaveScheduler(window=0))
+    for turn in range(TURNS):
+        async with registry.use(story_id, wait=60) as session:
+            session.chat_history.append(HumanMessage(content=f"{name}-{turn}"))
+            await asyncio.sleep(0.01)
+    return registry.stats()
+
+
+def read_history(story_id, results):
+    from web.storage.backend import get_storage
+    username = get_storage().find_story_owner(story_id)
+    story = get_storage().get_story(username, story_id)["story_data"]
+    results.put([message["content"] for message in story["chat_history"]])
+
+
+def run_in_process(context, target, *args):
+    results = context.Queue()
+    process = context.Process(target=target, args=(*args, results))
+    process.start()
+    result = results.get(timeout=120)
+    process.join(timeout=30)
+    return result
+
+
+def test_workers_sharing_a_story_lose_no_updates(tmp_path, monkeypatch):
+    # Fresh processes, so every worker reads this configuration on import
+    monkeypatch.setenv("USERS_DIR", str(tmp_path / "users"))
+    monkeypatch.setenv("SESSION_LEASE_DB", str(tmp_path / "leases.db"))
+    monkeypatch.setenv("SESSION_LEASE_TTL", "5")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    context = multiprocessing.get_context("spawn")
+
+    story_id = run_in_process(context, create_story)
+
+    results = context.Queue()
+    workers = [context.Process(target=play_turns, args=(f"w{i}", story_id, results)) for i in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    stats = [results.get(timeout=120) for _ in workers]
+    for worker in workers:
+        worker.join(timeout=30)
+        assert worker.exitcode == 0
+
+    history = run_in_process(context, read_history, story_id)
+    expected = {f"w{i}-{turn}" for i in range(WORKERS) for turn in range(TURNS)}
+    written = [content for content in history if content in expected]
+    assert sorted(written) == sorted(expected)
+    assert all(s["leases_held"] == 0 for s in stats)
+
+
+class StoredSession:
+    def __init__(self, session_id, store):
+        self.session_id = session_id
+        self.store = store
+        self.history = list(store.get(session_id, []))
+        self.lease_guard = None
+
+    async def save_session(self):
+        async with self.lease_guard() as owned:
+            if owned:
+                self.store[self.session_id] = list(self.history)
+
+
+class FlushingSaver:
+    async def flush(self, session):
+        await session.save_session()
+
+
+class SlowSession(StoredSession):
+    def __init__(self, session_id, store):
+        super().__init__(session_id, store)
+        self._save_lock = asyncio.Lock()
+
+    async def save_session(self):
+        async with self._save_lock:
+            await asyncio.sleep(0.1)
+            await super().save_session()
+
+
+class IdleSaver:
+    async def flush(self, session):
+        pass
+
+
+def worker_registry(tmp_path, name, store, session_class=StoredSession, saver=None, ttl=0.3):
+    from web.game.registry import SessionRegistry
+    from web.storage.leases import LeaseStore
+
+    async def loader(session_id):
+        return session_class(session_id, store)
+
+    leases = LeaseStore(str(tmp_path / "leases.db"), ttl=ttl, worker_id=name)
+    return SessionRegistry(max_sessions=10, idle_ttl=3600, loader=loader, saver=saver or FlushingSaver(),
+                           use_leases=True, lease_store=leases)
+
+
+@pytest.mark.asyncio
+async def test_cached_session_is_reloaded_after_another_worker_owned_it(tmp_path):
+    store = {"story": []}
+    a, b = worker_registry(tmp_path, "a", store), worker_registry(tmp_path, "b", store)
+    async with a.use("story") as session:
+        session.history.append("a1")
+    async with b.use("story") as session:
+        session.history.append("b1")
+    async with a.use("story") as session:
+        assert session.history == ["a1", "b1"]
+        session.history.append("a2")
+    assert store["story"] == ["a1", "b1", "a2"]
+    assert a.stats()["stale_reloads"] == 1
+
+
+@pytest.mark.asyncio
+async def test_busy_story_asks_its_owner_to_hand_off(tmp_path):
+    from web.game.registry import SessionBusyError
+
+    store = {"story": []}
+    a, b = worker_registry(tmp_path, "a", store), worker_registry(tmp_path, "b", store)
+    revoked = asyncio.Event()
+
+    async def on_revoke():
+        revoked.set()
+
+    async with a.use("story", on_revoke=on_revoke) as session:
+        session.history.append("a1")
+        with pytest.raises(SessionBusyError):
+            async with b.use("story", wait=0.05):
+                pass
+        await asyncio.wait_for(revoked.wait(), timeout=2)
+    # Released on the way out, so the other worker gets it with a's changes
+    async with b.use("story", wait=0.05) as session:
+        assert session.history == ["a1"]
+    assert b.stats()["busy_rejections"] == 1
+
+
+@pytest.mark.asyncio
+async def test_lease_is_released_only_after_a_running_save(tmp_path):
+    store = {"story": []}
+    # The saver has nothing pending; the save below was started outside it
+    a = worker_registry(tmp_path, "a", store, session_class=SlowSession, saver=IdleSaver())
+    b = worker_registry(tmp_path, "b", store)
+    async with a.use("story") as session:
+        session.history.append("a1")
+        saving = asyncio.create_task(session.save_session())
+        await asyncio.sleep(0.01)
+    async with b.use("story", wait=0.05) as session:
+        assert session.history == ["a1"]
+    await saving
+
+
+@pytest.mark.asyncio
+async def test_handoff_is_noticed_within_the_default_wait(tmp_path):
+    from web.game.registry import SESSION_LEASE_WAIT
+    from web.storage.leases import SESSION_LEASE_TTL
+
+    # Leases are renewed every ttl / 3, longer than a requester waits by default
+    assert SESSION_LEASE_TTL / 3 > SESSION_LEASE_WAIT
+    store = {"story": []}
+    a = worker_registry(tmp_path, "a", store, ttl=SESSION_LEASE_TTL)
+    b = worker_registry(tmp_path, "b", store, ttl=SESSION_LEASE_TTL)
+    revoked = asyncio.Event()
+
+    async def on_revoke():
+        revoked.set()
+
+    async def hold():
+        async with a.use("story", on_revoke=on_revoke) as session:
+            session.history.append("a1")
+            await revoked.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0.05)
+    async with b.use("story") as session:
+        assert session.history == ["a1"]
+    await holder
+    assert b.stats()["busy_rejections"] == 0
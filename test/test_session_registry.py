@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from web.game.registry import SessionRegistry
+
+
+class FakeSession:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.chat_history = ["message"] * 10
+
+
+class FakeSaver:
+    def __init__(self):
+        self.flushed = []
+
+    async def flush(self, session):
+        await asyncio.sleep(0)
+        self.flushed.append(session.session_id)
+
+
+class FakeLoader:
+    def __init__(self):
+        self.loads = []
+
+    async def __call__(self, session_id):
+        self.loads.append(session_id)
+        await asyncio.sleep(0.01)
+        return FakeSession(session_id) if session_id != "missing" else None
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_sessions_are_flushed_and_reloaded():
+    saver, loader = FakeSaver(), FakeLoader()
+    registry = SessionRegistry(max_sessions=2, idle_ttl=3600, loader=loader, saver=saver, use_leases=False)
+    await registry.add(FakeSession("a"))
+    await registry.add(FakeSession("b"))
+    await registry.get("a")
+    await registry.add(FakeSession("c"))
+    assert saver.flushed == ["b"]
+    assert "b" not in registry
+
+    session = await registry.get("b")
+    assert session.session_id == "b"
+    assert loader.loads == ["b"]
+    assert saver.flushed == ["b", "a"]
+    assert await registry.get("missing") is None
+
+    stats = registry.stats()
+    assert (stats["hits"], stats["misses"], stats["loads"], stats["evictions"]) == (1, 2, 1, 2)
+    assert stats["live_sessions"] == 2
+    assert stats["memory_per_session"] > 0
+
+
+@pytest.mark.asyncio
+async def test_pinned_sessions_survive_idle_and_capacity_eviction():
+    saver = FakeSaver()
+    registry = SessionRegistry(max_sessions=1, idle_ttl=0.01, loader=FakeLoader(), saver=saver, use_leases=False)
+    await registry.add(FakeSession("a"))
+    async with registry.use("a") as session:
+        assert session.session_id == "a"
+        await registry.add(FakeSession("b"))
+        await asyncio.sleep(0.02)
+        await registry.evict()
+        assert "a" in registry
+        assert saver.flushed == ["b"]
+    await asyncio.sleep(0.02)
+    await registry.evict()
+    assert "a" not in registry
+    assert registry.stats()["idle_evictions"] == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_load():
+    loader = FakeLoader()
+    registry = SessionRegistry(max_sessions=10, idle_ttl=3600, loader=loader, saver=FakeSaver(), use_leases=False)
+    sessions = await asyncio.gather(*(registry.get("a") for _ in range(5)))
+    assert loader.loads == ["a"]
+    assert all(s is sessions[0] for s in sessions)
@@ -0,0 +1,59 @@
+import json
+import os
+
+from web.storage.sqlite_backend import SqliteStorage
+from web.storage.migrate import migrate
+
+
+def test_story_lifecycle(tmp_path):
+    storage = SqliteStorage(str(tmp_path / "storage.db"))
+    assert storage.create_user("Alice", "hash")["success"]
+    assert not storage.create_user("alice", "hash")["success"]
+    assert storage.get_user("ALICE")["password_hash"] == "hash"
+
+    story_id = storage.create_story("alice", "A world " * 10, "A hero")["story_data"]["id"]
+    assert storage.find_story_owner(story_id) == "alice"
+    assert storage.get_user_stories("alice")[0]["world_description"].endswith("...")
+
+    history = [{"role": "system", "content": "rules"}, {"role": "human", "content": "hi"}]
+    storage.append_story_changes("alice", story_id, 0, history, {"name": "Aria"})
+    storage.append_story_changes("alice", story_id, 1, [{"role": "human", "content": "hello"}])
+    storage.append_story_changes("alice", story_id, 2, [{"role": "ai", "content": "greetings"}])
+    story = storage.get_story("alice", story_id)["story_data"]
+    assert [m["content"] for m in story["chat_history"]] == ["rules", "hello", "greetings"]
+    assert story["character"] == {"name": "Aria"}
+
+    storage.append_story_changes("alice", story_id, 1, [], truncate=True)
+    assert len(storage.get_story("alice", story_id)["story_data"]["chat_history"]) == 1
+
+    assert storage.delete_story("alice", story_id)["success"]
+    assert storage.find_story_owner(story_id) is None
+    assert not storage.get_story("alice", story_id)["success"]
+
+
+def test_migrate_json_tree(tmp_path):
+    users_dir = tmp_path / "users"
+    os.makedirs(users_dir / "bob")
+    (users_dir / "bob.json").write_text(json.dumps({
+        "username": "Bob",
+        "password_hash": "hash",
+        "created_at": "2024-01-01T00:00:00",
+        "stories": [{"id": "s1"}],
+    }))
+    (users_dir / "bob" / "s1.json").write_text(json.dumps({
+        "id": "s1",
+        "created_at": "2024-01-01T00:00:00",
+        "last_updated": "2024-01-02T00:00:00",
+        "world_description": "World",
+        "character_description": "Hero",
+        "chat_history": [{"role": "human", "content": "hi"}],
+        "character": {"name": "Bob the Brave"},
+    }))
+    db = str(tmp_path / "storage.db")
+    assert migrate(str(users_dir), db) == {"users": 1, "stories": 1}
+    assert migrate(str(users_dir), db) == {"users": 0, "stories": 0}
+
+    story = SqliteStorage(db).get_story("bob", "s1")["story_data"]
+    assert story["last_updated"] == "2024-01-02T00:00:00"
+    assert story["chat_history"] == [{"role": "human", "content": "hi"}]
+    assert story["character"] == {"name": "Bob the Brave"}
@@ -0,0 +1,48 @@
+from langchain.schema import HumanMessage
+
+from web.game import helpers
+from web.game import session as session_module
+from web.game.llm import LLMClientRegistry
+
+
+def make_session(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(session_module, "llm_clients", LLMClientRegistry())
+    session = session_module.GameSession("story", "tester")
+    session.context = None
+    return session
+
+
+def test_digest_is_rebuilt_only_after_mutating_tools(monkeypatch):
+    session = make_session(monkeypatch)
+    first = session.digest.message(session)
+    session.call_tool("see_inventory", {})
+    session.call_tool("see_health", {})
+    session.dirty = False
+    assert session.call_tool("cast_fireball", {}) == "Unknown tool 'cast_fireball'"
+    assert not session.dirty
+    assert session.digest.message(session) is first
+    assert session.digest.rebuilds == 1
+
+    session.call_tool("add_item", {"name": "Rope", "description": "Hemp", "weight": 1.5, "amount": 2})
+    session.call_tool("adjust_health", {"amount": -3})
+    digest = session.digest.message(session).content
+    assert session.digest.rebuilds == 2
+    assert "Health 7/10" in digest
+    assert "Rope x2" in digest
+    assert "(3/30kg)" in digest
+
+
+def test_digest_mode_pins_state_after_system_prompt(monkeypatch):
+    session = make_session(monkeypatch)
+    session.chat_history.append(HumanMessage(content="Where am I?"))
+
+    monkeypatch.setattr(helpers, "OBSERVATION_MODE", "llm")
+    assert list(helpers.prompt_messages(session)) == list(session.chat_history)
+
+    monkeypatch.setattr(helpers, "OBSERVATION_MODE", "digest")
+    prompt = helpers.prompt_messages(session)
+    assert prompt[0] is session.game_system
+    assert prompt[1].content.startswith("Character state v0")
+    assert prompt[2:] == list(session.chat_history[1:])
+    assert len(session.chat_history) == 2
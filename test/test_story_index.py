@@ -0,0 +1,63 @@
+import json
+import os
+
+import pytest
+
+from web.utils import story_index
+
+
+@pytest.fixture
+def users_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(story_index, "USERS_DIR", str(tmp_path))
+    monkeypatch.setattr(story_index, "INDEX_FILE", str(tmp_path / ".story_index.jsonl"))
+    monkeypatch.setattr(story_index, "_entries", {})
+    monkeypatch.setattr(story_index, "_offset", 0)
+    monkeypatch.setattr(story_index, "_file_id", None)
+    monkeypatch.setattr(story_index, "_loaded", False)
+    return tmp_path
+
+
+def make_story(users_dir, username, story_id):
+    (users_dir / f"{username}.json").write_text(json.dumps({"username": username}))
+    os.makedirs(users_dir / username, exist_ok=True)
+    (users_dir / username / f"{story_id}.json").write_text("{}")
+
+
+def test_missing_index_is_rebuilt_from_tree(users_dir):
+    make_story(users_dir, "alice", "s1")
+    make_story(users_dir, "bob", "s2")
+    assert story_index.find_story_owner("s1") == "alice"
+    assert story_index.find_story("s2")["path"] == os.path.join(str(users_dir), "bob", "s2.json")
+    assert story_index.find_story("missing") is None
+
+
+def test_add_and_remove_story(users_dir):
+    story_index.add_story("s3", "Carol")
+    assert story_index.find_story_owner("s3") == "carol"
+    story_index.remove_story("s3")
+    assert story_index.find_story_owner("s3") is None
+
+
+def test_records_from_other_workers_are_picked_up(users_dir):
+    story_index.add_story("s4", "dave")
+    with open(story_index.INDEX_FILE, "a") as f:
+        f.write(json.dumps({"op": "put", "id": "s5", "username": "erin", "path": "erin/s5.json"}) + "\n")
+    assert story_index.find_story_owner("s5") == "erin"
+
+
+def test_index_rebuilt_by_another_process_is_reloaded(users_dir):
+    for i in range(5):
+        story_index.add_story(f"old{i}", "alice")
+    assert story_index.find_story_owner("old0") == "alice"
+
+    # Another process rebuilds the index (shorter than our offset), then a worker adds a story
+    index = users_dir / ".story_index.jsonl"
+    replacement = users_dir / "rebuilt.tmp"
+    replacement.write_text(json.dumps({"op": "put", "id": "s1", "username": "bob", "path": "bob/s1.json"}) + "\n")
+    os.replace(replacement, index)
+    with open(index, "a") as f:
+        f.write(json.dumps({"op": "put", "id": "s2", "username": "bob", "path": "bob/s2.json"}) + "\n")
+
+    assert story_index.find_story_owner("s2") == "bob"
+    assert story_index.find_story_owner("s1") == "bob"
+    assert story_index.find_story_owner("old0") is None
@@ -0,0 +1,52 @@
+import json
+
+from web.utils import story_journal
+from web.utils.story_journal import (
+    append_records, load_story_file, journal_path,
+    message_record, truncate_record, character_record
+)
+
+
+def write_story(tmp_path, chat_history):
+    story_file = str(tmp_path / "story.json")
+    with open(story_file, "w") as f:
+        json.dump({"id": "story", "chat_history": chat_history}, f)
+    return story_file
+
+
+def test_replay_appends_truncates_and_sets_character(tmp_path):
+    story_file = write_story(tmp_path, [{"role": "system", "content": "rules"}])
+    append_records(story_file, [
+        message_record(1, {"role": "human", "content": "hello"}),
+        message_record(2, {"role": "ai", "content": "hi"}),
+        character_record({"name": "Aria"}),
+    ])
+    # History was replaced from position 1 onwards
+    append_records(story_file, [message_record(1, {"role": "human", "content": "restart"})])
+    story = load_story_file(story_file)
+    assert [m["content"] for m in story["chat_history"]] == ["rules", "restart"]
+    assert story["character"] == {"name": "Aria"}
+    assert "last_updated" in story
+
+    append_records(story_file, [truncate_record(1)])
+    assert load_story_file(story_file)["chat_history"] == [{"role": "system", "content": "rules"}]
+
+
+def test_compaction_folds_journal_into_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(story_journal, "JOURNAL_COMPACT_EVERY", 5)
+    story_file = write_story(tmp_path, [])
+    for i in range(7):
+        append_records(story_file, [message_record(i, {"role": "human", "content": str(i)})])
+    with open(story_file) as f:
+        snapshot = json.load(f)
+    assert len(snapshot["chat_history"]) == 5
+    story = load_story_file(story_file)
+    assert [m["content"] for m in story["chat_history"]] == [str(i) for i in range(7)]
+
+
+def test_torn_final_line_is_ignored(tmp_path):
+    story_file = write_story(tmp_path, [])
+    append_records(story_file, [message_record(0, {"role": "human", "content": "ok"})])
+    with open(journal_path(story_file), "a") as f:
+        f.write('{"op": "message", "seq": 1, "ro')
+    assert load_story_file(story_file)["chat_history"] == [{"role": "human", "content": "ok"}]
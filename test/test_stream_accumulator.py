@@ -0,0 +1,43 @@
+from langchain.schema import AIMessage
+from langchain_core.messages import AIMessageChunk
+
+from web.game.streaming import StreamAccumulator
+
+
+def stream():
+    return [
+        AIMessageChunk(content="You ", id="run-1"),
+        AIMessageChunk(content="find a sword.", id="run-1"),
+        AIMessageChunk(content="", tool_call_chunks=[
+            {"name": "add_item", "args": '{"name": "Sw', "id": "call-1", "index": 0}]),
+        AIMessageChunk(content="", tool_call_chunks=[
+            {"name": None, "args": 'ord", "weight": 2.5}', "id": None, "index": 0}]),
+        AIMessageChunk(content="", tool_call_chunks=[
+            {"name": "see_health", "args": "", "id": "call-2", "index": 1}]),
+    ]
+
+
+def test_accumulator_matches_chunk_addition():
+    gathered = None
+    accumulator = StreamAccumulator()
+    for chunk in stream():
+        gathered = chunk if gathered is None else gathered + chunk
+        accumulator.add(chunk)
+    message = accumulator.message()
+
+    assert isinstance(message, AIMessage)
+    assert message.content == gathered.content == "You find a sword."
+    assert message.tool_calls == gathered.tool_calls
+    assert message.tool_calls[0]["args"] == {"name": "Sword", "weight": 2.5}
+    assert message.tool_calls[1]["args"] == {}
+    assert message.id == "run-1"
+
+
+def test_unparseable_arguments_become_invalid_tool_calls():
+    accumulator = StreamAccumulator()
+    accumulator.add(AIMessageChunk(content="", tool_call_chunks=[
+        {"name": "add_item", "args": '{"name": ', "id": "call-1", "index": 0}]))
+    message = accumulator.message()
+    assert message.tool_calls == []
+    assert message.invalid_tool_calls[0]["name"] == "add_item"
+    assert StreamAccumulator().message() is None
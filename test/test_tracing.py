@@ -0,0 +1,83 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from langchain.schema import HumanMessage
+
+from web.utils.tracing import Tracer, NOOP_SPAN, tracer
+
+
+def test_span_histograms_and_exposition():
+    spans = Tracer(buckets=(0.01, 0.1))
+    spans.observe("save", 0.005, session="s1")
+    spans.observe("save", 0.05, session="s2")
+    spans.observe("call_tool", 0.2, tool='say "hi"')
+    spans.register("saves", lambda: {"saves_written": 2, "nested": {"ok": True}, "note": "skipped"})
+
+    text = spans.exposition()
+    assert 'airpg_span_seconds_bucket{span="save",le="0.01"} 1' in text
+    assert 'airpg_span_seconds_bucket{span="save",le="0.1"} 2' in text
+    assert 'airpg_span_seconds_bucket{span="save",le="+Inf"} 2' in text
+    assert 'airpg_span_seconds_count{span="save"} 2' in text
+    # The session is a trace tag, not a metric label
+    assert "s1" not in text
+    assert 'airpg_span_seconds_count{span="call_tool",tool="say \\"hi\\""} 1' in text
+    assert "airpg_saves_saves_written 2" in text
+    assert "airpg_saves_nested_ok 1" in text
+    assert "note" not in text
+
+
+def test_disabled_tracer_records_nothing():
+    spans = Tracer(enabled=False)
+    assert spans.span("save", session="s1") is NOOP_SPAN
+    with spans.span("save"):
+        pass
+    spans.observe("save", 1.0)
+    assert spans.exposition() == "\n"
+
+
+@pytest.mark.asyncio
+async def test_turn_trace(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    from web.game import tools
+    from web.game.fake_llm import FakeChatModel, FakeScript
+    from web.game.helpers import run_turn
+    from web.game.session import GameSession
+
+    monkeypatch.setattr(tracer, "enabled", True)
+    script = FakeScript({"main": [{"tool_calls": [{"name": "adjust_health", "args": {"amount": -1}}]},
+                                  {"content": "Ouch."}]}, ttft=0, tokens_per_second=0)
+    session = GameSession("trace-story", "trace-user")
+    session.llm_main = FakeChatModel(script=script).bind_tools(tools.ACTION_TOOL_SCHEMAS)
+    session.llm_observation = FakeChatModel(script=script).bind_tools(tools.OBSERVATION_TOOL_SCHEMAS)
+    session.context.summarizer = None
+    session.player_character.health_and_mana = {"current_health": 5, "max_health": 5,
+                                                "current_mana": 0, "max_mana": 0}
+    session.chat_history.append(HumanMessage(content="I trip."))
+
+    await run_turn(None, session)
+
+    names = [span["span"] for span in session.last_turn_trace]
+    for name in ("observation_llm", "main_llm_ttft", "main_llm", "call_tool", "tool_round", "turn"):
+        assert name in names
+    assert names[-1] == "turn"
+    tools_called = {span["tool"] for span in session.last_turn_trace if span["span"] == "call_tool"}
+    assert tools_called == {"see_health", "adjust_health"}
+    assert all(span.get("session") == "trace-story" for span in session.last_turn_trace
+               if span["span"] in ("call_tool", "main_llm"))
+    main = next(span for span in session.last_turn_trace if span["span"] == "main_llm")
+    assert main["model"] == "fake"
+
+
+def test_metrics_endpoint(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    from web.routes.metrics import router
+
+    app = FastAPI()
+    app.include_router(router)
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    for name in ("airpg_llm_scheduler_max_concurrency", "airpg_saves_saves_written",
+                 "airpg_sessions_live_sessions", "airpg_turns_turns", "airpg_frames_frames_sent",
+                 "airpg_character_sync_patches", "airpg_events_events", "airpg_llm_clients_requests"):
+        assert name in response.text
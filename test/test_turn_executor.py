@@ -0,0 +1,79 @@
+import json
+
+import pytest
+from langchain.schema import SystemMessage
+from langchain_core.messages import AIMessageChunk
+from langchain_core.messages.tool import ToolMessage
+
+from web.game import executor as executor_module
+from web.game.executor import TurnExecutor, call_segments
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+class LoopingSession:
+    """A model that calls a tool on every answer, with new or identical arguments."""
+
+    def __init__(self, same_args):
+        self.same_args = same_args
+        self.chat_history = [SystemMessage(content="system")]
+        self.observation_tools = {"see_health"}
+        self.llm_main = self
+        self.answers = 0
+        self.calls = []
+
+    async def astream(self, messages):
+        self.answers += 1
+        amount = 1 if self.same_args else self.answers
+        yield AIMessageChunk(content="", tool_call_chunks=[
+            {"name": "adjust_health", "args": json.dumps({"amount": amount}), "id": f"id{self.answers}", "index": 0}])
+
+    def call_tool(self, name, args):
+        self.calls.append((name, args))
+        return "ok"
+
+
+def unanswered_tool_calls(history):
+    answered = {m.tool_call_id for m in history if isinstance(m, ToolMessage)}
+    return [c for m in history for c in getattr(m, "tool_calls", []) if c["id"] not in answered]
+
+
+@pytest.mark.asyncio
+async def test_tool_rounds_are_capped(monkeypatch):
+    monkeypatch.setattr(executor_module, "MAX_TOOL_ROUNDS", 3)
+    session = LoopingSession(same_args=False)
+    websocket = RecordingWebSocket()
+    executor = TurnExecutor(websocket, session, lambda s: s.chat_history)
+    assert await executor.run() is False
+
+    assert executor.stats()["rounds"] == 3
+    assert executor.stats()["stop_reason"] == "max_rounds"
+    assert len(session.calls) == 3
+    assert session.answers == 4
+    assert unanswered_tool_calls(session.chat_history) == []
+    assert websocket.sent[-1]["type"] == "system"
+
+
+@pytest.mark.asyncio
+async def test_repeated_identical_calls_end_the_turn():
+    session = LoopingSession(same_args=True)
+    executor = TurnExecutor(None, session, lambda s: s.chat_history)
+    assert await executor.run() is False
+
+    assert executor.stats()["stop_reason"] == "repeated_calls"
+    assert executor.stats()["repeated_calls"] == 1
+    assert len(session.calls) == 1
+    assert unanswered_tool_calls(session.chat_history) == []
+
+
+def test_read_only_calls_are_grouped_between_mutating_calls():
+    calls = [{"name": n} for n in ["see_health", "see_mana", "add_item", "see_inventory", "level_up", "level_up"]]
+    segments = call_segments(calls, {"see_health", "see_mana", "see_inventory"})
+    assert [[c["name"] for c in s] for s in segments] == [
+        ["see_health", "see_mana"], ["add_item"], ["see_inventory"], ["level_up"], ["level_up"]]
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from langchain_core.messages import AIMessageChunk
+
+from web.game import helpers
+
+
+class FakeModel:
+    def __init__(self, chunks, delay=0.0):
+        self.chunks = chunks
+        self.delay = delay
+        self.calls = 0
+
+    async def astream(self, messages):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        for chunk in self.chunks(messages):
+            yield chunk
+
+
+class FakeSession:
+    def __init__(self):
+        self.observation_system = SystemMessage(content="observe")
+        self.chat_history = [SystemMessage(content="system")]
+        self.health = 10
+        self.llm_observation = FakeModel(lambda messages: [AIMessageChunk(content="", tool_call_chunks=[
+            {"name": "see_health", "args": "{}", "id": "obs", "index": 0}])], delay=0.01)
+        self.llm_main = FakeModel(self.main_chunks)
+
+    def main_chunks(self, messages):
+        if any(m.type == "tool" for m in messages):
+            return [AIMessageChunk(content="You feel weaker.")]
+        return [AIMessageChunk(content="", tool_call_chunks=[
+            {"name": "adjust_health", "args": '{"amount": -1}', "id": "main", "index": 0}])]
+
+    def call_tool(self, name, args):
+        if name == "adjust_health":
+            self.health += args["amount"]
+        return f"Health: {self.health}"
+
+    def get_character_data(self):
+        return {"health": self.health}
+
+
+@pytest.mark.asyncio
+async def test_observation_is_merged_before_the_next_tool_round(monkeypatch):
+    monkeypatch.setattr(helpers, "TURN_PIPELINE", "concurrent")
+    session = FakeSession()
+    session.chat_history.append(HumanMessage(content="I jump off the wall"))
+    await helpers.run_turn(None, session)
+
+    contents = [m.content for m in session.chat_history]
+    observed = next(i for i, c in enumerate(contents) if c.startswith("Observation AI called Tool see_health"))
+    tool_round = next(i for i, m in enumerate(session.chat_history) if m.type == "tool")
+    assert tool_round < observed < len(contents) - 1
+    assert contents[-1] == "You feel weaker."
+
+
+@pytest.mark.asyncio
+async def test_observation_is_skipped_when_character_is_unchanged(monkeypatch):
+    monkeypatch.setattr(helpers, "TURN_PIPELINE", "concurrent")
+    session = FakeSession()
+    session.llm_main = FakeModel(lambda messages: [AIMessageChunk(content="Nothing happens.")])
+    for turn in range(3):
+        session.chat_history.append(HumanMessage(content=f"I wait ({turn})"))
+        await helpers.run_turn(None, session)
+    assert session.llm_observation.calls == 1
+    assert isinstance(session.chat_history[-1], AIMessage)
+
+
+@pytest.mark.asyncio
+async def test_narration_stays_last_for_the_next_observation(monkeypatch):
+    monkeypatch.setattr(helpers, "TURN_PIPELINE", "concurrent")
+    session = FakeSession()
+    # The main model answers before the observation pass is done
+    session.llm_main = FakeModel(lambda messages: [AIMessageChunk(content="The wall is high.")])
+    session.chat_history.append(HumanMessage(content="I look at the wall"))
+    await helpers.run_turn(None, session)
+
+    contents = [m.content for m in session.chat_history]
+    assert contents[-2].startswith("Observation AI called Tool see_health")
+    assert contents[-1] == "The wall is high."
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from web.storage.write_behind import SaveScheduler
+
+
+class FakeSession:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.dirty = True
+        self.writes = 0
+
+    async def save_session(self):
+        self.dirty = False
+        self.writes += 1
+        return {"success": True}
+
+
+@pytest.mark.asyncio
+async def test_requests_within_window_are_coalesced():
+    scheduler = SaveScheduler(window=0.05)
+    session = FakeSession("s1")
+    for _ in range(5):
+        scheduler.request_save(session)
+    await asyncio.sleep(0.1)
+    assert session.writes == 1
+    assert scheduler.stats()["saves_requested"] == 5
+    assert scheduler.stats()["saves_written"] == 1
+
+    # Nothing changed since, so the next request does not write
+    scheduler.request_save(session)
+    await asyncio.sleep(0.1)
+    assert session.writes == 1
+    assert scheduler.stats()["saves_skipped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_immediately_and_cancels_pending_save():
+    scheduler = SaveScheduler(window=10)
+    session = FakeSession("s2")
+    scheduler.request_save(session)
+    await scheduler.flush(session)
+    assert session.writes == 1
+    assert scheduler.stats()["saves_pending"] == 0
+
+    session.dirty = True
+    scheduler.request_save(session)
+    await scheduler.flush_all()
+    assert session.writes == 2
+
+
+class SlowSession(FakeSession):
+    """Clears its dirty flag as soon as the write starts, like GameSession._write_story."""
+
+    def __init__(self, session_id):
+        super().__init__(session_id)
+        self.stored = 0
+
+    async def save_session(self):
+        self.dirty = False
+        self.writes += 1
+        await asyncio.sleep(0.05)
+        self.stored += 1
+        return {"success": True}
+
+
+@pytest.mark.asyncio
+async def test_flush_waits_for_a_save_in_progress():
+    scheduler = SaveScheduler(window=0)
+    session = SlowSession("s4")
+    scheduler.request_save(session)
+    await asyncio.sleep(0.01)
+    assert session.writes == 1 and session.stored == 0
+
+    await scheduler.flush(session)
+    assert session.stored == 1
+    assert session.writes == 1
+
+    # Changes made while a save runs are written by the flush after it
+    session.dirty = True
+    scheduler.request_save(session)
+    await asyncio.sleep(0.01)
+    session.dirty = True
+    await scheduler.flush(session)
+    assert session.stored == 3
+    assert scheduler.stats()["saves_writing"] == 0
@@ -3,11 +3,29 @@ from web.routes.auth import router as auth_router
 from web.routes.stories import router as stories_router
 from web.routes.game import router as game_router
 from web.routes.websocket import router as websocket_router
+from web.routes.metrics import router as metrics_router
+from web.storage.write_behind import save_scheduler
+from web.game.llm import llm_clients
+from web.game.registry import session_registry
 
 app.include_router(auth_router)
 app.include_router(stories_router)
 app.include_router(game_router)
 app.include_router(websocket_router)
+app.include_router(metrics_router)
+
+
+@app.on_event("startup")
+async def startup():
+    session_registry.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await session_registry.close()
+    await save_scheduler.flush_all()
+    await llm_clients.aclose()
+
 
 if __name__ == "__main__":
     import uvicorn
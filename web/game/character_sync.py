@@ -0,0 +1,91 @@
+"""
+Character state pushed to a connection as RFC 6902 JSON Patch deltas.
+
+CharacterSync remembers the character state last sent on its connection.
+The first push (and any push after the client asks to resync) sends the
+whole state as a `character_update`; later pushes send a `character_patch`
+with the operations turning the previous state into the new one, or
+nothing when the state did not change. Every frame carries a revision and
+a patch names the revision it applies to, so a client that missed or
+failed to apply a frame can tell and send {"type": "resync"}.
+"""
+import copy
+import json
+from typing import Dict, Any, Optional
+
+import jsonpatch
+
+# Totals over every connection of this worker
+sync_totals = {
+    "full_updates": 0,
+    "patches": 0,
+    "unchanged": 0,
+    "bytes_sent": 0,
+}
+
+
+def is_resync_request(text: str) -> bool:
+    """Whether a client frame is a resync request rather than player input."""
+    if not text.startswith("{"):
+        return False
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return False
+    return isinstance(message, dict) and message.get("type") == "resync"
+
+
+class CharacterSync:
+    def __init__(self):
+        self.revision = 0
+        self.full_updates = 0
+        self.patches = 0
+        self.unchanged = 0
+        self.bytes_sent = 0
+        self._sent: Optional[Dict[str, Any]] = None
+
+    def frame(self, data: Dict[str, Any], full: bool = False) -> Optional[str]:
+        """
+        Returns the frame bringing the client up to `data`, or None if it is up to date.
+
+        Args:
+            data: Current character data (session.get_character_data())
+            full: Send the whole state even if the client has an earlier one
+        """
+        if full or self._sent is None:
+            self.revision += 1
+            frame = json.dumps({"type": "character_update", "rev": self.revision, "data": data})
+            self.full_updates += 1
+            sync_totals["full_updates"] += 1
+        else:
+            operations = jsonpatch.make_patch(self._sent, data).patch
+            if not operations:
+                self.unchanged += 1
+                sync_totals["unchanged"] += 1
+                return None
+            self.revision += 1
+            frame = json.dumps({"type": "character_patch", "rev": self.revision,
+                                "base": self.revision - 1, "ops": operations})
+            self.patches += 1
+            sync_totals["patches"] += 1
+        # get_character_data shares the live dicts; keep what was actually sent
+        self._sent = copy.deepcopy(data)
+        size = len(frame.encode("utf-8"))
+        self.bytes_sent += size
+        sync_totals["bytes_sent"] += size
+        return frame
+
+    async def push(self, websocket, data: Dict[str, Any], full: bool = False):
+        """Sends the frame for `data` on the connection, if there is one to send."""
+        frame = self.frame(data, full=full)
+        if frame is not None:
+            await websocket.send_text(frame)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "revision": self.revision,
+            "full_updates": self.full_updates,
+            "patches": self.patches,
+            "unchanged": self.unchanged,
+            "bytes_sent": self.bytes_sent,
+        }
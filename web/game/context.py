@@ -0,0 +1,225 @@
+"""
+Token-budgeted context window for the main game model.
+
+Instead of sending the whole chat history on every call, the prompt is the
+system prompt, a rolling summary of older events and as many of the most
+recent messages as fit in CONTEXT_TOKEN_BUDGET. The summary is regenerated
+in the background, never while the player waits for a turn.
+"""
+import os
+import json
+import asyncio
+import functools
+from typing import List, Optional, Sequence
+
+import tiktoken
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from langchain_core.messages.tool import ToolMessage
+
+from web.game.scheduler import llm_scheduler, OBSERVATION
+from web.utils.log import get_logger
+from web.utils.tracing import tracer, model_name
+
+logger = get_logger(__name__)
+
+# Token budget for everything sent to the main model
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "6000"))
+# Share of the budget (under 0.5) kept free of unsummarized messages: once those no longer fit
+# in the rest, the oldest are summarized until they fit in one headroom less, well before any
+# of them would fall out of the prompt
+SUMMARY_HEADROOM = float(os.environ.get("SUMMARY_HEADROOM", "0.25"))
+# Tokens of older messages folded into the summary per summarizer call
+SUMMARY_CHUNK_TOKENS = int(os.environ.get("SUMMARY_CHUNK_TOKENS", "3000"))
+TOKENIZER_MODEL = "gpt-4o-mini"
+
+# Tokens the chat format adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = """You maintain the memory of an ongoing fantasy RPG session.
+Update the summary below with the new events. Keep every fact that matters for
+the rest of the adventure (places, characters met, quests, items gained or
+lost, injuries, decisions) and drop everything else. Answer with the updated
+summary only, in under 250 words."""
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            _encoding = tiktoken.encoding_for_model(TOKENIZER_MODEL)
+        except Exception as e:
+            # tiktoken downloads its BPE files on first use; without them fall back to an estimate
+            logger.warning("tiktoken encoding unavailable, estimating token counts: %s", e)
+    return _encoding
+
+
+@functools.lru_cache(maxsize=16384)
+def count_text_tokens(text: str) -> int:
+    """Counts the tokens of a string (cached, messages are re-counted on every turn)."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(message) -> int:
+    """Counts the tokens a chat message costs in the prompt."""
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+    tokens = MESSAGE_OVERHEAD_TOKENS + count_text_tokens(content)
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        tokens += count_text_tokens(tool_call["name"])
+        tokens += count_text_tokens(json.dumps(tool_call["args"], sort_keys=True))
+    return tokens
+
+
+def _unit_start(history: List, end: int) -> int:
+    """
+    Returns where the message unit ending at `end` starts. A unit is a single
+    message, or an assistant message with tool calls together with the tool
+    results answering it, which must never be separated.
+    """
+    start = end
+    while start > 0 and isinstance(history[start], ToolMessage):
+        start -= 1
+    if start != end and not (isinstance(history[start], AIMessage) and history[start].tool_calls):
+        # Orphaned tool results; keep them together without a parent
+        return start + 1
+    return start
+
+
+def summary_chunks(messages: List, budget: int):
+    """Splits messages into consecutive chunks of at most `budget` tokens (or a single larger message)."""
+    chunk, used = [], 0
+    for message in messages:
+        cost = count_message_tokens(message)
+        if chunk and used + cost > budget:
+            yield chunk
+            chunk, used = [], 0
+        chunk.append(message)
+        used += cost
+    if chunk:
+        yield chunk
+
+
+class ContextWindow:
+    """
+    Builds the prompt for one session's main model calls.
+
+    Args:
+        summarizer: Chat model used to fold older turns into the rolling summary
+        budget: Token budget for the whole prompt
+        user: Key the summarizer's calls are queued under by the LLM scheduler
+    """
+
+    def __init__(self, summarizer=None, budget: int = CONTEXT_TOKEN_BUDGET, user=None):
+        self.summarizer = summarizer
+        self.user = user
+        self.budget = budget
+        self.summary = ""
+        # Number of leading history messages (after the system prompt) covered by the summary
+        self.summary_upto = 1
+        self._summary_task: Optional[asyncio.Task] = None
+
+    def window_start(self, history: List, budget: int) -> int:
+        """Returns the index of the oldest history message that fits in `budget`."""
+        # The current turn (from the latest user message on) is always kept whole
+        start = len(history)
+        for i in range(len(history) - 1, 0, -1):
+            if isinstance(history[i], HumanMessage):
+                start = i
+                break
+        used = sum(count_message_tokens(m) for m in history[start:])
+        while start > 1:
+            unit_start = _unit_start(history, start - 1)
+            cost = sum(count_message_tokens(m) for m in history[unit_start:start])
+            if used + cost > budget:
+                break
+            used += cost
+            start = unit_start
+        return start
+
+    def build(self, history: List, pinned: Sequence = ()) -> List:
+        """
+        Returns the messages to send: the system prompt, the rolling summary,
+        any `pinned` messages (e.g. the character state digest) and the most
+        recent messages that fit in the token budget.
+        """
+        if not history:
+            return history
+        if self.summary_upto > len(history):
+            # History was replaced (e.g. a new character), the summary no longer applies
+            self.summary, self.summary_upto = "", 1
+
+        system = history[0]
+        summary_message = SystemMessage(content=f"Summary of the adventure so far:\n{self.summary}") \
+            if self.summary else None
+        budget = self.budget - count_message_tokens(system)
+        if summary_message is not None:
+            budget -= count_message_tokens(summary_message)
+        budget -= sum(count_message_tokens(m) for m in pinned)
+
+        start = self.window_start(history, budget)
+        if self.summarizer is not None:
+            # Messages leave the prompt only once they are in the summary
+            if self.window_start(history, int(budget * (1 - SUMMARY_HEADROOM))) > self.summary_upto:
+                upto = self.window_start(history, int(budget * (1 - 2 * SUMMARY_HEADROOM)))
+                self._schedule_summary(history[self.summary_upto:upto], upto)
+            if self.summary_upto > start:
+                # The prompt starts where the summary ends, which may be inside a tool call and its results
+                start = _unit_start(history, self.summary_upto)
+
+        prompt = [system]
+        if summary_message is not None:
+            prompt.append(summary_message)
+        prompt.extend(pinned)
+        prompt.extend(history[start:])
+        return prompt
+
+    def prompt_tokens(self, messages: List) -> int:
+        return sum(count_message_tokens(m) for m in messages)
+
+    def _schedule_summary(self, messages: List, upto: int):
+        if self.summarizer is None or (self._summary_task and not self._summary_task.done()):
+            return
+        try:
+            self._summary_task = asyncio.get_running_loop().create_task(
+                self._update_summary(list(messages), upto))
+        except RuntimeError:
+            # No event loop (synchronous caller); try again on the next build
+            pass
+
+    async def _update_summary(self, messages: List, upto: int):
+        """
+        Folds `messages` (the history up to `upto`) into the summary, one
+        bounded chunk per summarizer call. After a restore the whole older
+        history is pending; each chunk that is folded in is kept even if a
+        later one fails.
+        """
+        position = upto - len(messages)
+        for chunk in summary_chunks(messages, SUMMARY_CHUNK_TOKENS):
+            position += len(chunk)
+            transcript = "\n".join(
+                f"{m.type}: {m.content}" for m in chunk
+                if m.content and not isinstance(m, ToolMessage)
+            )
+            if transcript:
+                request = [
+                    SystemMessage(content=SUMMARY_PROMPT),
+                    HumanMessage(content=f"Current summary:\n{self.summary or '(none)'}\n\nNew events:\n{transcript}"),
+                ]
+                try:
+                    # Background work like observation; it never holds up a turn
+                    async with llm_scheduler.slot(self.user, OBSERVATION):
+                        with tracer.span("summary_llm", model=model_name(self.summarizer)):
+                            response = await self.summarizer.ainvoke(request)
+                except Exception as e:
+                    logger.error("Error updating context summary: %s", e)
+                    return
+                self.summary = response.content
+            self.summary_upto = position
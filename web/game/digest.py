@@ -0,0 +1,50 @@
+"""
+Character state digest.
+
+A compact summary of the character built locally from `Character` and
+`Inventory`, placed in the main prompt each turn instead of asking the
+observation model to call the read-only see_* tools. The digest carries the
+session's state version and is only rebuilt after a mutating tool ran.
+"""
+from langchain.schema import SystemMessage
+
+
+def _format_item(item) -> str:
+    return f"{item.name} x{item.amount} ({item.rarity}, {item.weight}kg)"
+
+
+def build_digest(character, version: int) -> str:
+    """Returns the digest text for `character` at state `version`."""
+    health = character.health_and_mana
+    level = character.level_and_experience
+    equipped = [f"{slot}={item.name}" for slot, item in character.equipped.items() if item is not None]
+    items = list(character.inventory.items.values())
+    weight = sum(item.weight * item.amount for item in items)
+    lines = [
+        f"Character state v{version} (authoritative, do not call see_* tools for it):",
+        f"Name: {character.name}",
+        f"Health {health.get('current_health')}/{health.get('max_health')}, "
+        f"Mana {health.get('current_mana')}/{health.get('max_mana')}",
+        f"Level {level.get('level')}, XP {level.get('experience')}/{level.get('experience_to_next_level')}",
+        f"Equipped: {', '.join(equipped) or 'nothing'}",
+        f"Inventory ({weight:g}/{character.inventory.max_weight}kg): "
+        f"{'; '.join(_format_item(item) for item in items) or 'empty'}",
+    ]
+    return "\n".join(lines)
+
+
+class StateDigest:
+    """Caches a session's digest message until its state version changes."""
+
+    def __init__(self):
+        self.version = None
+        self.rebuilds = 0
+        self._message = None
+
+    def message(self, session) -> SystemMessage:
+        version = getattr(session, "state_version", 0)
+        if self._message is None or version != self.version:
+            self._message = SystemMessage(content=build_digest(session.player_character, version))
+            self.version = version
+            self.rebuilds += 1
+        return self._message
@@ -0,0 +1,73 @@
+"""
+Sequence-numbered log of the frames sent for a session.
+
+Every frame a connection sends for a session is stamped with a `seq`
+that increases by one per frame, and the last EVENT_BUFFER_SIZE frames
+are kept. A client reconnecting with `?since=<seq>&epoch=<epoch>` is
+sent only the frames it missed. Each log has a random epoch, because a
+session rebuilt from storage (after eviction, or in another worker) starts
+a new log. A client whose gap is no longer buffered, or that comes from
+another epoch, gets the persisted messages from storage instead.
+
+Persisted messages are numbered by their position in the story's chat
+history, which is append-only.
+"""
+import os
+import uuid
+from collections import deque
+from typing import Dict, List, Optional
+
+# Frames kept per session for clients that reconnect
+EVENT_BUFFER_SIZE = int(os.environ.get("EVENT_BUFFER_SIZE", "500"))
+
+# Totals over every session of this worker
+event_totals = {
+    "events": 0,
+    "resumes": 0,
+    "events_replayed": 0,
+    "storage_fallbacks": 0,
+}
+
+
+class EventLog:
+    """
+    Args:
+        size: Frames kept for replay
+    """
+
+    def __init__(self, size: int = EVENT_BUFFER_SIZE):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self._frames = deque(maxlen=size)
+
+    def record(self, text: str) -> str:
+        """Stamps a JSON object frame with the next seq, keeps it, and returns the stamped frame."""
+        self.seq += 1
+        event_totals["events"] += 1
+        # Frames are serialized JSON objects; prepend the seq rather than parsing them again
+        stamped = f'{{"seq": {self.seq}, {text[1:]}' if text != "{}" else f'{{"seq": {self.seq}}}'
+        self._frames.append(stamped)
+        return stamped
+
+    def since(self, seq: int, epoch: Optional[str]) -> Optional[List[str]]:
+        """
+        Returns the frames sent after `seq`.
+
+        Returns:
+            The frames, or None if they are not all buffered (or `epoch` is not this log's).
+        """
+        if epoch != self.epoch or seq > self.seq:
+            return None
+        missed = self.seq - seq
+        if missed > len(self._frames):
+            return None
+        frames = list(self._frames)[len(self._frames) - missed:] if missed else []
+        event_totals["resumes"] += 1
+        event_totals["events_replayed"] += len(frames)
+        return frames
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "seq": self.seq,
+            "buffered": len(self._frames),
+        }
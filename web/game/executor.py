@@ -0,0 +1,258 @@
+"""
+Iterative executor for one turn of the main model.
+
+Streams the model's answer, runs the tools it calls and calls it again with
+the results, until it answers without tools. Every turn is bounded by
+MAX_TOOL_ROUNDS model calls with tools and MAX_TURN_TOKENS tokens, and a
+model repeating a call it already made this turn gets the earlier result
+instead of running the tool again.
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+from typing import Dict, Any, List, Optional, Callable
+
+from langchain.schema import AIMessage
+from langchain_core.messages.tool import ToolMessage
+
+from web.game import tools
+from web.game.context import count_message_tokens
+from web.game.streaming import StreamAccumulator
+from web.game.scheduler import llm_scheduler, session_user, INTERACTIVE
+from web.utils.log import get_logger
+from web.utils.tracing import tracer, model_name
+
+logger = get_logger(__name__)
+
+# Model answers with tool calls allowed in one turn before the turn is ended
+MAX_TOOL_ROUNDS = int(os.environ.get("MAX_TOOL_ROUNDS", "8"))
+# Prompt and completion tokens (estimated) allowed in one turn
+MAX_TURN_TOKENS = int(os.environ.get("MAX_TURN_TOKENS", "60000"))
+
+LIMIT_MESSAGES = {
+    "max_rounds": "The game master used too many tool rounds this turn.",
+    "max_tokens": "The game master ran out of budget this turn.",
+    "repeated_calls": "The game master kept repeating the same actions.",
+}
+
+# Totals over every turn of this worker
+executor_totals = {
+    "turns": 0,
+    "rounds": 0,
+    "tool_calls": 0,
+    "repeated_calls": 0,
+    "limited_turns": 0,
+}
+
+
+def call_key(tool_call: Dict[str, Any]) -> str:
+    return f"{tool_call['name']}:{json.dumps(tool_call.get('args'), sort_keys=True, default=str)}"
+
+
+def call_segments(tool_calls: List[Dict[str, Any]], read_only) -> List[List[Dict[str, Any]]]:
+    """
+    Splits tool calls into segments that run one after another: each run of
+    consecutive read-only calls is one segment (its calls run concurrently),
+    every call that may change the character is a segment of its own.
+    """
+    segments = []
+    for tool_call in tool_calls:
+        if tool_call['name'] in read_only and segments and segments[-1][0]['name'] in read_only:
+            segments[-1].append(tool_call)
+        else:
+            segments.append([tool_call])
+    return segments
+
+
+class TurnExecutor:
+    """
+    Runs the main model's tool loop for one turn.
+
+    Args:
+        websocket: Client connection, or None
+        session: The game session
+        prompt_messages: Builds the prompt from the session
+        observation: Concurrent observation pass, merged before the next model call
+        merge_observation: Coroutine function merging `observation` into the history
+        priority: Scheduler class of the model calls
+    """
+
+    def __init__(self, websocket, session, prompt_messages: Callable,
+                 observation=None, merge_observation: Optional[Callable] = None,
+                 priority: int = INTERACTIVE):
+        self.websocket = websocket
+        self.session = session
+        self.prompt_messages = prompt_messages
+        self.observation = observation
+        self.merge_observation = merge_observation
+        self.priority = priority
+        self.read_only = getattr(session, "observation_tools", tools.READ_ONLY_TOOLS)
+        self.rounds = 0
+        self.tool_calls = 0
+        self.repeated_calls = 0
+        self.tokens = 0
+        self.stop_reason = None
+        self._results: Dict[str, str] = {}
+
+    async def send(self, payload: Dict[str, Any]):
+        if self.websocket:
+            await self.websocket.send_text(json.dumps(payload))
+
+    async def send_chunk(self, content: str):
+        # A FrameBatcher coalesces narration into fewer frames
+        send_chunk = getattr(self.websocket, "send_chunk", None)
+        if send_chunk is not None:
+            await send_chunk(content)
+        else:
+            await self.send({"type": "ai_chunk", "content": content})
+
+    async def run(self) -> bool:
+        """
+        Runs the turn to the model's final answer, or until a limit is hit.
+
+        Returns:
+            True if the model gave a final answer.
+        """
+        while True:
+            gathered_msg, response_content = await self.stream_round()
+            if gathered_msg is None:
+                return False
+            if not gathered_msg.tool_calls:
+                await self.send({"type": "ai_complete", "content": response_content})
+                # The narration must stay last: the next turn's observation pass reads it
+                await self.merge()
+                self.session.chat_history.append(gathered_msg)
+                return True
+
+            if self.rounds >= MAX_TOOL_ROUNDS:
+                self.stop_reason = "max_rounds"
+            elif self.tokens >= MAX_TURN_TOKENS:
+                self.stop_reason = "max_tokens"
+            if self.stop_reason:
+                await self.stop(gathered_msg, response_content)
+                return False
+
+            self.session.chat_history.append(gathered_msg)
+            self.rounds += 1
+            repeated_before = self.repeated_calls
+            with tracer.span("tool_round", session=getattr(self.session, "session_id", None)):
+                await self.run_tools(gathered_msg.tool_calls)
+            await self.merge()
+            if self.repeated_calls - repeated_before == len(gathered_msg.tool_calls):
+                # Nothing new was asked for; the model is going in circles
+                self.stop_reason = "repeated_calls"
+                await self.stop(None, response_content)
+                return False
+
+    async def stream_round(self):
+        stream = StreamAccumulator()
+        prompt = self.prompt_messages(self.session)
+        self.tokens += sum(count_message_tokens(m) for m in prompt)
+        session_id = getattr(self.session, "session_id", None)
+        model = model_name(self.session.llm_main)
+        async with llm_scheduler.slot(session_user(self.session), self.priority):
+            with tracer.span("main_llm", session=session_id, model=model):
+                start = time.perf_counter()
+                first = True
+                async for chunk in self.session.llm_main.astream(prompt):
+                    if first:
+                        tracer.observe("main_llm_ttft", time.perf_counter() - start, session=session_id, model=model)
+                        first = False
+                    if chunk.content:
+                        await self.send_chunk(chunk.content)
+                    stream.add(chunk)
+        gathered_msg = stream.message()
+        if gathered_msg is not None:
+            self.tokens += count_message_tokens(gathered_msg)
+        return gathered_msg, stream.content
+
+    async def run_tools(self, tool_calls: List[Dict[str, Any]]):
+        tool_messages = []
+        tool_history_messages = []
+        round_results = {}
+        for segment in call_segments(tool_calls, self.read_only):
+            outputs = await asyncio.gather(*(self.call(tool_call, round_results) for tool_call in segment))
+            for tool_call, tool_output in zip(segment, outputs):
+                await self.send({"type": "tool_call", "name": tool_call['name'], "args": tool_call['args']})
+                await self.send({"type": "tool_output", "content": tool_output})
+                # Prepare ToolMessage for OpenAI compatibility
+                tool_messages.append(ToolMessage(
+                    content=tool_output,
+                    tool_call_id=tool_call['id'] if 'id' in tool_call else str(uuid.uuid4())
+                ))
+                # Prepare descriptive message for frontend
+                tool_history_messages.append(AIMessage(
+                    content=f"Tool AI called Tool {tool_call['name']} with arguments: {tool_call['args']} and got response:\n {tool_output}"
+                ))
+        # Append all ToolMessages immediately after the assistant message
+        self.session.chat_history.extend(tool_messages)
+        # Only after tool messages, append descriptive messages for frontend
+        self.session.chat_history.extend(tool_history_messages)
+        self._results.update(round_results)
+
+    async def call(self, tool_call: Dict[str, Any], round_results: Dict[str, str]) -> str:
+        key = call_key(tool_call)
+        # Identical calls within one message are deliberate (e.g. two add_item); across rounds they are repeats
+        if key in self._results:
+            self.repeated_calls += 1
+            return (f"Not run again: {tool_call['name']} was already called with these arguments "
+                    f"this turn and returned:\n{self._results[key]}")
+        self.tool_calls += 1
+        acall_tool = getattr(self.session, "acall_tool", None)
+        if acall_tool is not None:
+            tool_output = await acall_tool(tool_call['name'], tool_call['args'])
+        else:
+            tool_output = self.session.call_tool(tool_call['name'], tool_call['args'])
+        round_results[key] = tool_output
+        return tool_output
+
+    async def merge(self):
+        if self.observation is not None and self.merge_observation is not None:
+            observation, self.observation = self.observation, None
+            await self.merge_observation(self.websocket, self.session, observation)
+
+    async def stop(self, gathered_msg, response_content: str):
+        """
+        Ends a turn that hit a limit, leaving the history valid for the next turn.
+
+        Args:
+            gathered_msg: The model's last answer, not yet in the history, or None
+            response_content: Narration streamed with that answer
+        """
+        await self.send({"type": "ai_complete", "content": response_content})
+        await self.merge()
+        if gathered_msg is not None:
+            self.session.chat_history.append(gathered_msg)
+            # Every tool call must be answered before the model is called again
+            self.session.chat_history.extend(
+                ToolMessage(content="Not run: tool limit reached for this turn.",
+                            tool_call_id=tool_call['id'] if 'id' in tool_call else str(uuid.uuid4()))
+                for tool_call in gathered_msg.tool_calls
+            )
+        await self.send({"type": "system", "content": LIMIT_MESSAGES[self.stop_reason]})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rounds": self.rounds,
+            "tool_calls": self.tool_calls,
+            "repeated_calls": self.repeated_calls,
+            "tokens": self.tokens,
+            "stop_reason": self.stop_reason,
+        }
+
+    def record(self):
+        """Adds this turn to the worker totals and reports it."""
+        executor_totals["turns"] += 1
+        executor_totals["rounds"] += self.rounds
+        executor_totals["tool_calls"] += self.tool_calls
+        executor_totals["repeated_calls"] += self.repeated_calls
+        if self.stop_reason:
+            executor_totals["limited_turns"] += 1
+            logger.warning("Turn stopped: %s after %d tool rounds, %d tool calls, %d repeated, ~%d tokens",
+                           self.stop_reason, self.rounds, self.tool_calls, self.repeated_calls, self.tokens)
+        else:
+            # One turn per player action; sampled by LOG_SAMPLE
+            logger.info("Turn finished: %d tool rounds, %d tool calls, %d repeated, ~%d tokens",
+                        self.rounds, self.tool_calls, self.repeated_calls, self.tokens)
@@ -0,0 +1,368 @@
+"""
+Scripted stand-in for the OpenAI chat models, for offline and load test runs.
+
+Two ways to use it:
+
+- LLM_PROVIDER=fake makes the LLM client registry build FakeChatModel
+  instead of ChatOpenAI, so sessions never leave the process.
+- `python -m web.game.fake_llm --port 8765` serves the same script over the
+  OpenAI chat completions protocol (streamed as server-sent events or not).
+  Point the real client at it with OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+  to exercise the HTTP path as well.
+
+A model's role follows from the tools bound to it: "creation" (create_character),
+"observation" (read-only tools only), "main" (any other tools) or "plain" (no
+tools, e.g. the context summarizer). Each role takes the steps of its script in
+turn. A step is a dict with any of "content", "tool_calls" (a list of
+{"name", "args"}) and "error" (fail the call with that message). Once the prompt
+holds tool results for the latest player message, the role's next step without
+tool calls is used, so a turn's tool loop always ends.
+
+Replies are paced by FAKE_LLM_TTFT (seconds before the first token) and
+FAKE_LLM_TOKENS_PER_SECOND; FAKE_LLM_ERROR_RATE fails that share of calls.
+FAKE_LLM_SCRIPT names a JSON file with a script replacing DEFAULT_SCRIPT
+(roles it leaves out keep their default steps).
+"""
+import os
+import re
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import ConfigDict, Field
+
+from web.game.tools import READ_ONLY_TOOLS
+
+# Seconds before the first token of each reply
+FAKE_LLM_TTFT = float(os.environ.get("FAKE_LLM_TTFT", "0.3"))
+# Pace of the reply after the first token
+FAKE_LLM_TOKENS_PER_SECOND = float(os.environ.get("FAKE_LLM_TOKENS_PER_SECOND", "60"))
+# Share of calls failed on purpose, between 0 and 1
+FAKE_LLM_ERROR_RATE = float(os.environ.get("FAKE_LLM_ERROR_RATE", "0"))
+# JSON file with the script; empty for DEFAULT_SCRIPT
+FAKE_LLM_SCRIPT = os.environ.get("FAKE_LLM_SCRIPT", "")
+# Seed of the error injection, so runs are reproducible
+FAKE_LLM_SEED = int(os.environ.get("FAKE_LLM_SEED", "0"))
+
+NARRATION = (
+    "The lantern light flickers across the wet cobblestones as you step into the square. "
+    "A hooded merchant looks up from his cart, weighing you with a practiced eye, while somewhere "
+    "behind the chapel a dog barks twice and falls silent. The air smells of rain and woodsmoke. "
+    "What do you do next?"
+)
+
+DEFAULT_SCRIPT: Dict[str, List[Dict[str, Any]]] = {
+    "creation": [
+        {"tool_calls": [{"name": "create_character", "args": {
+            "name": "Aria",
+            "lore": "A wandering bard who sings of forgotten kings.",
+            "level_and_experience": {"level": 1, "experience": 0, "experience_to_next_level": 100},
+            "health_and_mana": {"current_health": 20, "max_health": 20, "current_mana": 10, "max_mana": 10},
+            "equipment": {"main_hand": {"name": "Lute", "description": "Well tuned", "weight": 2.0}},
+        }}]},
+    ],
+    "main": [
+        {"content": NARRATION},
+        {"tool_calls": [{"name": "add_item", "args": {
+            "name": "Silver coin", "description": "Stamped with a forgotten king", "weight": 0.01}}]},
+        {"content": NARRATION},
+        {"tool_calls": [{"name": "adjust_health", "args": {"amount": -2}}]},
+    ],
+    "observation": [
+        {"tool_calls": [{"name": "see_health", "args": {}}]},
+        {"content": ""},
+    ],
+    "plain": [
+        {"content": "The player arrived in town, met a merchant and explored the square."},
+    ],
+}
+
+
+class FakeLLMError(RuntimeError):
+    """A failure injected by the script or FAKE_LLM_ERROR_RATE."""
+
+
+def tokens(text: str) -> List[str]:
+    """Splits text into the pieces streamed one per token."""
+    return re.findall(r"\s*\S+", text) if text else []
+
+
+def model_role(tool_names: Iterable[str]) -> str:
+    names = set(tool_names)
+    if "create_character" in names:
+        return "creation"
+    if not names:
+        return "plain"
+    return "observation" if names <= READ_ONLY_TOOLS else "main"
+
+
+def has_tool_results(roles: Sequence[str]) -> bool:
+    """Whether the prompt (message roles, oldest first) answers tool calls after the last player message."""
+    for role in reversed(roles):
+        if role == "tool":
+            return True
+        if role in ("human", "user"):
+            return False
+    return False
+
+
+class FakeScript:
+    """
+    Picks replies from a script and paces them.
+
+    Args:
+        script: Steps per role; roles left out keep DEFAULT_SCRIPT's
+        ttft: Seconds before the first token
+        tokens_per_second: Pace after the first token (0 for no delay)
+        error_rate: Share of calls that fail
+        seed: Seed of the error injection
+    """
+
+    def __init__(self, script: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                 ttft: float = FAKE_LLM_TTFT, tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND,
+                 error_rate: float = FAKE_LLM_ERROR_RATE, seed: int = FAKE_LLM_SEED):
+        self.script = {**DEFAULT_SCRIPT, **(script or {})}
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._cursors: Dict[str, int] = {}
+        self.calls = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls) -> "FakeScript":
+        script = None
+        if FAKE_LLM_SCRIPT:
+            with open(FAKE_LLM_SCRIPT, "r", encoding="utf-8") as f:
+                script = json.load(f)
+        return cls(script)
+
+    def reply(self, tool_names: Iterable[str], answered: bool = False) -> Dict[str, Any]:
+        """
+        Returns the next step for a model with `tool_names` bound.
+
+        Args:
+            tool_names: Names of the tools bound to the model
+            answered: The prompt already holds tool results for the latest player message
+        """
+        tool_names = set(tool_names)
+        role = model_role(tool_names)
+        steps = self.script.get(role) or [{"content": ""}]
+        cursor = self._cursors.get(role, 0)
+        for offset in range(len(steps)):
+            step = steps[(cursor + offset) % len(steps)]
+            calls = step.get("tool_calls") or []
+            if answered and calls:
+                continue
+            self._cursors[role] = cursor + offset + 1
+            # Calls to tools this model does not have are dropped, as the API would never make them
+            return dict(step, tool_calls=[call for call in calls if call["name"] in tool_names])
+        return {"content": "", "tool_calls": []}
+
+    def check(self, step: Dict[str, Any]):
+        """Raises FakeLLMError if this call is to fail."""
+        self.calls += 1
+        message = step.get("error")
+        if message is None and self.error_rate and self._random.random() < self.error_rate:
+            message = "Injected failure"
+        if message is not None:
+            self.errors += 1
+            raise FakeLLMError(message)
+
+    def pieces(self, step: Dict[str, Any]) -> List[Tuple]:
+        """The reply as streamed: ("content", text) and ("tool_call", index, id, name, arguments) pieces."""
+        pieces = [("content", token) for token in tokens(step.get("content") or "")]
+        for index, call in enumerate(step.get("tool_calls") or []):
+            pieces.append(("tool_call", index, f"call_{uuid.uuid4().hex[:24]}",
+                           call["name"], json.dumps(call.get("args") or {})))
+        # An empty answer is still one (empty) chunk, as from the API
+        return pieces or [("content", "")]
+
+    def delay(self, index: int) -> float:
+        """Seconds to wait before the piece at `index` of a reply."""
+        if index == 0:
+            return self.ttft
+        return 1 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    async def stream(self, step: Dict[str, Any]):
+        """Yields the reply's pieces at the configured pace; fails first if the call is to fail."""
+        await asyncio.sleep(self.ttft)
+        self.check(step)
+        for index, piece in enumerate(self.pieces(step)):
+            if index:
+                await asyncio.sleep(self.delay(index))
+            yield piece
+
+    def stats(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "errors": self.errors}
+
+
+_default_script: Optional[FakeScript] = None
+
+
+def default_script() -> FakeScript:
+    """The script shared by every FakeChatModel that was not given its own."""
+    global _default_script
+    if _default_script is None:
+        _default_script = FakeScript.from_env()
+    return _default_script
+
+
+class FakeChatModel(BaseChatModel):
+    """LangChain chat model replying from a FakeScript; a drop-in for ChatOpenAI."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model_name: str = "fake"
+    script: Optional[FakeScript] = Field(default=None, exclude=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools: Sequence, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _step(self, messages: List[BaseMessage], tools) -> Dict[str, Any]:
+        names = [tool["function"]["name"] for tool in tools or []]
+        return (self.script or default_script()).reply(names, has_tool_results([m.type for m in messages]))
+
+    @staticmethod
+    def _chunk(piece: Tuple) -> ChatGenerationChunk:
+        if piece[0] == "content":
+            return ChatGenerationChunk(message=AIMessageChunk(content=piece[1]))
+        _, index, call_id, name, arguments = piece
+        return ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+            {"name": name, "args": arguments, "id": call_id, "index": index}]))
+
+    async def _astream(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+        script = self.script or default_script()
+        async for piece in script.stream(self._step(messages, tools)):
+            chunk = self._chunk(piece)
+            if run_manager and piece[0] == "content":
+                await run_manager.on_llm_new_token(piece[1], chunk=chunk)
+            yield chunk
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return await agenerate_from_stream(self._astream(messages, stop, run_manager, **kwargs))
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, **kwargs) -> ChatResult:
+        script = self.script or default_script()
+        step = self._step(messages, tools)
+        pieces = script.pieces(step)
+        time.sleep(sum(script.delay(index) for index in range(max(1, len(pieces)))))
+        script.check(step)
+        tool_calls = [{"name": piece[3], "args": json.loads(piece[4]), "id": piece[2]}
+                      for piece in pieces if piece[0] == "tool_call"]
+        message = AIMessage(content=step.get("content") or "", tool_calls=tool_calls)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def create_server(script: Optional[FakeScript] = None):
+    """FastAPI app serving `script` at /v1/chat/completions."""
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    script = script or default_script()
+    server = FastAPI(title="Fake OpenAI")
+
+    def error_response(error: FakeLLMError) -> JSONResponse:
+        return JSONResponse(status_code=500, content={
+            "error": {"message": str(error), "type": "server_error", "param": None, "code": None}})
+
+    @server.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "fake"}]}
+
+    @server.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        names = [tool["function"]["name"] for tool in body.get("tools") or []]
+        roles = [message.get("role") for message in body.get("messages", [])]
+        step = script.reply(names, has_tool_results(roles))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = body.get("model", "fake")
+        created = int(time.time())
+        stream = script.stream(step)
+        try:
+            # Fail with an HTTP error before anything is sent, like the API does
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except FakeLLMError as e:
+            return error_response(e)
+        finish_reason = "tool_calls" if step["tool_calls"] else "stop"
+
+        if not body.get("stream"):
+            pieces = [first] if first is not None else []
+            pieces += [piece async for piece in stream]
+            message = {"role": "assistant", "content": "".join(p[1] for p in pieces if p[0] == "content")}
+            if step["tool_calls"]:
+                message["tool_calls"] = [
+                    {"id": call_id, "type": "function", "function": {"name": name, "arguments": arguments}}
+                    for kind, _, call_id, name, arguments in (p for p in pieces if p[0] == "tool_call")]
+            return {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(pieces), "total_tokens": len(pieces)},
+            }
+
+        def event(delta: Dict[str, Any], finish: Optional[str] = None) -> str:
+            return "data: " + json.dumps({
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }) + "\n\n"
+
+        def delta(piece: Tuple) -> Dict[str, Any]:
+            if piece[0] == "content":
+                return {"content": piece[1]}
+            _, index, call_id, name, arguments = piece
+            return {"tool_calls": [{"index": index, "id": call_id, "type": "function",
+                                    "function": {"name": name, "arguments": arguments}}]}
+
+        async def events():
+            yield event({"role": "assistant", "content": ""})
+            if first is not None:
+                yield event(delta(first))
+            async for piece in stream:
+                yield event(delta(piece))
+            yield event({}, finish_reason)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the fake model over the OpenAI chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=FAKE_LLM_TTFT)
+    parser.add_argument("--tokens-per-second", type=float, default=FAKE_LLM_TOKENS_PER_SECOND)
+    parser.add_argument("--error-rate", type=float, default=FAKE_LLM_ERROR_RATE)
+    parser.add_argument("--script", default=FAKE_LLM_SCRIPT, help="JSON file with the script")
+    parser.add_argument("--seed", type=int, default=FAKE_LLM_SEED)
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            script = json.load(f)
+    import uvicorn
+    uvicorn.run(create_server(FakeScript(script, ttft=args.ttft, tokens_per_second=args.tokens_per_second,
+                                         error_rate=args.error_rate, seed=args.seed)),
+                host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Coalescing of streamed `ai_chunk` frames.
+
+FrameBatcher sits between the turn executor and the websocket. Narration
+chunks are buffered and sent as one `ai_chunk` frame once FRAME_FLUSH_INTERVAL
+seconds have passed since the first buffered chunk, or once FRAME_FLUSH_BYTES
+are buffered. Any other frame (tool_call, ai_complete, error, ...) flushes
+the buffer first, so the client sees events in the order they happened.
+"""
+import os
+import json
+import asyncio
+from typing import Dict, List, Optional
+
+from web.utils.log import get_logger
+from web.utils.tracing import tracer
+
+logger = get_logger(__name__)
+
+# Longest time a narration chunk waits in the buffer
+FRAME_FLUSH_INTERVAL = float(os.environ.get("FRAME_FLUSH_INTERVAL", "0.03"))
+# Buffered narration size that is sent without waiting for the interval
+FRAME_FLUSH_BYTES = int(os.environ.get("FRAME_FLUSH_BYTES", "1024"))
+
+# Totals over every connection of this worker
+frame_totals = {
+    "chunks_buffered": 0,
+    "frames_sent": 0,
+    "bytes_sent": 0,
+}
+
+
+class FrameBatcher:
+    """
+    Wraps a websocket; use `send_chunk` for narration and `send_text` for everything else.
+
+    Args:
+        websocket: The connection frames are sent on
+        interval: Seconds a buffered chunk may wait before it is sent
+        max_bytes: Buffered narration size that triggers an immediate send
+        events: Session EventLog stamping and keeping every frame, for clients that reconnect
+    """
+
+    def __init__(self, websocket, interval: float = FRAME_FLUSH_INTERVAL, max_bytes: int = FRAME_FLUSH_BYTES,
+                 events=None):
+        self.websocket = websocket
+        self.events = events
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.chunks_buffered = 0
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self._buffer: List[str] = []
+        self._buffered_bytes = 0
+        self._timer: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def send_chunk(self, content: str):
+        """Buffers a piece of narration."""
+        self._buffer.append(content)
+        self._buffered_bytes += len(content)
+        self.chunks_buffered += 1
+        frame_totals["chunks_buffered"] += 1
+        if self._buffered_bytes >= self.max_bytes or self.interval <= 0:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def send_text(self, text: str):
+        """Sends a frame right away, after any buffered narration."""
+        async with self._lock:
+            await self._flush_buffer()
+            await self._send(text)
+
+    async def flush(self):
+        async with self._lock:
+            await self._flush_buffer()
+
+    async def close(self):
+        """Sends what is still buffered and stops the timer."""
+        try:
+            await self.flush()
+        except Exception as e:
+            # Closing after a disconnect; there is nobody left to send to
+            logger.debug("Error flushing frames on close: %s", e)
+            self._buffer.clear()
+            self._buffered_bytes = 0
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.interval)
+        except asyncio.CancelledError:
+            return
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            # The connection went away; the turn notices on its next send
+            logger.debug("Error flushing frames: %s", e)
+
+    async def _flush_buffer(self):
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+        if not self._buffer:
+            return
+        content = "".join(self._buffer)
+        self._buffer.clear()
+        self._buffered_bytes = 0
+        await self._send(json.dumps({"type": "ai_chunk", "content": content}))
+
+    async def _send(self, text: str):
+        if self.events is not None:
+            # Logged before sending, so a frame lost with the connection can be replayed
+            text = self.events.record(text)
+        with tracer.span("ws_send"):
+            await self.websocket.send_text(text)
+        size = len(text.encode("utf-8"))
+        self.frames_sent += 1
+        self.bytes_sent += size
+        frame_totals["frames_sent"] += 1
+        frame_totals["bytes_sent"] += size
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "chunks_buffered": self.chunks_buffered,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+        }
@@ -1,11 +1,39 @@
+import os
 import json
-import uuid
-from langchain.schema import HumanMessage, AIMessage, SystemMessage
-from langchain_core.messages.tool import ToolMessage
+import asyncio
+import inspect
+from langchain.schema import HumanMessage, AIMessage
+
+from web.game.executor import TurnExecutor
+from web.game.streaming import StreamAccumulator
+from web.game.scheduler import llm_scheduler, session_user, INTERACTIVE, OBSERVATION, CREATION
+from web.utils.log import get_logger
+from web.utils.tracing import tracer, model_name
+
+logger = get_logger(__name__)
+
+# "concurrent": observation runs alongside the main response; "sequential": observation first
+TURN_PIPELINE = os.environ.get("TURN_PIPELINE", "concurrent")
+# "llm": an observation model calls the see_* tools; "digest": a local character state digest is sent instead
+OBSERVATION_MODE = os.environ.get("OBSERVATION_MODE", "llm")
+
+def prompt_messages(session):
+    """Messages sent to the main model: the session's context window, or the whole history."""
+    digest = getattr(session, "digest", None)
+    pinned = [digest.message(session)] if OBSERVATION_MODE == "digest" and digest is not None else []
+    context = getattr(session, "context", None)
+    if context is None:
+        if not pinned:
+            return session.chat_history
+        return session.chat_history[:1] + pinned + session.chat_history[1:]
+    return context.build(session.chat_history, pinned=pinned)
 
 async def process_character_creation(websocket, session, user_input):
     creation_history = [session.creation_system, HumanMessage(content=user_input)]
-    response = await session.llm_creation.ainvoke(creation_history)
+    async with llm_scheduler.slot(session_user(session), CREATION):
+        async with tracer.span("creation_llm", session=getattr(session, "session_id", None),
+                               model=model_name(session.llm_creation)):
+            response = await session.llm_creation.ainvoke(creation_history)
     if response.tool_calls:
         for tool_call in response.tool_calls:
             if websocket:
@@ -22,16 +50,32 @@ async def process_character_creation(websocket, session, user_input):
                 }))
     session.chat_history = [session.game_system]
 
-async def process_observation(session):
-    observation_history = [session.observation_system] + session.chat_history[-2:]
-    gathered_msg = None
+async def observe(session, recent=None):
+    """
+    Runs the observation model on the latest messages without touching the chat history.
+
+    Args:
+        session: The game session
+        recent: Messages to observe; defaults to the last two of the chat history
+
+    Returns:
+        A (results, history_messages) tuple; results is None if no tool was called.
+    """
+    if recent is None:
+        recent = session.chat_history[-2:]
+    observation_history = [session.observation_system] + list(recent)
+    stream = StreamAccumulator()
     try:
-        async for chunk in session.llm_observation.astream(observation_history):
-            if chunk.tool_calls:
-                gathered_msg = chunk if not gathered_msg else gathered_msg + chunk
+        async with llm_scheduler.slot(session_user(session), OBSERVATION):
+            async with tracer.span("observation_llm", session=getattr(session, "session_id", None),
+                                   model=model_name(session.llm_observation)):
+                async for chunk in session.llm_observation.astream(observation_history):
+                    stream.add(chunk)
+        gathered_msg = stream.message()
         if not gathered_msg or not gathered_msg.tool_calls:
-            return None
+            return None, []
         observation_results = []
+        history_messages = []
         for tool_call in gathered_msg.tool_calls:
             tool_output = session.call_tool(tool_call['name'], tool_call['args'])
             observation_results.append({
@@ -39,71 +83,113 @@ async def process_observation(session):
                 "output": tool_output
             })
             history_message = f"Observation AI called Tool {tool_call['name']} and got response:\n {tool_output}"
-            session.chat_history.append(AIMessage(content=history_message))
-        return observation_results or []
+            history_messages.append(AIMessage(content=history_message))
+        return observation_results, history_messages
     except Exception as e:
-        print(f"Error in observation processing: {e}")
-        return []
+        logger.error("Error in observation processing: %s", e)
+        return [], []
+
+async def process_observation(session):
+    observation_results, history_messages = await observe(session)
+    if history_messages:
+        session.chat_history.extend(history_messages)
+    return observation_results
+
+async def merge_observation(websocket, session, observation):
+    """Waits for a concurrent observation pass and adds its results to the chat history."""
+    observation_results, history_messages = await observation
+    if history_messages:
+        session.chat_history.extend(history_messages)
+    if websocket:
+        await websocket.send_text(json.dumps({
+            "type": "observation",
+            "content": observation_results
+        }))
+
+async def process_ai_response(websocket, session, save_story_callback=None, observation=None,
+                              priority=INTERACTIVE):
+    """
+    Streams the main model's response and runs the tools it calls, until it answers
+    without tools or the turn hits one of the executor's limits.
 
-async def process_ai_response(websocket, session, save_story_callback=None):
-    gathered_msg = None
-    response_content = ""
+    Args:
+        websocket: Client connection, or None
+        session: The game session
+        save_story_callback: Called once the final answer is complete
+        observation: Task running `observe` concurrently; its results are merged
+            before the next model call, or at the end of the turn
+        priority: Scheduler class of the model calls (CREATION for a new story's introduction)
+    """
+    executor = TurnExecutor(websocket, session, prompt_messages,
+                            observation=observation, merge_observation=merge_observation,
+                            priority=priority)
     try:
-        async for chunk in session.llm_main.astream(session.chat_history):
-            if chunk.content:
-                response_content += chunk.content
-                if websocket:
-                    await websocket.send_text(json.dumps({
-                        "type": "ai_chunk",
-                        "content": chunk.content
-                    }))
-            gathered_msg = chunk if not gathered_msg else gathered_msg + chunk
-        if gathered_msg:
-            session.chat_history.append(gathered_msg)
-            if gathered_msg.tool_calls:
-                tool_messages = []
-                tool_history_messages = []
-                for tool_call in gathered_msg.tool_calls:
-                    if websocket:
-                        await websocket.send_text(json.dumps({
-                            "type": "tool_call",
-                            "name": tool_call['name'],
-                            "args": tool_call['args']
-                        }))
-                    tool_output = session.call_tool(tool_call['name'], tool_call['args'])
-                    if websocket:
-                        await websocket.send_text(json.dumps({
-                            "type": "tool_output",
-                            "content": tool_output
-                        }))
-                    # Prepare ToolMessage for OpenAI compatibility
-                    tool_messages.append(ToolMessage(
-                        content=tool_output,
-                        tool_call_id=tool_call['id'] if 'id' in tool_call else str(uuid.uuid4())
-                    ))
-                    # Prepare descriptive message for frontend
-                    tool_history_messages.append(AIMessage(
-                        content=f"Tool AI called Tool {tool_call['name']} with arguments: {tool_call['args']} and got response:\n {tool_output}"
-                    ))
-                # Append all ToolMessages immediately after the assistant message
-                session.chat_history.extend(tool_messages)
-                # Only after tool messages, append descriptive messages for frontend
-                session.chat_history.extend(tool_history_messages)
-                # Now process the next AI response with all tool responses included
-                await process_ai_response(websocket, session, save_story_callback=save_story_callback)
-            else:
-                if websocket:
-                    await websocket.send_text(json.dumps({
-                        "type": "ai_complete",
-                        "content": response_content
-                    }))
-                # Save story after AI message if callback provided
-                if save_story_callback:
-                    save_story_callback()
+        completed = await executor.run()
+        # Save story after AI message if callback provided
+        if completed and save_story_callback:
+            result = save_story_callback()
+            if inspect.isawaitable(result):
+                await result
     except Exception as e:
-        print(f"Error in AI response processing: {e}")
+        logger.error("Error in AI response processing: %s", e)
         if websocket:
             await websocket.send_text(json.dumps({
                 "type": "error",
                 "content": f"Error processing response: {str(e)}"
             }))
+    finally:
+        executor.record()
+        session.last_turn_stats = executor.stats()
+
+def character_fingerprint(session) -> str:
+    """Serialized character state, to tell whether anything changed since the last observation."""
+    return json.dumps(session.get_character_data(), sort_keys=True, default=str)
+
+def should_observe(session) -> bool:
+    """
+    The observation pass only reads the character. When the character has not
+    changed since the last pass, its findings are already in the history and
+    the main model's own see_* tools cover any further lookup.
+    """
+    return getattr(session, "observed_state", None) != character_fingerprint(session)
+
+async def run_turn(websocket, session, save_story_callback=None):
+    """
+    Answers the player's latest message, collecting the turn's spans into
+    `session.last_turn_trace`.
+
+    With the concurrent pipeline the main response starts streaming at once while
+    the observation pass runs alongside it (or is skipped when the character has not
+    changed); observation results are merged before the next model call. The
+    sequential pipeline runs the observation pass to completion first. In digest
+    mode there is no observation pass; the prompt carries the character state.
+    """
+    with tracer.turn(session):
+        await _run_turn(websocket, session, save_story_callback)
+
+async def _run_turn(websocket, session, save_story_callback=None):
+    if OBSERVATION_MODE == "digest":
+        await process_ai_response(websocket, session, save_story_callback=save_story_callback)
+        return
+
+    if TURN_PIPELINE == "sequential":
+        observation_results = await process_observation(session)
+        if websocket:
+            await websocket.send_text(json.dumps({
+                "type": "observation",
+                "content": observation_results
+            }))
+        await process_ai_response(websocket, session, save_story_callback=save_story_callback)
+        return
+
+    observation = None
+    if should_observe(session):
+        session.observed_state = character_fingerprint(session)
+        observation = asyncio.create_task(observe(session, session.chat_history[-2:]))
+    try:
+        await process_ai_response(websocket, session, save_story_callback=save_story_callback,
+                                  observation=observation)
+    finally:
+        # Not merged when the response failed; don't leave it running
+        if observation is not None and not observation.done():
+            observation.cancel()
@@ -0,0 +1,152 @@
+"""
+Process-wide registry of LLM clients.
+
+Sessions used to build three ChatOpenAI objects each, every one with its own
+HTTP connection pool. Instead, one ChatOpenAI is created per model and
+settings, all of them share a single tuned keep-alive HTTP pool per worker,
+and sessions borrow (cached) tool-bound runnables from the registry.
+"""
+import os
+from typing import Dict, Any, Optional, Sequence, Tuple
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+# Connection pool limits shared by every model client of this worker
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_KEEPALIVE_EXPIRY", "120"))
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "120"))
+# "openai", or "fake" for the scripted stand-in in web.game.fake_llm (offline and load test runs)
+LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "openai")
+
+
+class LLMClientRegistry:
+    def __init__(self):
+        self._models: Dict[Tuple, ChatOpenAI] = {}
+        self._bound: Dict[Tuple, Any] = {}
+        self._http_client: Optional[httpx.Client] = None
+        self._http_async_client: Optional[httpx.AsyncClient] = None
+        self.models_created = 0
+        self.model_reuses = 0
+        self.requests = 0
+        self.connections_opened = 0
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+        )
+
+    async def _on_async_request(self, request: httpx.Request):
+        self.requests += 1
+        request.extensions["trace"] = self._async_trace
+
+    async def _async_trace(self, event_name: str, info: Dict[str, Any]):
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    def _on_request(self, request: httpx.Request):
+        self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    def _trace(self, event_name: str, info: Dict[str, Any]):
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    def http_async_client(self) -> httpx.AsyncClient:
+        if self._http_async_client is None:
+            self._http_async_client = httpx.AsyncClient(
+                limits=self._limits(),
+                timeout=LLM_TIMEOUT,
+                event_hooks={"request": [self._on_async_request]},
+            )
+        return self._http_async_client
+
+    def http_client(self) -> httpx.Client:
+        if self._http_client is None:
+            self._http_client = httpx.Client(
+                limits=self._limits(),
+                timeout=LLM_TIMEOUT,
+                event_hooks={"request": [self._on_request]},
+            )
+        return self._http_client
+
+    def chat_model(self, model_name: str, **settings) -> ChatOpenAI:
+        """Returns the shared chat model for `model_name` and `settings`, creating it once."""
+        key = (model_name, tuple(sorted(settings.items())))
+        model = self._models.get(key)
+        if model is None:
+            if LLM_PROVIDER == "fake":
+                from web.game.fake_llm import FakeChatModel
+                model = FakeChatModel(model_name=model_name)
+            else:
+                model = ChatOpenAI(
+                    model_name=model_name,
+                    http_client=self.http_client(),
+                    http_async_client=self.http_async_client(),
+                    **settings
+                )
+            self._models[key] = model
+            self.models_created += 1
+        else:
+            self.model_reuses += 1
+        return model
+
+    def bind_tools(self, model_name: str, tools: Sequence, tools_key: Optional[str] = None, **settings):
+        """
+        Returns the shared model for `model_name` bound to `tools`.
+
+        Args:
+            model_name: OpenAI model name
+            tools: Tools (or OpenAI tool dicts) the model may call
+            tools_key: Name identifying this exact set of tools; when given, the
+                bound runnable is built once and shared by every caller
+            settings: Extra ChatOpenAI settings, e.g. streaming=True
+        """
+        model = self.chat_model(model_name, **settings)
+        if tools_key is None:
+            return model.bind_tools(list(tools))
+        key = (model_name, tuple(sorted(settings.items())), tools_key)
+        bound = self._bound.get(key)
+        if bound is None:
+            bound = model.bind_tools(list(tools))
+            self._bound[key] = bound
+        return bound
+
+    def open_connections(self) -> int:
+        """Connections currently held by the shared pools (active or idle keep-alive)."""
+        total = 0
+        for client in (self._http_client, self._http_async_client):
+            pool = getattr(getattr(client, "_transport", None), "_pool", None)
+            if pool is not None:
+                total += len(pool.connections)
+        return total
+
+    def stats(self) -> Dict[str, Any]:
+        reuse_rate = 1 - self.connections_opened / self.requests if self.requests else 0.0
+        return {
+            "models": len(self._models),
+            "bound_runnables": len(self._bound),
+            "models_created": self.models_created,
+            "model_reuses": self.model_reuses,
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "open_connections": self.open_connections(),
+            "connection_reuse_rate": round(reuse_rate, 4),
+        }
+
+    async def aclose(self):
+        """Closes the shared HTTP pools (on server shutdown)."""
+        if self._http_async_client is not None:
+            await self._http_async_client.aclose()
+            self._http_async_client = None
+        if self._http_client is not None:
+            self._http_client.close()
+            self._http_client = None
+        self._models.clear()
+        self._bound.clear()
+
+
+llm_clients = LLMClientRegistry()
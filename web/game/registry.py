@@ -0,0 +1,549 @@
+"""
+Registry of the game sessions live in this worker.
+
+Holds at most MAX_LIVE_SESSIONS sessions. Sessions idle for longer than
+SESSION_IDLE_TTL seconds, or least recently used once the registry is full,
+are flushed to storage and dropped; they are rebuilt from their story on the
+next request. Sessions in use by a websocket connection are pinned and never
+evicted.
+
+With SESSION_LEASES on, a worker keeps a story in use only while it holds
+the story's lease (see web.storage.leases), so several worker processes can
+serve the same stories: a connection to a story owned by another worker asks
+that worker to hand it off (owners check every SESSION_HANDOFF_POLL seconds)
+and waits up to SESSION_LEASE_WAIT seconds before it is rejected. A cached session is trusted only if no other worker owned the
+story since it was loaded; otherwise it is rebuilt from storage. Saves are
+fenced by the lease, so a worker that lost a story cannot overwrite it.
+"""
+import os
+import sys
+import time
+import asyncio
+from collections import OrderedDict, Counter
+from contextlib import asynccontextmanager, nullcontext
+from typing import Dict, Any, Optional, Callable, List
+
+from langchain.schema import HumanMessage, AIMessage, SystemMessage
+
+from web.rpg.Character import Character
+from rpg.inventory import Item
+from web.game.session import GameSession
+from web.storage import aio
+from web.storage.write_behind import save_scheduler
+from web.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# Most sessions kept in memory by one worker
+MAX_LIVE_SESSIONS = int(os.environ.get("MAX_LIVE_SESSIONS", "500"))
+# Seconds after its last use an unpinned session is evicted
+SESSION_IDLE_TTL = float(os.environ.get("SESSION_IDLE_TTL", "1800"))
+# Sessions sampled when estimating memory per session
+MEMORY_SAMPLE_SIZE = 20
+# Whether stories are guarded by leases shared with the other workers
+SESSION_LEASES = os.environ.get("SESSION_LEASES", "1") == "1"
+# Seconds a connection waits for another worker to hand a story off
+SESSION_LEASE_WAIT = float(os.environ.get("SESSION_LEASE_WAIT", "5"))
+# Seconds between two checks, by the worker holding a story, for another worker asking for it;
+# well below SESSION_LEASE_WAIT, which leases are renewed far less often than
+SESSION_HANDOFF_POLL = float(os.environ.get("SESSION_HANDOFF_POLL", "1"))
+# Seconds between two attempts to take a busy story's lease
+LEASE_POLL_INTERVAL = 0.05
+
+# Shared by every session (models, tool tables, locks); not counted as session memory
+_SHARED_ATTRIBUTES = {
+    "llm_main", "llm_creation", "llm_observation",
+    "action_tools", "creation_tools", "observation_tools", "_save_lock", "lease_guard",
+}
+
+
+def saving(session):
+    """The session's save lock: held, no write of the session runs (a no-op without a session)."""
+    lock = getattr(session, "_save_lock", None)
+    return lock if lock is not None else nullcontext()
+
+
+class SessionBusyError(Exception):
+    """Another worker holds the story and did not hand it off in time."""
+
+
+def restore_session(session_id: str, username: str, story_data: Dict[str, Any]) -> GameSession:
+    """Rebuilds a GameSession from its saved story."""
+    session = GameSession(session_id, username)
+    char = story_data.get("character")
+    if char and char.get("snapshot"):
+        session.player_character = Character.from_snapshot(char["snapshot"])
+    elif char:
+        # Stories saved before snapshots: the inventory was only kept as display text
+        session.player_character.name = char.get("name", "")
+        session.player_character.lore = char.get("lore", "")
+        session.player_character.health_and_mana = char.get("health", {})
+        session.player_character.level_and_experience = char.get("level", {})
+        equipment_data = char.get("equipment", {})
+        for slot in session.player_character.equipped:
+            slot_data = equipment_data.get(slot)
+            if slot_data is not None and isinstance(slot_data, dict):
+                session.player_character.equipped[slot] = Item(
+                    name=slot_data["name"],
+                    description=slot_data["description"],
+                    weight=slot_data["weight"],
+                    amount=slot_data.get("amount", 1),
+                    rarity=slot_data.get("rarity", "Common")
+                )
+            else:
+                session.player_character.equipped[slot] = None
+    # Restore chat history if available
+    restored_history = []
+    for msg in story_data.get("chat_history", []):
+        if isinstance(msg, dict):
+            role = msg.get("role", "").lower()
+            content = msg.get("content", "")
+            if role == "human":
+                restored_history.append(HumanMessage(content=content))
+            elif role == "system":
+                restored_history.append(SystemMessage(content=content))
+            elif "ai" in role:
+                restored_history.append(AIMessage(content=content))
+            elif role == "tool":
+                logger.debug("Skipping tool message: %s", msg)
+            else:
+                logger.warning("Skipping unknown message type: %s", msg)
+        else:
+            logger.warning("Unexpected message format: %s", msg)
+    if restored_history:
+        session.chat_history = restored_history
+    session.mark_saved()
+    session.character_created = True
+    return session
+
+
+async def load_session(session_id: str) -> Optional[GameSession]:
+    """Loads a session from its story, or returns None if there is no such story."""
+    username, story_data = await aio.find_story(session_id)
+    if story_data is None:
+        return None
+    return restore_session(session_id, username, story_data)
+
+
+def estimate_size(obj, seen=None) -> int:
+    """Approximate deep size of an object in bytes, following containers and instance attributes."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool, type(None))):
+        return size
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k, seen) + estimate_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, seen) for item in obj)
+    if hasattr(obj, "__dict__"):
+        size += estimate_size(vars(obj), seen)
+    return size
+
+
+def session_size(session) -> int:
+    """Approximate memory held by one session alone (shared models and tools excluded)."""
+    attributes = vars(session)
+    # Back references to the session and anything shared are never counted
+    seen = {id(session)} | {id(attributes[name]) for name in _SHARED_ATTRIBUTES if name in attributes}
+    context = attributes.get("context")
+    if context is not None:
+        seen.add(id(getattr(context, "summarizer", None)))
+    size = sys.getsizeof(session)
+    for name, value in attributes.items():
+        size += estimate_size(value, seen)
+    return size
+
+
+class SessionRegistry:
+    """
+    Args:
+        max_sessions: Most sessions kept in memory
+        idle_ttl: Seconds after its last use an unpinned session is evicted
+        loader: Coroutine function rebuilding a session from storage
+        saver: Save scheduler used to flush evicted sessions
+        use_leases: Guard stories with leases shared by every worker
+        lease_store: LeaseStore to use; defaults to the process-wide one
+    """
+
+    def __init__(self, max_sessions: int = MAX_LIVE_SESSIONS, idle_ttl: float = SESSION_IDLE_TTL,
+                 loader=load_session, saver=save_scheduler, use_leases: bool = SESSION_LEASES,
+                 lease_store=None):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.loader = loader
+        self.saver = saver
+        self.use_leases = use_leases
+        self._lease_store = lease_store
+        # Leases held by this worker, with the tasks renewing them
+        self._leases: Dict[str, Any] = {}
+        self._renewers: Dict[str, asyncio.Task] = {}
+        # Callbacks closing the connections of a story another worker asked for
+        self._revoke_callbacks: Dict[str, List[Callable]] = {}
+        self._sessions: "OrderedDict[str, GameSession]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._pins = Counter()
+        # Loads in progress, so concurrent requests for one story share a single load
+        self._loading: Dict[str, asyncio.Task] = {}
+        # Flushes of evicted sessions; a reload waits for them so it never reads stale data
+        self._evicting: Dict[str, asyncio.Task] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self.idle_evictions = 0
+        self.stale_reloads = 0
+        self.handoffs = 0
+        self.busy_rejections = 0
+        self.leases_lost = 0
+
+    @property
+    def lease_store(self):
+        if self._lease_store is None:
+            from web.storage.leases import get_lease_store
+            self._lease_store = get_lease_store()
+        return self._lease_store
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def peek(self, session_id: str) -> Optional[GameSession]:
+        """Returns the session if it is live, without loading it or counting a hit."""
+        return self._sessions.get(session_id)
+
+    async def get(self, session_id: str) -> Optional[GameSession]:
+        """Returns the live session, rebuilding it from storage if it was evicted."""
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self.hits += 1
+            self._touch(session_id)
+            return session
+        self.misses += 1
+        task = self._loading.get(session_id)
+        if task is None:
+            task = asyncio.create_task(self._load(session_id))
+            self._loading[session_id] = task
+        return await asyncio.shield(task)
+
+    async def _load(self, session_id: str) -> Optional[GameSession]:
+        try:
+            eviction = self._evicting.get(session_id)
+            if eviction is not None:
+                await eviction
+            session = await self.loader(session_id)
+            if session is not None:
+                self.loads += 1
+                await self.add(session)
+            return session
+        finally:
+            self._loading.pop(session_id, None)
+
+    async def add(self, session: GameSession):
+        """Registers a new (or freshly loaded) session."""
+        if self.use_leases:
+            await self._stamp(session)
+        self._sessions[session.session_id] = session
+        self._touch(session.session_id)
+        await self.evict(keep=session.session_id)
+
+    async def remove(self, session_id: str):
+        """Drops a session without saving it, e.g. when its story was deleted."""
+        self._sessions.pop(session_id, None)
+        self._last_used.pop(session_id, None)
+
+    def _touch(self, session_id: str):
+        self._sessions.move_to_end(session_id)
+        self._last_used[session_id] = time.monotonic()
+
+    def pin(self, session_id: str):
+        self._pins[session_id] += 1
+
+    def unpin(self, session_id: str):
+        self._pins[session_id] -= 1
+        if self._pins[session_id] <= 0:
+            del self._pins[session_id]
+        if session_id in self._sessions:
+            self._touch(session_id)
+
+    @asynccontextmanager
+    async def use(self, session_id: str, wait: float = SESSION_LEASE_WAIT,
+                  on_revoke: Optional[Callable] = None):
+        """
+        Pins the session for the duration of the block (e.g. a websocket connection).
+
+        Args:
+            session_id: The story
+            wait: Seconds to wait for another worker to hand the story off
+            on_revoke: Coroutine function called if another worker asks for the story
+                or this worker loses it; it should end the block (e.g. close the connection)
+
+        Raises:
+            SessionBusyError: Another worker kept the story for longer than `wait`
+        """
+        if not self.use_leases:
+            session = await self.get(session_id)
+            if session is None:
+                yield None
+                return
+            self.pin(session_id)
+            try:
+                yield session
+            finally:
+                self.unpin(session_id)
+            return
+
+        # Pinned before the lease is taken, so a concurrent last unpin does not release it
+        self.pin(session_id)
+        callbacks = self._revoke_callbacks.setdefault(session_id, [])
+        if on_revoke is not None:
+            callbacks.append(on_revoke)
+        try:
+            lease = await self._acquire(session_id, wait)
+            live = self._sessions.get(session_id)
+            if live is not None and getattr(live, "lease_version", None) != lease.version:
+                # Another worker owned the story since this copy was loaded; storage is newer
+                self.stale_reloads += 1
+                self._drop(session_id)
+            yield await self.get(session_id)
+        finally:
+            if on_revoke is not None:
+                callbacks.remove(on_revoke)
+            try:
+                if self._pins[session_id] <= 1:
+                    self._revoke_callbacks.pop(session_id, None)
+                    # Shielded: a cancelled connection must still save the story and give the lease up
+                    await asyncio.shield(self._hand_back(session_id))
+            finally:
+                self.unpin(session_id)
+
+    async def _hand_back(self, session_id: str):
+        """Saves the story and releases its lease once no write of it is running."""
+        session = self._sessions.get(session_id)
+        try:
+            if session is not None:
+                await self.saver.flush(session)
+        finally:
+            # Another worker may load the story as soon as the lease is released; a save still
+            # running (e.g. one made outside the save scheduler) must land first
+            async with saving(session):
+                # Flushing yields; someone may have started using the story meanwhile
+                if self._pins[session_id] <= 1:
+                    await self._release(session_id)
+
+    def _drop(self, session_id: str):
+        self._sessions.pop(session_id, None)
+        self._last_used.pop(session_id, None)
+
+    async def _acquire(self, session_id: str, wait: float):
+        lease = self._leases.get(session_id)
+        if lease is not None:
+            return lease
+        store = self.lease_store
+        deadline = time.monotonic() + wait
+        asked = False
+        while True:
+            lease = await aio.run_blocking(store.acquire, session_id)
+            # Another use() of this story may have taken it while we were waiting
+            held = self._leases.get(session_id)
+            if held is not None:
+                return held
+            if lease is not None:
+                self._leases[session_id] = lease
+                self._renewers[session_id] = asyncio.create_task(self._renew(session_id, lease))
+                return lease
+            if not asked:
+                await aio.run_blocking(store.request_handoff, session_id)
+                asked = True
+                self.handoffs += 1
+            if time.monotonic() >= deadline:
+                self.busy_rejections += 1
+                raise SessionBusyError(f"Story {session_id} is in use by another worker")
+            await asyncio.sleep(LEASE_POLL_INTERVAL)
+
+    async def _release(self, session_id: str):
+        renewer = self._renewers.pop(session_id, None)
+        if renewer is not None:
+            renewer.cancel()
+        lease = self._leases.pop(session_id, None)
+        if lease is not None:
+            await aio.run_blocking(self.lease_store.release, lease)
+
+    async def _renew(self, session_id: str, lease):
+        """Renews the lease every ttl / 3 seconds and checks for handoff requests in between."""
+        store = self.lease_store
+        renew_interval = store.ttl / 3
+        poll_interval = min(renew_interval, SESSION_HANDOFF_POLL)
+        renewed_at = time.monotonic()
+        while True:
+            await asyncio.sleep(poll_interval)
+            if time.monotonic() - renewed_at < renew_interval:
+                try:
+                    holder = await aio.run_blocking(store.holder, session_id)
+                except Exception as e:
+                    logger.warning("Error checking handoffs of %s: %s", session_id, e)
+                    continue
+                if (holder is not None and holder.version == lease.version and holder.handoff_requested
+                        and not lease.handoff_requested):
+                    # Asked once per request; the next renew re-reads the flag
+                    lease.handoff_requested = True
+                    await self._revoke(session_id)
+                continue
+            try:
+                renewed = await aio.run_blocking(store.renew, lease)
+            except Exception as e:
+                logger.warning("Error renewing lease on %s: %s", session_id, e)
+                continue
+            renewed_at = time.monotonic()
+            if not renewed:
+                # Expired and taken over; our copy must never be saved or served again
+                logger.warning("Lost lease on %s", session_id)
+                self.leases_lost += 1
+                self._leases.pop(session_id, None)
+                self._renewers.pop(session_id, None)
+                self._drop(session_id)
+                await self._revoke(session_id)
+                return
+            if lease.handoff_requested:
+                await self._revoke(session_id)
+
+    async def _revoke(self, session_id: str):
+        for callback in list(self._revoke_callbacks.get(session_id, ())):
+            try:
+                await callback()
+            except Exception as e:
+                logger.error("Error handing off %s: %s", session_id, e)
+
+    async def _stamp(self, session):
+        """Records which lease version the session's data belongs to, and fences its saves."""
+        lease = self._leases.get(session.session_id)
+        if lease is None:
+            # Not in use here (e.g. a new story); its data is current if the story is free
+            lease = await aio.run_blocking(self.lease_store.acquire, session.session_id)
+            if lease is not None:
+                await aio.run_blocking(self.lease_store.release, lease)
+        session.lease_version = lease.version if lease is not None else None
+        session.lease_guard = lambda: self._guard(session)
+
+    @asynccontextmanager
+    async def _guard(self, session):
+        """Yields whether the session may be written; holds the story's lease meanwhile."""
+        session_id = session.session_id
+        store = self.lease_store
+        lease = self._leases.get(session_id)
+        if lease is not None:
+            yield (lease.version == session.lease_version
+                   and await aio.run_blocking(store.renew, lease))
+            return
+        # Written outside use() (e.g. evicted): only if nobody owned the story since it was loaded
+        lease = await aio.run_blocking(store.acquire, session_id)
+        if lease is None:
+            yield False
+            return
+        try:
+            yield lease.version == session.lease_version
+        finally:
+            if session_id not in self._leases:
+                await aio.run_blocking(store.release, lease)
+
+    async def evict(self, keep: Optional[str] = None):
+        """
+        Evicts idle sessions, then least recently used ones while over capacity.
+
+        Args:
+            keep: Session that must stay, e.g. the one just added for a caller
+        """
+        now = time.monotonic()
+        victims = []
+        for session_id in list(self._sessions):
+            if session_id in self._pins or session_id == keep:
+                continue
+            if now - self._last_used[session_id] >= self.idle_ttl:
+                victims.append(session_id)
+                self.idle_evictions += 1
+        over = len(self._sessions) - len(victims) - self.max_sessions
+        if over > 0:
+            # _sessions is ordered from least to most recently used
+            for session_id in self._sessions:
+                if over <= 0:
+                    break
+                if session_id in self._pins or session_id in victims or session_id == keep:
+                    continue
+                victims.append(session_id)
+                over -= 1
+        for session_id in victims:
+            session = self._sessions.pop(session_id)
+            self._last_used.pop(session_id, None)
+            self.evictions += 1
+            self._evicting[session_id] = asyncio.create_task(self._flush(session))
+        if victims:
+            await asyncio.gather(*(self._evicting[session_id] for session_id in victims
+                                   if session_id in self._evicting))
+
+    async def _flush(self, session: GameSession):
+        try:
+            await self.saver.flush(session)
+            # A reload waits for this task; no write of the evicted copy may still be running
+            async with saving(session):
+                pass
+        finally:
+            self._evicting.pop(session.session_id, None)
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(max(self.idle_ttl / 4, 1))
+            try:
+                await self.evict()
+            except Exception as e:
+                logger.error("Error evicting idle sessions: %s", e)
+
+    def start(self):
+        """Starts evicting idle sessions in the background."""
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep())
+
+    async def close(self):
+        """Stops the background eviction and flushes every live session."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        for session in list(self._sessions.values()):
+            await self.saver.flush(session)
+        for session_id in list(self._leases):
+            await self._release(session_id)
+
+    def memory_per_session(self) -> int:
+        """Average memory held by a live session, estimated on a sample."""
+        sample = list(self._sessions.values())[-MEMORY_SAMPLE_SIZE:]
+        if not sample:
+            return 0
+        return sum(session_size(s) for s in sample) // len(sample)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "live_sessions": len(self._sessions),
+            "pinned_sessions": len(self._pins),
+            "max_sessions": self.max_sessions,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "idle_evictions": self.idle_evictions,
+            "leases_held": len(self._leases),
+            "stale_reloads": self.stale_reloads,
+            "handoffs": self.handoffs,
+            "busy_rejections": self.busy_rejections,
+            "leases_lost": self.leases_lost,
+            "memory_per_session": self.memory_per_session(),
+        }
+
+
+session_registry = SessionRegistry()
@@ -0,0 +1,156 @@
+"""
+Process-wide admission control for calls to the upstream model.
+
+At most LLM_MAX_CONCURRENCY model calls run at once in a worker; the others
+wait for a slot. A freed slot goes to the highest priority class with
+callers waiting (interactive turns, then observation, then creation), and
+within a class users take turns, so a burst of story creations from one
+user queues behind itself instead of ahead of every player mid-game. A
+streamed call holds its slot until the stream is consumed.
+"""
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Hashable, Optional
+
+from web.utils.tracing import tracer
+
+# Model calls (streams or invocations) running at once in this worker
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "16"))
+
+# Priority classes, most urgent first
+INTERACTIVE = 0
+OBSERVATION = 1
+CREATION = 2
+PRIORITY_NAMES = ("interactive", "observation", "creation")
+
+# Queue waits kept per class for the percentiles in stats()
+WAIT_SAMPLES = 1000
+
+
+def session_user(session) -> Optional[Hashable]:
+    """The key a session's calls are queued under: its user, or the session for anonymous ones."""
+    return getattr(session, "username", None) or getattr(session, "session_id", None)
+
+
+class LLMScheduler:
+    """
+    Args:
+        max_concurrency: Model calls allowed to run at once
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY):
+        self.max_concurrency = max(1, max_concurrency)
+        self.running = 0
+        self.waiting = 0
+        # Per class, the users with calls waiting, in turn order, each with their waiters oldest first
+        self._queues = [OrderedDict() for _ in PRIORITY_NAMES]
+        self.admitted = [0] * len(PRIORITY_NAMES)
+        self.queued = [0] * len(PRIORITY_NAMES)
+        self.cancelled = 0
+        self._wait_total = [0.0] * len(PRIORITY_NAMES)
+        self._wait_max = [0.0] * len(PRIORITY_NAMES)
+        self._waits = [deque(maxlen=WAIT_SAMPLES) for _ in PRIORITY_NAMES]
+
+    @asynccontextmanager
+    async def slot(self, user: Optional[Hashable] = None, priority: int = INTERACTIVE):
+        """
+        Holds one of the model call slots for the duration of the block.
+
+        Args:
+            user: Key the call is queued under for fair turns (see session_user)
+            priority: INTERACTIVE, OBSERVATION or CREATION
+        """
+        await self.acquire(user, priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, user: Optional[Hashable] = None, priority: int = INTERACTIVE):
+        """Waits for a slot; every acquire must be paired with a release."""
+        start = time.perf_counter()
+        # Callers already waiting go first, even if a slot is free right now
+        if self.running < self.max_concurrency and not self.waiting:
+            self.running += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._queues[priority].setdefault(user, deque()).append(future)
+            self.waiting += 1
+            self.queued[priority] += 1
+            try:
+                await future
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                if future.done() and not future.cancelled():
+                    # The slot was handed over just as the caller went away; pass it on
+                    self.release()
+                else:
+                    self._discard(priority, user, future)
+                raise
+        self._record(priority, time.perf_counter() - start)
+
+    def release(self):
+        """Hands the slot to the next waiter, or frees it."""
+        future = self._next()
+        if future is None:
+            self.running -= 1
+        else:
+            # The slot changes hands without being freed, so no new arrival can take it
+            future.set_result(None)
+
+    def _next(self) -> Optional[asyncio.Future]:
+        for queue in self._queues:
+            while queue:
+                user, futures = next(iter(queue.items()))
+                future = futures.popleft()
+                # The user goes to the back of the class's turn order
+                del queue[user]
+                if futures:
+                    queue[user] = futures
+                self.waiting -= 1
+                if not future.done():
+                    return future
+        return None
+
+    def _discard(self, priority: int, user: Optional[Hashable], future: asyncio.Future):
+        queue = self._queues[priority]
+        futures = queue.get(user)
+        if futures and future in futures:
+            futures.remove(future)
+            self.waiting -= 1
+            if not futures:
+                del queue[user]
+
+    def _record(self, priority: int, wait: float):
+        self.admitted[priority] += 1
+        self._wait_total[priority] += wait
+        self._wait_max[priority] = max(self._wait_max[priority], wait)
+        self._waits[priority].append(wait)
+        tracer.observe("llm_queue_wait", wait, priority=PRIORITY_NAMES[priority])
+
+    def stats(self) -> Dict[str, Any]:
+        classes = {}
+        for priority, name in enumerate(PRIORITY_NAMES):
+            waits = sorted(self._waits[priority])
+            admitted = self.admitted[priority]
+            classes[name] = {
+                "admitted": admitted,
+                "queued": self.queued[priority],
+                "waiting": sum(len(futures) for futures in self._queues[priority].values()),
+                "wait_avg_ms": round(self._wait_total[priority] / admitted * 1000, 3) if admitted else 0.0,
+                "wait_p95_ms": round(waits[int(len(waits) * 0.95)] * 1000 if waits else 0.0, 3),
+                "wait_max_ms": round(self._wait_max[priority] * 1000, 3),
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self.running,
+            "waiting": self.waiting,
+            "cancelled": self.cancelled,
+            "classes": classes,
+        }
+
+
+llm_scheduler = LLMScheduler()
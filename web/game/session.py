@@ -1,9 +1,9 @@
+import asyncio
+import copy
 from pydantic import BaseModel
 from typing import Optional
 
 from web.rpg.Character import Character
-from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
 from langchain.schema import AIMessage, HumanMessage, SystemMessage
 from langchain_core.messages.tool import ToolMessage
 
@@ -11,26 +11,97 @@ class CharacterUpdate(BaseModel):
     name: Optional[str] = None
     lore: Optional[str] = None
 
-from web.utils.story_utils import update_story_with_character
+from web.game import tools
+from web.game.context import ContextWindow
+from web.game.digest import StateDigest
+from web.game.events import EventLog
+from web.game.llm import llm_clients
+from web.storage import aio
+from web.utils import story_utils
+from web.utils.log import get_logger
+from web.utils.tracing import tracer
+
+logger = get_logger(__name__)
+
+
+class ChatHistory(list):
+    """A list of messages that flags its session dirty whenever it is modified."""
+
+    def __init__(self, session, messages=()):
+        super().__init__(messages)
+        self._session = session
+
+    def _changed(self):
+        self._session.dirty = True
+
+    def append(self, item):
+        super().append(item)
+        self._changed()
+
+    def extend(self, items):
+        super().extend(items)
+        self._changed()
+
+    def insert(self, index, item):
+        super().insert(index, item)
+        self._changed()
+
+    def pop(self, index=-1):
+        item = super().pop(index)
+        self._changed()
+        return item
+
+    def remove(self, item):
+        super().remove(item)
+        self._changed()
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self._changed()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._changed()
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
 
 class GameSession:
     def __init__(self, session_id, username):
         self.session_id = session_id
         self.username = username
         self.player_character = Character()
+        # Whether chat history or character state changed since the last save
+        self.dirty = True
+        # Bumped whenever a tool may have changed the character; versions the state digest
+        self.state_version = 0
+        self.digest = StateDigest()
+        # Frames sent to this session's connections, replayed to clients that reconnect
+        self.events = EventLog()
         self.chat_history = []
 
-        # Set up tools and LLMs
-        self.action_tools = self.setup_action_tools()
-        self.creation_tools = self.setup_creation_tools()
-        self.observation_tools = self.setup_observation_tools()
+        # Tools are built once per process; calls get this session's character injected
+        self.action_tools = tools.ACTION_TOOLS
+        self.creation_tools = tools.CREATION_TOOLS
+        self.observation_tools = tools.OBSERVATION_TOOLS
 
-        self.llm_main = ChatOpenAI(model_name="gpt-4o-mini", streaming=True).bind_tools(
-            list(self.action_tools.values()))
-        self.llm_creation = ChatOpenAI(model_name="gpt-4o", streaming=True).bind_tools(
-            list(self.creation_tools.values()))
-        self.llm_observation = ChatOpenAI(model_name="gpt-4o-mini", streaming=True).bind_tools(
-            list(self.observation_tools.values()))
+        # Models, their HTTP pools and tool bindings are shared by every session of this worker
+        self.llm_main = llm_clients.bind_tools(
+            "gpt-4o-mini", tools.ACTION_TOOL_SCHEMAS, tools_key="action", streaming=True)
+        self.llm_creation = llm_clients.bind_tools(
+            "gpt-4o", tools.CREATION_TOOL_SCHEMAS, tools_key="creation", streaming=True)
+        self.llm_observation = llm_clients.bind_tools(
+            "gpt-4o-mini", tools.OBSERVATION_TOOL_SCHEMAS, tools_key="observation", streaming=True)
+
+        # Keeps the main model's prompt within the token budget
+        self.context = ContextWindow(summarizer=llm_clients.chat_model("gpt-4o-mini"),
+                                     user=username or session_id)
 
         # Set up system messages
         self.game_system = SystemMessage(content="""RPG Game Master Guidelines
@@ -120,181 +191,37 @@ Important: All these rules must be followed exactly. Missing any required field,
         self.chat_history = [self.game_system]
         self.character_created = False
 
-    def setup_action_tools(self):
-        @tool
-        def add_item(name: str, description: str, weight: float,
-                     amount: int = 1, rarity: str = "Common") -> str:
-            """Adds an item to the player's inventory."""
-            return self.player_character.add_item(name, description, weight, amount, rarity)
-
-        @tool
-        def remove_item(name: str, amount: int = 1) -> str:
-            """Removes an item from the player's inventory."""
-            return self.player_character.remove_item(name, amount)
-
-        @tool
-        def equip_item(item_name: str, slot: str) -> str:
-            """Equips an item from inventory to a specific slot."""
-            return self.player_character.equip(slot, item_name)
-
-        @tool
-        def unequip_item(slot: str) -> str:
-            """Removes an item from an equipment slot."""
-            return self.player_character.unequip(slot)
-
-        @tool
-        def see_inventory_and_equipements() -> str:
-            """Returns detailed list of all inventory items and equipment."""
-            inventory = self.player_character.see_inventory()
-            equipped = self.player_character.see_equipment()
-            return f"Inventory:\n{inventory}\nEquipment:\n{equipped}"
-
-        @tool
-        def see_equipment() -> str:
-            """Returns currently equipped items in all slots"""
-            return str(self.player_character.see_equipment())
-
-        @tool
-        def see_health() -> str:
-            """Returns current health and mana status"""
-            return str(self.player_character.see_health_and_mana())
-
-        @tool
-        def see_mana() -> str:
-            """Returns current mana status"""
-            return str(self.player_character.see_mana())
-
-        @tool
-        def see_level() -> str:
-            """Returns current level and experience progress"""
-            return str(self.player_character.see_level_and_experience())
-
-        @tool
-        def see_experience() -> str:
-            """Returns current experience and XP to next level"""
-            return str(self.player_character.see_experience())
-
-        @tool
-        def adjust_mana(amount: int) -> str:
-            """Modifies character's current mana."""
-            return self.player_character.adjust_mana(amount)
-
-        @tool
-        def adjust_experience(amount: int) -> str:
-            """Modifies character's experience points and handles level up if needed."""
-            return self.player_character.adjust_experience(amount)
-
-        @tool
-        def see_inventory() -> str:
-            """Returns detailed inventory contents"""
-            return self.player_character.see_inventory()
-
-        @tool
-        def adjust_health(amount: int) -> str:
-            """Modifies character's current health."""
-            self.player_character.health_and_mana['current_health'] += amount
-            self.player_character.health_and_mana['current_health'] = max(
-                0,
-                min(self.player_character.health_and_mana['current_health'],
-                    self.player_character.health_and_mana['max_health'])
-            )
-            return f"Health: {self.player_character.health_and_mana['current_health']}/{self.player_character.health_and_mana['max_health']}"
-
-        @tool
-        def level_up() -> str:
-            """Advances character to next level with benefits."""
-            pc = self.player_character
-            pc.level_and_experience['level'] += 1
-            pc.health_and_mana['max_health'] = int(pc.health_and_mana['max_health'] * 1.1)
-            pc.health_and_mana['current_health'] = pc.health_and_mana['max_health']
-            pc.health_and_mana['max_mana'] = int(pc.health_and_mana['max_mana'] * 1.1)
-            pc.health_and_mana['current_mana'] = pc.health_and_mana['max_mana']
-            pc.level_and_experience['experience'] = 0
-            pc.level_and_experience['experience_to_next_level'] *= 2
-
-            return f"""LEVEL UP! Now level {pc.level_and_experience['level']}.
-Max Health: {pc.health_and_mana['max_health']}
-Max Mana: {pc.health_and_mana['max_mana']}
-Next Level Requires: {pc.level_and_experience['experience_to_next_level']} XP"""
-
-        @tool
-        def see_name() -> str:
-            """Returns the character's name"""
-            return self.player_character.name
-
-        @tool
-        def see_lore() -> str:
-            """Returns the character's lore"""
-            return self.player_character.lore
+        # What the story file already holds, so saves only append the difference
+        self._saved_count = 0
+        self._saved_last = None
+        self._saved_character = None
+        self._save_lock = asyncio.Lock()
+        # Set by the session registry when stories are guarded by worker leases
+        self.lease_version = None
+        self.lease_guard = None
 
-        return {
-            "add_item": add_item,
-            "remove_item": remove_item,
-            "equip_item": equip_item,
-            "unequip_item": unequip_item,
-            "see_inventory": see_inventory,
-            "adjust_health": adjust_health,
-            "adjust_mana": adjust_mana,
-            "adjust_experience": adjust_experience,
-            "level_up": level_up,
-            "see_inventory_and_equipements": see_inventory_and_equipements,
-            "see_equipment": see_equipment,
-            "see_health": see_health,
-            "see_mana": see_mana,
-            "see_level": see_level,
-            "see_experience": see_experience,
-            "see_name": see_name,
-            "see_lore": see_lore
-        }
+    @property
+    def chat_history(self):
+        return self._chat_history
 
-    def setup_creation_tools(self):
-        @tool
-        def create_character(name: str, lore: str, level_and_experience: dict, health_and_mana: dict,
-                             equipment: dict) -> str:
-            """Creates the player character with comprehensive attributes."""
-            self.player_character.create_character(
-                name=name,
-                lore=lore,
-                level_and_experience=level_and_experience,
-                health_and_mana=health_and_mana,
-                equipment=equipment
-            )
-            self.character_created = True
-            return f"""Character '{name}' created!
-Lore: {lore}
-Equipment Slots: {self.player_character.see_equipment()}
-Starting Inventory: {self.player_character.see_inventory()}"""
-
-        return {"create_character": create_character}
-
-    def setup_observation_tools(self):
-        # These tools are the same as some action tools but separated for observation use
-        return {key: self.action_tools[key] for key in [
-            "see_inventory",
-            "see_equipment",
-            "see_health",
-            "see_mana",
-            "see_level",
-            "see_experience",
-            "see_inventory_and_equipements",
-            "see_name",
-            "see_lore"
-        ]}
+    @chat_history.setter
+    def chat_history(self, messages):
+        self._chat_history = ChatHistory(self, messages)
+        self.dirty = True
 
     def call_tool(self, tool_name, tool_args):
         """Executes the specified tool with given arguments."""
-        print(f"call_tool: {tool_name}, player_character type: {type(self.player_character)}")
-        if tool_name in self.action_tools:
-            try:
-                return self.action_tools[tool_name].invoke(tool_args)
-            except Exception as e:
-                return f"Error executing {tool_name}: {e}"
-        elif tool_name in self.creation_tools:
-            try:
-                return self.creation_tools[tool_name].invoke(tool_args)
-            except Exception as e:
-                return f"Error executing {tool_name}: {e}"
-        return f"Unknown tool '{tool_name}'"
+        logger.debug("call_tool %s on %s", tool_name, self.session_id)
+        if tool_name not in self.action_tools and tool_name not in self.creation_tools:
+            return f"Unknown tool '{tool_name}'"
+        if tool_name not in self.observation_tools:
+            self.dirty = True
+            self.state_version += 1
+        with tracer.span("call_tool", session=self.session_id, tool=tool_name):
+            output = tools.dispatch(tool_name, tool_args, self.player_character)
+        if tool_name == "create_character" and not output.startswith("Error executing"):
+            self.character_created = True
+        return output
 
     def get_character_data(self):
         """Returns character data for the UI and saving (equipment as dict)."""
@@ -307,21 +234,83 @@ Starting Inventory: {self.player_character.see_inventory()}"""
             "inventory": self.player_character.see_inventory()
         }
 
-    def save_session(self):
-        """Saves the current session data to the story file."""
-        story_update = {
-            "character": self.get_character_data(),
-            "chat_history": [
-                {"role": msg.type, "content": msg.content} for msg in self.chat_history
-            ]
-        }
-        update_story_with_character(self.username, self.session_id, story_update)
+    def get_story_character(self):
+        """Returns the character as saved in the story: the UI fields plus a full snapshot."""
+        # get_character_data shares the live dicts; the snapshot is built from fresh containers
+        character = copy.deepcopy(self.get_character_data())
+        character["snapshot"] = self.player_character.to_snapshot()
+        return character
 
-    def update_character(self, update_data: CharacterUpdate):
+    async def save_session(self):
+        """Saves the current session data to the story file."""
+        with tracer.span("save", session=self.session_id):
+            return await self._save()
+
+    async def _save(self):
+        # Saves of one session must reach storage in order
+        async with self._save_lock:
+            if self.lease_guard is None:
+                return await self._write_story()
+            # Only the worker owning the story may write it
+            async with self.lease_guard() as owned:
+                if not owned:
+                    logger.warning("Not saving %s: the story is owned by another worker", self.session_id)
+                    return {"success": False, "message": "Story lease lost"}
+                return await self._write_story()
+
+    async def _write_story(self):
+        # Changes made while the write is in flight mark the session dirty again
+        self.dirty = False
+        if story_utils.STORY_SAVE_MODE != "journal":
+            story_update = {
+                "character": self.get_story_character(),
+                "chat_history": [
+                    {"role": msg.type, "content": msg.content} for msg in self.chat_history
+                ]
+            }
+            result = await aio.update_story_with_character(self.username, self.session_id, story_update)
+            if not result.get("success"):
+                self.dirty = True
+            return result
+
+        history = self.chat_history
+        start = self._saved_count
+        # History is only ever appended to or replaced wholesale; if the last saved
+        # message is no longer in place, save everything again from the start
+        if start > len(history) or (start and history[start - 1] is not self._saved_last):
+            start = 0
+        messages = [{"role": msg.type, "content": msg.content} for msg in history[start:]]
+        # The write runs on another thread, so it gets its own copy of the live dicts
+        character = self.get_story_character()
+        changed_character = character if character != self._saved_character else None
+        truncate = start + len(messages) < self._saved_count
+        if not messages and changed_character is None and not truncate:
+            return None
+        saved_count, saved_last = len(history), (history[-1] if history else None)
+        result = await aio.append_story_changes(self.username, self.session_id, start, messages,
+                                                changed_character, truncate=truncate)
+        if result.get("success"):
+            self._saved_count, self._saved_last = saved_count, saved_last
+            self._saved_character = character
+        else:
+            self.dirty = True
+        return result
+
+    def mark_saved(self):
+        """Records the current chat history and character data as already persisted."""
+        self._saved_count = len(self.chat_history)
+        self._saved_last = self.chat_history[-1] if self.chat_history else None
+        # A private copy to diff against
+        self._saved_character = self.get_story_character()
+        self.dirty = False
+
+    async def update_character(self, update_data: CharacterUpdate):
         """Update character attributes and save session."""
         if update_data.name:
             self.player_character.name = update_data.name
         if update_data.lore:
             self.player_character.lore = update_data.lore
-        self.save_session()
+        self.dirty = True
+        self.state_version += 1
+        await self.save_session()
         return self.get_character_data()
@@ -0,0 +1,92 @@
+"""
+Incremental accumulator for streamed model responses.
+
+Merging a stream with `gathered = gathered + chunk` copies the whole content
+and re-merges every tool call chunk on each step, which is quadratic in the
+length of the response. StreamAccumulator only appends each chunk's text and
+tool call argument fragments to lists and builds the final AIMessage once.
+"""
+import json
+from typing import Dict, Any, List, Optional
+
+from langchain.schema import AIMessage
+from langchain_core.messages.ai import add_usage
+from langchain_core.messages.tool import tool_call, invalid_tool_call
+
+
+class StreamAccumulator:
+    def __init__(self):
+        self.chunks = 0
+        self._text: List[str] = []
+        # Tool call fragments by stream index: name, id and argument pieces
+        self._tool_calls: Dict[Any, Dict[str, Any]] = {}
+        # Complete tool calls from chunks that carry no fragments
+        self._complete_calls: List[Dict[str, Any]] = []
+        self._id: Optional[str] = None
+        self._response_metadata: Dict[str, Any] = {}
+        self._usage = None
+
+    def add(self, chunk):
+        """Adds one streamed chunk."""
+        self.chunks += 1
+        content = chunk.content
+        if content:
+            self._text.append(content if isinstance(content, str) else json.dumps(content))
+        tool_call_chunks = getattr(chunk, "tool_call_chunks", None)
+        if tool_call_chunks:
+            for fragment in tool_call_chunks:
+                index = fragment.get("index")
+                if index is None:
+                    index = ("position", len(self._tool_calls))
+                entry = self._tool_calls.setdefault(index, {"name": None, "id": None, "args": []})
+                if fragment.get("name"):
+                    entry["name"] = fragment["name"]
+                if fragment.get("id"):
+                    entry["id"] = fragment["id"]
+                if fragment.get("args"):
+                    entry["args"].append(fragment["args"])
+        elif getattr(chunk, "tool_calls", None):
+            self._complete_calls.extend(chunk.tool_calls)
+        if self._id is None and getattr(chunk, "id", None):
+            self._id = chunk.id
+        if getattr(chunk, "response_metadata", None):
+            self._response_metadata.update(chunk.response_metadata)
+        usage = getattr(chunk, "usage_metadata", None)
+        if usage:
+            self._usage = usage if self._usage is None else add_usage(self._usage, usage)
+
+    @property
+    def content(self) -> str:
+        return "".join(self._text)
+
+    @property
+    def empty(self) -> bool:
+        return self.chunks == 0
+
+    def message(self) -> Optional[AIMessage]:
+        """Returns the complete message, or None if nothing was streamed."""
+        if self.empty:
+            return None
+        tool_calls = list(self._complete_calls)
+        invalid_tool_calls = []
+        for entry in self._tool_calls.values():
+            args = "".join(entry["args"])
+            try:
+                parsed = json.loads(args) if args else {}
+                if not isinstance(parsed, dict):
+                    raise ValueError("tool call arguments must be a JSON object")
+            except ValueError as e:
+                invalid_tool_calls.append(invalid_tool_call(
+                    name=entry["name"], args=args, id=entry["id"], error=str(e)))
+                continue
+            tool_calls.append(tool_call(name=entry["name"], args=parsed, id=entry["id"]))
+        message = AIMessage(
+            content=self.content,
+            tool_calls=tool_calls,
+            invalid_tool_calls=invalid_tool_calls,
+            response_metadata=self._response_metadata,
+            usage_metadata=self._usage,
+        )
+        if self._id is not None:
+            message.id = self._id
+        return message
@@ -0,0 +1,223 @@
+"""
+Game tools shared by every session.
+
+The tools, their argument schemas and their OpenAI tool definitions are built
+once at import time. A session only supplies its player character, which is
+injected into the call by `dispatch` and never shown to the model.
+"""
+from typing import Annotated, Dict, Any
+
+from langchain_core.tools import tool, InjectedToolArg
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from web.rpg.Character import Character
+
+# Injected by `dispatch`; excluded from the schema the model sees
+CharacterArg = Annotated[Character, InjectedToolArg]
+
+
+@tool
+def add_item(name: str, description: str, weight: float, character: CharacterArg,
+             amount: int = 1, rarity: str = "Common") -> str:
+    """Adds an item to the player's inventory."""
+    return character.add_item(name, description, weight, amount, rarity)
+
+
+@tool
+def remove_item(name: str, character: CharacterArg, amount: int = 1) -> str:
+    """Removes an item from the player's inventory."""
+    return character.remove_item(name, amount)
+
+
+@tool
+def equip_item(item_name: str, slot: str, character: CharacterArg) -> str:
+    """Equips an item from inventory to a specific slot."""
+    return character.equip(slot, item_name)
+
+
+@tool
+def unequip_item(slot: str, character: CharacterArg) -> str:
+    """Removes an item from an equipment slot."""
+    return character.unequip(slot)
+
+
+@tool
+def see_inventory_and_equipements(character: CharacterArg) -> str:
+    """Returns detailed list of all inventory items and equipment."""
+    inventory = character.see_inventory()
+    equipped = character.see_equipment()
+    return f"Inventory:\n{inventory}\nEquipment:\n{equipped}"
+
+
+@tool
+def see_equipment(character: CharacterArg) -> str:
+    """Returns currently equipped items in all slots"""
+    return str(character.see_equipment())
+
+
+@tool
+def see_health(character: CharacterArg) -> str:
+    """Returns current health and mana status"""
+    return str(character.see_health_and_mana())
+
+
+@tool
+def see_mana(character: CharacterArg) -> str:
+    """Returns current mana status"""
+    return str(character.see_mana())
+
+
+@tool
+def see_level(character: CharacterArg) -> str:
+    """Returns current level and experience progress"""
+    return str(character.see_level_and_experience())
+
+
+@tool
+def see_experience(character: CharacterArg) -> str:
+    """Returns current experience and XP to next level"""
+    return str(character.see_experience())
+
+
+@tool
+def adjust_mana(amount: int, character: CharacterArg) -> str:
+    """Modifies character's current mana."""
+    return character.adjust_mana(amount)
+
+
+@tool
+def adjust_experience(amount: int, character: CharacterArg) -> str:
+    """Modifies character's experience points and handles level up if needed."""
+    return character.adjust_experience(amount)
+
+
+@tool
+def see_inventory(character: CharacterArg) -> str:
+    """Returns detailed inventory contents"""
+    return character.see_inventory()
+
+
+@tool
+def adjust_health(amount: int, character: CharacterArg) -> str:
+    """Modifies character's current health."""
+    character.health_and_mana['current_health'] += amount
+    character.health_and_mana['current_health'] = max(
+        0,
+        min(character.health_and_mana['current_health'],
+            character.health_and_mana['max_health'])
+    )
+    return f"Health: {character.health_and_mana['current_health']}/{character.health_and_mana['max_health']}"
+
+
+@tool
+def level_up(character: CharacterArg) -> str:
+    """Advances character to next level with benefits."""
+    pc = character
+    pc.level_and_experience['level'] += 1
+    pc.health_and_mana['max_health'] = int(pc.health_and_mana['max_health'] * 1.1)
+    pc.health_and_mana['current_health'] = pc.health_and_mana['max_health']
+    pc.health_and_mana['max_mana'] = int(pc.health_and_mana['max_mana'] * 1.1)
+    pc.health_and_mana['current_mana'] = pc.health_and_mana['max_mana']
+    pc.level_and_experience['experience'] = 0
+    pc.level_and_experience['experience_to_next_level'] *= 2
+
+    return f"""LEVEL UP! Now level {pc.level_and_experience['level']}.
+Max Health: {pc.health_and_mana['max_health']}
+Max Mana: {pc.health_and_mana['max_mana']}
+Next Level Requires: {pc.level_and_experience['experience_to_next_level']} XP"""
+
+
+@tool
+def see_name(character: CharacterArg) -> str:
+    """Returns the character's name"""
+    return character.name
+
+
+@tool
+def see_lore(character: CharacterArg) -> str:
+    """Returns the character's lore"""
+    return character.lore
+
+
+@tool
+def create_character(name: str, lore: str, level_and_experience: dict, health_and_mana: dict,
+                     equipment: dict, character: CharacterArg) -> str:
+    """Creates the player character with comprehensive attributes."""
+    character.create_character(
+        name=name,
+        lore=lore,
+        level_and_experience=level_and_experience,
+        health_and_mana=health_and_mana,
+        equipment=equipment
+    )
+    return f"""Character '{name}' created!
+Lore: {lore}
+Equipment Slots: {character.see_equipment()}
+Starting Inventory: {character.see_inventory()}"""
+
+
+ACTION_TOOLS = {t.name: t for t in [
+    add_item,
+    remove_item,
+    equip_item,
+    unequip_item,
+    see_inventory,
+    adjust_health,
+    adjust_mana,
+    adjust_experience,
+    level_up,
+    see_inventory_and_equipements,
+    see_equipment,
+    see_health,
+    see_mana,
+    see_level,
+    see_experience,
+    see_name,
+    see_lore,
+]}
+
+CREATION_TOOLS = {"create_character": create_character}
+
+# These tools are the same as some action tools but separated for observation use
+OBSERVATION_TOOLS = {key: ACTION_TOOLS[key] for key in [
+    "see_inventory",
+    "see_equipment",
+    "see_health",
+    "see_mana",
+    "see_level",
+    "see_experience",
+    "see_inventory_and_equipements",
+    "see_name",
+    "see_lore"
+]}
+
+# Tools that only read the character; every other tool may change it
+READ_ONLY_TOOLS = frozenset(OBSERVATION_TOOLS)
+
+ALL_TOOLS = {**ACTION_TOOLS, **CREATION_TOOLS}
+
+# OpenAI tool definitions, converted once and bound to the shared models as-is
+ACTION_TOOL_SCHEMAS = [convert_to_openai_tool(t) for t in ACTION_TOOLS.values()]
+CREATION_TOOL_SCHEMAS = [convert_to_openai_tool(t) for t in CREATION_TOOLS.values()]
+OBSERVATION_TOOL_SCHEMAS = [convert_to_openai_tool(t) for t in OBSERVATION_TOOLS.values()]
+
+
+def dispatch(tool_name: str, tool_args: Dict[str, Any], character: Character) -> str:
+    """
+    Runs a tool against a character.
+
+    Args:
+        tool_name: Name of the tool the model called
+        tool_args: Arguments the model supplied
+        character: Player character the tool acts on
+
+    Returns:
+        The tool output, or an error message for the model.
+    """
+    game_tool = ALL_TOOLS.get(tool_name)
+    if game_tool is None:
+        return f"Unknown tool '{tool_name}'"
+    try:
+        return game_tool.invoke({**tool_args, "character": character})
+    except Exception as e:
+        return f"Error executing {tool_name}: {e}"
@@ -1,10 +1,7 @@
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from web.config import templates
-from web.user_management import (
-    register_user, authenticate_user, get_user_stories, create_story,
-    get_story, update_story
-)
+from web.storage import aio
 
 router = APIRouter()
 
@@ -21,7 +18,7 @@ async def api_register(data: dict):
     password = data.get("password", "")
     if not username or not password:
         return {"success": False, "message": "Username and password required"}
-    result = register_user(username, password)
+    result = await aio.register_user(username, password)
     return result
 
 @router.post("/api/login")
@@ -30,7 +27,7 @@ async def api_login(request: Request, data: dict):
     password = data.get("password", "")
     if not username or not password:
         return {"success": False, "message": "Username and password required"}
-    result = authenticate_user(username, password)
+    result = await aio.authenticate_user(username, password)
     if result.get("success"):
         request.session["username"] = username
     return result
@@ -1,12 +1,21 @@
+from typing import Optional
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from web.config import templates
 from web.routes.auth import get_username_from_session
 from web.game.session import GameSession, CharacterUpdate
+from web.game.registry import session_registry, SessionBusyError
+from web.storage import aio
+from web.storage.write_behind import save_scheduler
 
 router = APIRouter()
 
-game_sessions = {}
+def ui_character(character):
+    """The saved character without its snapshot, which only sessions restore from."""
+    if not character:
+        return character
+    return {key: value for key, value in character.items() if key != "snapshot"}
+
 
 @router.get("/", response_class=HTMLResponse)
 async def get_root(request: Request):
@@ -27,53 +36,51 @@ async def api_game_ready(story_id: str):
 async def create_session():
     import uuid
     session_id = str(uuid.uuid4())
-    game_sessions[session_id] = GameSession(session_id)
+    await session_registry.add(GameSession(session_id))
     return {"session_id": session_id}
 
 @router.get("/character/{session_id}")
 async def get_character(session_id: str):
-    if session_id in game_sessions:
-        return game_sessions[session_id].get_character_data()
+    session = session_registry.peek(session_id)
+    if session is not None:
+        return session.get_character_data()
     # Try to load from story file
-    import os
-    import json
-    from web.user_management import USERS_DIR
-    for user_file in os.listdir(USERS_DIR):
-        if user_file.endswith(".json"):
-            username = user_file[:-5]
-            user_dir = os.path.join(USERS_DIR, username)
-            story_file = os.path.join(user_dir, f"{session_id}.json")
-            if os.path.exists(story_file):
-                with open(story_file, "r") as f:
-                    story_data = json.load(f)
-                if "character" in story_data:
-                    return story_data["character"]
-                else:
-                    return {"error": "Character data not found in story file"}
-    return {"error": "Session not found"}
+    _, story_data = await aio.find_story(session_id)
+    if story_data is None:
+        return {"error": "Session not found"}
+    if "character" in story_data:
+        return ui_character(story_data["character"])
+    return {"error": "Character data not found in story file"}
 
 @router.get("/story/{session_id}")
 async def get_story_full(session_id: str):
     # Returns both character and chat_history for the session/story
-    import os
-    import json
-    from web.user_management import USERS_DIR
-    for user_file in os.listdir(USERS_DIR):
-        if user_file.endswith(".json"):
-            username = user_file[:-5]
-            user_dir = os.path.join(USERS_DIR, username)
-            story_file = os.path.join(user_dir, f"{session_id}.json")
-            if os.path.exists(story_file):
-                with open(story_file, "r") as f:
-                    story_data = json.load(f)
-                return {
-                    "character": story_data.get("character"),
-                    "chat_history": story_data.get("chat_history", [])
-                }
-    return {"error": "Session not found"}
+    _, story_data = await aio.find_story(session_id)
+    if story_data is None:
+        return {"error": "Session not found"}
+    return {
+        "character": ui_character(story_data.get("character")),
+        "chat_history": story_data.get("chat_history", [])
+    }
+
+@router.get("/story/{session_id}/history")
+async def get_story_history(session_id: str, before: Optional[int] = None, limit: Optional[int] = None,
+                            tools: bool = False):
+    # Newest first; pass next_cursor back as `before` for the previous page
+    session = session_registry.peek(session_id)
+    if session is not None:
+        await save_scheduler.flush(session)
+    result = await aio.get_history_page(session_id, before, limit, include_tools=tools)
+    if not result.get("success"):
+        return {"error": result.get("message", "Session not found")}
+    return {"messages": result["messages"], "next_cursor": result["next_cursor"]}
 
 @router.put("/character/{session_id}")
 async def update_character(session_id: str, update: CharacterUpdate):
-    if session_id not in game_sessions:
-        return {"error": "Session not found"}
-    return game_sessions[session_id].update_character(update)
+    try:
+        async with session_registry.use(session_id) as session:
+            if session is None:
+                return {"error": "Session not found"}
+            return await session.update_character(update)
+    except SessionBusyError as e:
+        return {"error": str(e)}
@@ -0,0 +1,29 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from web.game.llm import llm_clients
+from web.game.scheduler import llm_scheduler
+from web.game.registry import session_registry
+from web.game.executor import executor_totals
+from web.game.frames import frame_totals
+from web.game.character_sync import sync_totals
+from web.game.events import event_totals
+from web.storage.write_behind import save_scheduler
+from web.utils.tracing import tracer
+
+router = APIRouter()
+
+# Worker-wide stats exported next to the span histograms
+tracer.register("llm_clients", llm_clients.stats)
+tracer.register("llm_scheduler", llm_scheduler.stats)
+tracer.register("saves", save_scheduler.stats)
+tracer.register("sessions", session_registry.stats)
+tracer.register("turns", lambda: executor_totals)
+tracer.register("frames", lambda: frame_totals)
+tracer.register("character_sync", lambda: sync_totals)
+tracer.register("events", lambda: event_totals)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Span histograms and worker stats, in the Prometheus text format."""
+    return PlainTextResponse(tracer.exposition(), media_type="text/plain; version=0.0.4")
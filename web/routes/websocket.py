@@ -1,130 +1,121 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 import json
-from web.game.session import GameSession
-from web.game.helpers import process_character_creation, process_observation, process_ai_response
-from web.rpg.Character import Character
+from web.game.helpers import process_character_creation, run_turn
+from web.game.frames import FrameBatcher
+from web.game.character_sync import CharacterSync, is_resync_request
+from web.game.registry import session_registry, SessionBusyError
+from web.game.events import event_totals
+from web.storage import aio
+from web.storage.write_behind import save_scheduler
+from web.utils.log import get_logger
 
-router = APIRouter()
+logger = get_logger(__name__)
 
-game_sessions = {}
+router = APIRouter()
 
 @router.websocket("/ws/{session_id}")
 async def websocket_endpoint(websocket: WebSocket, session_id: str):
     await websocket.accept()
 
-    if session_id not in game_sessions:
-        # Try to load session from story file
-        import os
-        from web.user_management import USERS_DIR
-        from web.game.session import GameSession
-        for user_file in os.listdir(USERS_DIR):
-            if user_file.endswith(".json"):
-                username = user_file[:-5]
-                user_dir = os.path.join(USERS_DIR, username)
-                story_file = os.path.join(user_dir, f"{session_id}.json")
-                if os.path.exists(story_file):
-                    with open(story_file, "r") as f:
-                        story_data = json.load(f)
-                    # Reconstruct GameSession with character data if available
-                    session = GameSession(session_id, username)
-                    if "character" in story_data:
-                        char = story_data["character"]
-                        if not isinstance(session.player_character, Character):
-                            # print("player_character is not a Character instance, resetting.")
-                            session.player_character = Character()
-                        session.player_character.name = char.get("name", "")
-                        session.player_character.lore = char.get("lore", "")
-                        session.player_character.health_and_mana = char.get("health", {})
-                        session.player_character.level_and_experience = char.get("level", {})
-                        # Restore equipment properly
-                        equipment_data = char.get("equipment", {})
-                        from rpg.inventory import Item
-                        for slot in session.player_character.equipped:
-                            slot_data = equipment_data.get(slot)
-                            if slot_data is not None and isinstance(slot_data, dict):
-                                session.player_character.equipped[slot] = Item(
-                                    name=slot_data["name"],
-                                    description=slot_data["description"],
-                                    weight=slot_data["weight"],
-                                    amount=slot_data.get("amount", 1),
-                                    rarity=slot_data.get("rarity", "Common")
-                                )
-                            else:
-                                session.player_character.equipped[slot] = None
-                        # Do NOT restore inventory directly; let Character class manage it
-                        # session.player_character.inventory = char.get("inventory", "")
-                        # print("player_character type after restore:", type(session.player_character))
-                    # Restore chat history if available
-                    chat_history = story_data.get("chat_history", [])
-                    from langchain.schema import HumanMessage, AIMessage, SystemMessage
-                    restored_history = []
-                    for msg in chat_history:
-                        if isinstance(msg, dict):
-                            role = msg.get("role", "").lower()
-                            content = msg.get("content", "")
-                            if role == "human":
-                                restored_history.append(HumanMessage(content=content))
-                            elif role == "system":
-                                restored_history.append(SystemMessage(content=content))
-                            elif "ai" in role:
-                                restored_history.append(AIMessage(content=content))
-                            elif role == "tool":
-                                print(f"Tool message detected: {msg}")
-                            else:
-                                print(f"Skipping unknown message type: {msg}")
-                        else:
-                            print(f"Unexpected message format: {msg}")
-                    if restored_history:
-                        session.chat_history = restored_history
-                    session.character_created = True
-                    game_sessions[session_id] = session
-                    break
-        if session_id not in game_sessions:
-            await websocket.send_text(json.dumps({"error": "Session not found"}))
-            await websocket.close()
-            return
-
-    session = game_sessions[session_id]
+    async def hand_off():
+        # Another worker asked for the story; closing ends play() and releases it
+        await websocket.send_text(json.dumps({
+            "type": "system",
+            "content": "This story was opened somewhere else."
+        }))
+        await websocket.close()
+
+    # The connection pins the session so it is never evicted while in use
+    try:
+        async with session_registry.use(session_id, on_revoke=hand_off) as session:
+            if session is None:
+                await websocket.send_text(json.dumps({"error": "Session not found"}))
+                await websocket.close()
+                return
+            await play(websocket, session, resume_from(websocket))
+    except SessionBusyError:
+        await websocket.send_text(json.dumps({"error": "This story is open somewhere else"}))
+        await websocket.close()
+
+
+def resume_from(websocket: WebSocket):
+    """The (seq, epoch) a reconnecting client last received, from `?since=<seq>&epoch=<epoch>`."""
+    since = websocket.query_params.get("since")
+    if since is None or not since.isdigit():
+        return None
+    return int(since), websocket.query_params.get("epoch")
+
+
+async def resume(websocket: WebSocket, session, since=None):
+    """
+    Tells the client where the session's event stream is, then sends what it missed:
+    the buffered frames after its last seq, or else the newest page of persisted messages.
+    The stream's position goes in `head`, not `seq`: the hello is not an event, and
+    the client must not count it as one when skipping frames it already handled.
+    """
+    replay = session.events.since(*since) if since is not None else None
+    await websocket.send_text(json.dumps({
+        "type": "hello",
+        "epoch": session.events.epoch,
+        "head": session.events.seq,
+        "resumed": replay is not None,
+    }))
+    if replay is not None:
+        for frame in replay:
+            await websocket.send_text(frame)
+    elif since is not None:
+        event_totals["storage_fallbacks"] += 1
+        await save_scheduler.flush(session)
+        # The newest page; the client loads older ones through the history endpoint
+        result = await aio.get_history_page(session.session_id, include_tools=True)
+        await websocket.send_text(json.dumps({
+            "type": "history",
+            "messages": list(reversed(result.get("messages", []))),
+            "next_cursor": result.get("next_cursor"),
+        }))
+
+
+async def play(websocket: WebSocket, session, since=None):
+    await resume(websocket, session, since)
+    # Everything sent from here on goes through the batcher, which coalesces narration frames
+    # and stamps them with the session's next seq
+    frames = FrameBatcher(websocket, events=session.events)
+    # Character state goes out as a full update on connect, then as patches
+    character_sync = CharacterSync()
 
     try:
         if not session.character_created:
             user_input = await websocket.receive_text()
-            await process_character_creation(websocket, session, user_input)
-            await websocket.send_text(json.dumps({
+            await process_character_creation(frames, session, user_input)
+            await frames.send_text(json.dumps({
                 "type": "system",
                 "content": "GAME STARTED!"
             }))
-            await websocket.send_text(json.dumps({
-                "type": "character_update",
-                "data": session.get_character_data()
-            }))
+        await character_sync.push(frames, session.get_character_data())
 
         while True:
             user_input = await websocket.receive_text()
+            if is_resync_request(user_input):
+                await character_sync.push(frames, session.get_character_data(), full=True)
+                continue
             from langchain.schema import HumanMessage
-            await websocket.send_text(json.dumps({
+            await frames.send_text(json.dumps({
                 "type": "user",
                 "content": user_input
             }))
 
             session.chat_history.append(HumanMessage(content=user_input))
-            session.save_session()
-
-            observation_results = await process_observation(session)
-            await websocket.send_text(json.dumps({
-                "type": "observation",
-                "content": observation_results
-            }))
+            save_scheduler.request_save(session)
 
-            await process_ai_response(websocket, session)
-            session.save_session()
-            await websocket.send_text(json.dumps({
-                "type": "character_update",
-                "data": session.get_character_data()
-            }))
+            await run_turn(frames, session)
+            save_scheduler.request_save(session)
+            await character_sync.push(frames, session.get_character_data())
 
     except WebSocketDisconnect:
-        print(f"Client disconnected: {session_id}")
+        logger.info("Client disconnected: %s", session.session_id)
     except Exception as e:
-        print(f"Error: {e}")
+        logger.exception("Error in game websocket %s: %s", session.session_id, e)
         await websocket.close()
+    finally:
+        await frames.close()
+        await save_scheduler.flush(session)
@@ -1,4 +1,6 @@
-from rpg.inventory import Inventory, Item
+import orjson
+
+from rpg.inventory import Inventory, Item, SNAPSHOT_VERSION, check_snapshot_version
 
 class Character:
     def __init__(self):
@@ -182,3 +184,50 @@ class Character:
 
     def remove_item(self, name: str, amount: int = 1):
         return self.inventory.remove_item(name, amount)
+
+    def to_snapshot(self) -> dict:
+        """
+        Returns the whole character, inventory included, in the compact snapshot format.
+
+        Short keys: n name, l lore, lx level and experience, hm health and mana,
+        eq filled equipment slots, inv inventory. Empty slots are left out.
+        """
+        return {
+            "v": SNAPSHOT_VERSION,
+            "n": self.name,
+            "l": self.lore,
+            "lx": dict(self.level_and_experience),
+            "hm": dict(self.health_and_mana),
+            "eq": {slot: item.to_snapshot() for slot, item in self.equipped.items() if item is not None},
+            "inv": self.inventory.to_snapshot(),
+        }
+
+    @classmethod
+    def from_snapshot(cls, data) -> "Character":
+        """
+        Rebuilds a character from to_snapshot() output.
+
+        Args:
+            data: The snapshot, or its JSON encoding as bytes or str
+
+        Raises:
+            ValueError: If the snapshot was written by a newer version
+        """
+        if isinstance(data, (bytes, str)):
+            data = orjson.loads(data)
+        check_snapshot_version(data)
+        character = cls()
+        character.name = data["n"]
+        character.lore = data["l"]
+        character.level_and_experience = dict(data["lx"])
+        character.health_and_mana = dict(data["hm"])
+        equipment = data.get("eq", {})
+        for slot in character.equipped:
+            if slot in equipment:
+                character.equipped[slot] = Item.from_snapshot(equipment[slot])
+        character.inventory = Inventory.from_snapshot(data["inv"])
+        return character
+
+    def dump_snapshot(self) -> bytes:
+        """Returns the snapshot encoded as compact JSON."""
+        return orjson.dumps(self.to_snapshot())
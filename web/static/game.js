@@ -30,6 +30,12 @@ document.addEventListener('DOMContentLoaded', async function() {
     let currentAiMessage = null;
     let characterCreated = false;
     let pendingToolCalls = {};  // To track pending tool calls
+    let characterState = null;  // Last character state received, patched in place
+    let characterRevision = 0;
+    let eventEpoch = null;  // Event stream of the session, and the last event received from it
+    let lastEventSeq = null;
+    let historyCursor = null;  // Where the next older page of chat history starts
+    let loadingHistory = false;
 
     // Get story_id from body attribute if present
     const storyId = document.body.getAttribute('data-story-id');
@@ -49,122 +55,171 @@ document.addEventListener('DOMContentLoaded', async function() {
         connectWebSocket();
     }
 
+    async function fetchHistoryPage(before) {
+        let url = `/story/${sessionId}/history?tools=1`;
+        if (before !== null && before !== undefined) url += `&before=${before}`;
+        const response = await fetch(url);
+        return await response.json();
+    }
+
     async function fetchAndRenderChatHistory() {
+        // Only the newest page; older pages load when the player scrolls up
         try {
-            const response = await fetch(`/story/${sessionId}`);
-            const data = await response.json ? await response.json() : await response;
-            if (data && data.chat_history && Array.isArray(data.chat_history)) {
-                // Collect all legacy observation messages in a batch
-                let pendingObservations = [];
-                // For tool call/output pairing
-                let pendingToolCall = null;
-
-                data.chat_history.forEach(msg => {
-                    // Hide system guidelines and "Begin the adventure"
-                    if (
-                        (msg.role === 'system' && msg.content && msg.content.includes('RPG Game Master Guidelines')) ||
-                        (msg.role === 'human' && msg.content && (
-                            msg.content.trim() === 'Begin the adventure.' ||
-                            msg.content.trim().startsWith('World Description:')
-                        ))
-                    ) {
-                        return;
-                    }
-                    // Handle legacy observation messages
-                    if (
-                        msg.role &&
-                        msg.role.toLowerCase().startsWith('ai') &&
-                        msg.content &&
-                        msg.content.startsWith('Observation AI called Tool')
-                    ) {
-                        // Parse observation tool call and collect
-                        const observation = parseObservationMessage(msg.content);
-                        if (Array.isArray(observation)) {
-                            pendingObservations.push(...observation);
-                        } else {
-                            pendingObservations.push(observation);
-                        }
-                        return;
-                    }
+            const data = await fetchHistoryPage(null);
+            if (data && Array.isArray(data.messages)) {
+                renderChatHistory(data.messages.slice().reverse());
+                historyCursor = data.next_cursor;
+                scrollToBottom();
+            }
+        } catch (error) {
+            console.error('Error fetching chat history:', error);
+        }
+    }
 
-                    // If we reach a non-observation message and have pending observations, render them
-                    if (pendingObservations.length > 0) {
-                        addObservationMessage(pendingObservations);
-                        pendingObservations = [];
-                    }
+    async function loadOlderHistory() {
+        if (loadingHistory || historyCursor === null || historyCursor === undefined) return;
+        loadingHistory = true;
+        try {
+            const data = await fetchHistoryPage(historyCursor);
+            if (data && Array.isArray(data.messages)) {
+                prependChatHistory(data.messages.slice().reverse());
+                historyCursor = data.next_cursor;
+            }
+        } catch (error) {
+            console.error('Error fetching older chat history:', error);
+        } finally {
+            loadingHistory = false;
+        }
+    }
 
-                    // Skip empty AI messages
-                    if (
-                        msg.role &&
-                        msg.role.toLowerCase().startsWith('ai') &&
-                        (!msg.content || !msg.content.trim())
-                    ) {
-                        return;
-                    }
+    function prependChatHistory(messages) {
+        // Renders at the end as usual, then moves the new nodes above the existing ones
+        const firstExisting = chatHistory.firstChild;
+        const renderedBefore = chatHistory.childNodes.length;
+        const previousHeight = chatHistory.scrollHeight;
+        const previousTop = chatHistory.scrollTop;
+        const streamingMessage = currentAiMessage;
+        currentAiMessage = null;
+        renderChatHistory(messages);
+        currentAiMessage = streamingMessage;
+        const added = Array.from(chatHistory.childNodes).slice(renderedBefore);
+        added.forEach(node => chatHistory.insertBefore(node, firstExisting));
+        // Keep the messages the player was reading in place
+        chatHistory.scrollTop = chatHistory.scrollHeight - previousHeight + previousTop;
+    }
 
-                    // Tool call/output pairing (assumes tool_call and tool_output are in chat_history)
-                    if (msg.type === 'tool_call') {
-                        pendingToolCall = {
-                            name: msg.name,
-                            args: JSON.stringify(msg.args, null, 2),
-                            output: null
-                        };
-                        return;
-                    }
-                    if (msg.type === 'tool_output' && pendingToolCall) {
-                        pendingToolCall.output = msg.content;
-                        addCombinedToolMessage(
-                            pendingToolCall.name,
-                            pendingToolCall.args,
-                            pendingToolCall.output
-                        );
-                        pendingToolCall = null;
-                        return;
-                    }
-                    // Only render descriptive tool call messages as expanders
-                    if (
-                        msg.role &&
-                        msg.role.toLowerCase().startsWith('ai') &&
-                        msg.content &&
-                        msg.content.startsWith('Tool AI called Tool')
-                    ) {
-                        // Extract tool name from descriptive format
-                        let toolName = "Tool";
-                        let args = "";
-                        let output = msg.content || "";
-                        // Match: Tool AI called Tool TOOL_NAME with arguments: ... and got response:\nRESULT
-                        const regex = /^Tool AI called Tool ([^ ]+)(?: with arguments: (.*?))? and got response:\n([\s\S]*)$/;
-                        const match = msg.content.match(regex);
-                        if (match) {
-                            toolName = match[1].trim();
-                            args = match[2] ? match[2].trim() : "";
-                            output = match[3] ? match[3].trim() : "";
-                        }
-                        addCombinedToolMessage(
-                            toolName,
-                            args,
-                            output
-                        );
-                        return;
-                    }
+    chatHistory.addEventListener('scroll', () => {
+        if (chatHistory.scrollTop < 50) loadOlderHistory();
+    });
 
-                    // Render regular messages
-                    if (msg.role === 'human') {
-                        addUserMessage(msg.content);
-                    } else if (msg.role === 'system') {
-                        addSystemMessage(msg.content);
-                    } else if (msg.role && msg.role.toLowerCase().startsWith('ai')) {
-                        appendToAiMessage(msg.content);
-                        finalizeAiMessage();
-                    }
-                });
-                // Render any remaining observations at the end
-                if (pendingObservations.length > 0) {
-                    addObservationMessage(pendingObservations);
+    function renderChatHistory(messages) {
+        // Collect all legacy observation messages in a batch
+        let pendingObservations = [];
+        // For tool call/output pairing
+        let pendingToolCall = null;
+
+        messages.forEach(msg => {
+            // Hide system guidelines and "Begin the adventure"
+            if (
+                (msg.role === 'system' && msg.content && msg.content.includes('RPG Game Master Guidelines')) ||
+                (msg.role === 'human' && msg.content && (
+                    msg.content.trim() === 'Begin the adventure.' ||
+                    msg.content.trim().startsWith('World Description:')
+                ))
+            ) {
+                return;
+            }
+            // Handle legacy observation messages
+            if (
+                msg.role &&
+                msg.role.toLowerCase().startsWith('ai') &&
+                msg.content &&
+                msg.content.startsWith('Observation AI called Tool')
+            ) {
+                // Parse observation tool call and collect
+                const observation = parseObservationMessage(msg.content);
+                if (Array.isArray(observation)) {
+                    pendingObservations.push(...observation);
+                } else {
+                    pendingObservations.push(observation);
                 }
+                return;
             }
-        } catch (error) {
-            console.error('Error fetching chat history:', error);
+
+            // If we reach a non-observation message and have pending observations, render them
+            if (pendingObservations.length > 0) {
+                addObservationMessage(pendingObservations);
+                pendingObservations = [];
+            }
+
+            // Skip empty AI messages
+            if (
+                msg.role &&
+                msg.role.toLowerCase().startsWith('ai') &&
+                (!msg.content || !msg.content.trim())
+            ) {
+                return;
+            }
+
+            // Tool call/output pairing (assumes tool_call and tool_output are in chat_history)
+            if (msg.type === 'tool_call') {
+                pendingToolCall = {
+                    name: msg.name,
+                    args: JSON.stringify(msg.args, null, 2),
+                    output: null
+                };
+                return;
+            }
+            if (msg.type === 'tool_output' && pendingToolCall) {
+                pendingToolCall.output = msg.content;
+                addCombinedToolMessage(
+                    pendingToolCall.name,
+                    pendingToolCall.args,
+                    pendingToolCall.output
+                );
+                pendingToolCall = null;
+                return;
+            }
+            // Only render descriptive tool call messages as expanders
+            if (
+                msg.role &&
+                msg.role.toLowerCase().startsWith('ai') &&
+                msg.content &&
+                msg.content.startsWith('Tool AI called Tool')
+            ) {
+                // Extract tool name from descriptive format
+                let toolName = "Tool";
+                let args = "";
+                let output = msg.content || "";
+                // Match: Tool AI called Tool TOOL_NAME with arguments: ... and got response:\nRESULT
+                const regex = /^Tool AI called Tool ([^ ]+)(?: with arguments: (.*?))? and got response:\n([\s\S]*)$/;
+                const match = msg.content.match(regex);
+                if (match) {
+                    toolName = match[1].trim();
+                    args = match[2] ? match[2].trim() : "";
+                    output = match[3] ? match[3].trim() : "";
+                }
+                addCombinedToolMessage(
+                    toolName,
+                    args,
+                    output
+                );
+                return;
+            }
+
+            // Render regular messages
+            if (msg.role === 'human') {
+                addUserMessage(msg.content);
+            } else if (msg.role === 'system') {
+                addSystemMessage(msg.content);
+            } else if (msg.role && msg.role.toLowerCase().startsWith('ai')) {
+                appendToAiMessage(msg.content);
+                finalizeAiMessage();
+            }
+        });
+        // Render any remaining observations at the end
+        if (pendingObservations.length > 0) {
+            addObservationMessage(pendingObservations);
         }
     }
 
@@ -252,7 +307,11 @@ document.addEventListener('DOMContentLoaded', async function() {
 
     function connectWebSocket(onOpenCallback) {
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        const wsUrl = `${protocol}//${window.location.host}/ws/${sessionId}`;
+        let wsUrl = `${protocol}//${window.location.host}/ws/${sessionId}`;
+        if (eventEpoch !== null && lastEventSeq !== null) {
+            // Reconnecting: only the events missed meanwhile are sent again
+            wsUrl += `?since=${lastEventSeq}&epoch=${eventEpoch}`;
+        }
 
         webSocket = new WebSocket(wsUrl);
 
@@ -263,6 +322,10 @@ document.addEventListener('DOMContentLoaded', async function() {
 
         webSocket.onmessage = (event) => {
             const message = JSON.parse(event.data);
+            if (message.seq !== undefined) {
+                if (lastEventSeq !== null && message.seq <= lastEventSeq) return;  // Already handled
+                lastEventSeq = message.seq;
+            }
             handleWebSocketMessage(message);
         };
 
@@ -340,8 +403,27 @@ document.addEventListener('DOMContentLoaded', async function() {
                     addToolOutputMessage(message.content);
                 }
                 break;
+            case 'hello':
+                // A new epoch restarts seqs at 1; without a replay, the next frame follows the head
+                if (message.epoch !== eventEpoch || !message.resumed) lastEventSeq = message.head;
+                eventEpoch = message.epoch;
+                break;
+            case 'history':
+                // The missed events are gone; render the newest page again from storage
+                chatHistory.innerHTML = '';
+                currentAiMessage = null;
+                pendingToolCalls = {};
+                renderChatHistory(message.messages);
+                historyCursor = message.next_cursor;
+                scrollToBottom();
+                break;
             case 'character_update':
-                updateCharacterUI(message.data);
+                characterState = message.data;
+                characterRevision = message.rev || 0;
+                updateCharacterUI(characterState);
+                break;
+            case 'character_patch':
+                applyCharacterPatch(message);
                 break;
             case 'error':
                 addSystemMessage(`Error: ${message.content}`);
@@ -351,6 +433,102 @@ document.addEventListener('DOMContentLoaded', async function() {
         }
     }
 
+    function applyCharacterPatch(message) {
+        // A patch only applies to the state it was computed from
+        if (characterState === null || message.base !== characterRevision) {
+            requestCharacterResync();
+            return;
+        }
+        try {
+            characterState = applyJsonPatch(characterState, message.ops);
+        } catch (error) {
+            console.error('Error applying character patch:', error);
+            requestCharacterResync();
+            return;
+        }
+        characterRevision = message.rev;
+        updateCharacterUI(characterState);
+    }
+
+    function requestCharacterResync() {
+        characterState = null;
+        if (webSocket && webSocket.readyState === WebSocket.OPEN) {
+            webSocket.send(JSON.stringify({ type: 'resync' }));
+        }
+    }
+
+    // Applies RFC 6902 operations to a copy of the document and returns it
+    function applyJsonPatch(document, operations) {
+        let root = JSON.parse(JSON.stringify(document));
+        const parsePointer = (pointer) => pointer === '' ? [] :
+            pointer.split('/').slice(1).map(token => token.replace(/~1/g, '/').replace(/~0/g, '~'));
+        const resolve = (tokens) => {
+            let parent = root;
+            for (const token of tokens.slice(0, -1)) {
+                if (parent === null || typeof parent !== 'object' || !(token in parent)) {
+                    throw new Error(`Invalid patch path: ${tokens.join('/')}`);
+                }
+                parent = parent[token];
+            }
+            return [parent, tokens[tokens.length - 1]];
+        };
+        const getValue = (tokens) => {
+            if (tokens.length === 0) return root;
+            const [parent, key] = resolve(tokens);
+            if (!(key in parent)) throw new Error(`Missing value at ${tokens.join('/')}`);
+            return parent[key];
+        };
+        const remove = (tokens) => {
+            const [parent, key] = resolve(tokens);
+            if (!(key in parent)) throw new Error(`Missing value at ${tokens.join('/')}`);
+            const value = parent[key];
+            if (Array.isArray(parent)) parent.splice(Number(key), 1); else delete parent[key];
+            return value;
+        };
+        const add = (tokens, value) => {
+            if (tokens.length === 0) { root = value; return; }
+            const [parent, key] = resolve(tokens);
+            if (Array.isArray(parent)) {
+                parent.splice(key === '-' ? parent.length : Number(key), 0, value);
+            } else {
+                parent[key] = value;
+            }
+        };
+        for (const op of operations) {
+            const path = parsePointer(op.path);
+            switch (op.op) {
+                case 'add':
+                    add(path, op.value);
+                    break;
+                case 'remove':
+                    remove(path);
+                    break;
+                case 'replace': {
+                    // In place, so keys keep their order (the equipment list is shown in it)
+                    if (path.length === 0) { root = op.value; break; }
+                    getValue(path);
+                    const [parent, key] = resolve(path);
+                    parent[Array.isArray(parent) ? Number(key) : key] = op.value;
+                    break;
+                }
+                case 'move':
+                    add(path, remove(parsePointer(op.from)));
+                    break;
+                case 'copy':
+                    add(path, JSON.parse(JSON.stringify(getValue(parsePointer(op.from)))));
+                    break;
+                case 'test':
+                    if (JSON.stringify(getValue(path)) !== JSON.stringify(op.value)) {
+                        throw new Error(`Patch test failed at ${op.path}`);
+                    }
+                    break;
+                default:
+                    throw new Error(`Unknown patch operation: ${op.op}`);
+            }
+        }
+        return root;
+    }
+
     function addCombinedToolMessage(toolName, args, output) {
         const toolMessage = document.createElement('div');
         toolMessage.className = 'tool-message';
@@ -0,0 +1,70 @@
+"""
+Awaitable storage facade.
+
+Every function here runs its blocking counterpart from web.user_management
+or web.utils.story_utils on a bounded thread pool, so disk reads, writes
+and fsyncs never stall the event loop (and other sessions' token streams).
+"""
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from web import user_management
+from web.utils import story_utils
+
+# Upper bound on concurrently running storage operations per worker
+STORAGE_IO_THREADS = int(os.environ.get("STORAGE_IO_THREADS", "4"))
+
+_executor = ThreadPoolExecutor(max_workers=STORAGE_IO_THREADS, thread_name_prefix="storage-io")
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Runs a blocking storage call on the storage I/O pool and awaits its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+async def register_user(username, password):
+    return await run_blocking(user_management.register_user, username, password)
+
+
+async def authenticate_user(username, password):
+    return await run_blocking(user_management.authenticate_user, username, password)
+
+
+async def get_user_stories(username):
+    return await run_blocking(user_management.get_user_stories, username)
+
+
+async def create_story(username, world_description, character_description):
+    return await run_blocking(user_management.create_story, username, world_description, character_description)
+
+
+async def get_story(username, story_id):
+    return await run_blocking(user_management.get_story, username, story_id)
+
+
+async def update_story(username, story_id, chat_history):
+    return await run_blocking(user_management.update_story, username, story_id, chat_history)
+
+
+async def delete_story(username, story_id):
+    return await run_blocking(user_management.delete_story, username, story_id)
+
+
+async def find_story(story_id):
+    return await run_blocking(story_utils.find_story, story_id)
+
+
+async def update_story_with_character(username, story_id, story_update):
+    return await run_blocking(story_utils.update_story_with_character, username, story_id, story_update)
+
+
+async def append_story_changes(username, story_id, start, messages, character=None, truncate=False):
+    return await run_blocking(story_utils.append_story_changes, username, story_id, start, messages,
+                              character, truncate)
+
+
+async def get_history_page(story_id, before=None, limit=None, include_tools=False):
+    return await run_blocking(story_utils.get_history_page, story_id, before, limit, include_tools)
@@ -0,0 +1,142 @@
+import os
+from typing import Dict, List, Optional, Any
+
+# Which storage engine to use: "json" (one file per user and story) or "sqlite"
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "json")
+
+# Messages per history page when the client does not ask for a size, and the most it may ask for
+HISTORY_PAGE_SIZE = int(os.environ.get("HISTORY_PAGE_SIZE", "50"))
+HISTORY_PAGE_MAX = 200
+
+# Descriptive messages the game adds for tool calls; shown only when tools are asked for
+TOOL_MESSAGE_PREFIXES = ("Tool AI called Tool", "Observation AI called Tool")
+# The hidden first message of a story, sent to the model to start the adventure
+STORY_START_PREFIX = "World Description:"
+STORY_START_MESSAGE = "Begin the adventure."
+
+
+def is_visible_message(message: Dict[str, Any], include_tools: bool = False) -> bool:
+    """
+    Whether a saved message is shown to the player: system prompts, tool results,
+    empty model messages and the story's opening prompt are internal.
+
+    Args:
+        message: A saved {"role", "content"} message
+        include_tools: Also show the descriptive tool call messages
+    """
+    role = (message.get("role") or "").lower()
+    content = message.get("content") or ""
+    if role == "human":
+        stripped = content.strip()
+        return not (stripped == STORY_START_MESSAGE or stripped.startswith(STORY_START_PREFIX))
+    if not role.startswith("ai") or not content.strip():
+        return False
+    return include_tools or not content.startswith(TOOL_MESSAGE_PREFIXES)
+
+
+class StorageBackend:
+    """
+    Interface implemented by every storage engine.
+
+    Methods return the same {"success": ..., "message": ...} dicts as the
+    functions in web.user_management, so routes do not care which engine runs.
+    """
+
+    def create_user(self, username: str, password_hash: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def get_user(self, username: str) -> Optional[Dict[str, Any]]:
+        """Returns the stored user record (including password_hash) or None."""
+        raise NotImplementedError
+
+    def get_user_stories(self, username: str) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def create_story(self, username: str, world_description: str, character_description: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def get_story(self, username: str, story_id: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def find_story_owner(self, story_id: str) -> Optional[str]:
+        """Returns the username owning `story_id`, or None if there is no such story."""
+        raise NotImplementedError
+
+    def update_story(self, username: str, story_id: str, chat_history: List) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def update_story_with_character(self, username: str, story_id: str, story_update: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def append_story_changes(self, username: str, story_id: str, start: int, messages: List[Dict[str, Any]],
+                             character: Optional[Dict[str, Any]] = None, truncate: bool = False) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def delete_story(self, username: str, story_id: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def get_history_page(self, username: str, story_id: str, before: Optional[int] = None,
+                         limit: int = HISTORY_PAGE_SIZE, include_tools: bool = False) -> Dict[str, Any]:
+        """
+        Returns one page of the messages shown to the player, newest first.
+
+        Engines override this to read only the page; this version loads the whole story.
+
+        Args:
+            username: The username
+            story_id: The story ID
+            before: Cursor from a previous page: only messages at earlier positions are returned
+            limit: Most messages returned
+            include_tools: Also return the descriptive tool call messages
+
+        Returns:
+            {"success", "messages": [{"seq", "role", "content"}, ...], "next_cursor"}, where
+            next_cursor is None once the oldest message was returned
+        """
+        result = self.get_story(username, story_id)
+        if not result.get("success"):
+            return result
+        history = result["story_data"].get("chat_history", [])
+        stop = len(history) if before is None else max(0, min(before, len(history)))
+        page = []
+        for seq in range(stop - 1, -1, -1):
+            if is_visible_message(history[seq], include_tools):
+                page.append(dict(history[seq], seq=seq))
+                if len(page) > limit:
+                    break
+        return history_page(page, limit)
+
+
+def history_page(messages: List[Dict[str, Any]], limit: int) -> Dict[str, Any]:
+    """Builds a history page from up to `limit` + 1 messages read newest first."""
+    more = len(messages) > limit
+    messages = messages[:limit]
+    return {
+        "success": True,
+        "messages": messages,
+        "next_cursor": messages[-1]["seq"] if more and messages else None,
+    }
+
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """Returns the process-wide storage backend selected by STORAGE_BACKEND."""
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == "sqlite":
+            from web.storage.sqlite_backend import SqliteStorage
+            _storage = SqliteStorage()
+        elif STORAGE_BACKEND == "json":
+            from web.storage.json_backend import JsonStorage
+            _storage = JsonStorage()
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}'")
+    return _storage
+
+
+def set_storage(storage: Optional[StorageBackend]):
+    """Replaces the process-wide backend (None resets to the configured default)."""
+    global _storage
+    _storage = storage
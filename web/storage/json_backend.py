@@ -0,0 +1,274 @@
+import os
+import json
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+
+from web.user_management import USERS_DIR, ensure_user_directories
+from web.storage.backend import StorageBackend, HISTORY_PAGE_SIZE, is_visible_message, history_page
+from web.utils import story_index
+from web.utils.story_journal import (
+    load_story_file, atomic_write_json, clear_journal, append_records,
+    message_record, truncate_record, character_record
+)
+from web.utils.history_index import ensure_index, update_index, drop_index, read_page
+from web.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+
+def user_file_path(username: str) -> str:
+    return os.path.join(USERS_DIR, f"{username.lower()}.json")
+
+
+def story_file_path(username: str, story_id: str) -> str:
+    return os.path.join(USERS_DIR, username.lower(), f"{story_id}.json")
+
+
+class JsonStorage(StorageBackend):
+    """
+    File-per-record storage: users/<name>.json for each user and
+    users/<name>/<story_id>.json (plus its journal) for each story.
+    Suited to small installs that do not want a database.
+    """
+
+    def create_user(self, username: str, password_hash: str) -> Dict[str, Any]:
+        ensure_user_directories()
+
+        # Check if username already exists
+        user_file = user_file_path(username)
+        if os.path.exists(user_file):
+            return {"success": False, "message": "Username already exists"}
+
+        # Create user data
+        user_data = {
+            "username": username,
+            "password_hash": password_hash,
+            "created_at": datetime.now().isoformat(),
+            "stories": []
+        }
+
+        # Create user directory
+        user_dir = os.path.join(USERS_DIR, username.lower())
+        if not os.path.exists(user_dir):
+            os.makedirs(user_dir)
+
+        # Save user data
+        atomic_write_json(user_file, user_data)
+
+        return {"success": True, "message": "User registered successfully"}
+
+    def get_user(self, username: str) -> Optional[Dict[str, Any]]:
+        user_file = user_file_path(username)
+        if not os.path.exists(user_file):
+            return None
+        with open(user_file, "r") as f:
+            return json.load(f)
+
+    def get_user_stories(self, username: str) -> List[Dict[str, Any]]:
+        """
+        Get all stories for a user, only returning those with an existing story file.
+        """
+        user_file = user_file_path(username)
+        user_dir = os.path.join(USERS_DIR, username.lower())
+
+        if not os.path.exists(user_file):
+            return []
+
+        try:
+            with open(user_file, "r") as f:
+                user_data = json.load(f)
+            stories = user_data.get("stories", [])
+            filtered_stories = []
+            for story in stories:
+                story_file = os.path.join(user_dir, f"{story['id']}.json")
+                if os.path.exists(story_file):
+                    filtered_stories.append(story)
+            return filtered_stories
+        except Exception:
+            return []
+
+    def create_story(self, username: str, world_description: str, character_description: str) -> Dict[str, Any]:
+        user_file = user_file_path(username)
+
+        if not os.path.exists(user_file):
+            return {"success": False, "message": "User not found"}
+
+        try:
+            # Generate a unique ID for the story
+            story_id = str(uuid.uuid4())
+
+            # Create story data
+            story_data = {
+                "id": story_id,
+                "created_at": datetime.now().isoformat(),
+                "last_updated": datetime.now().isoformat(),
+                "world_description": world_description,
+                "character_description": character_description,
+                "chat_history": []
+            }
+
+            # Create story directory if it doesn't exist
+            user_dir = os.path.join(USERS_DIR, username.lower())
+            if not os.path.exists(user_dir):
+                os.makedirs(user_dir)
+
+            # Save story data
+            story_file = os.path.join(user_dir, f"{story_id}.json")
+            atomic_write_json(story_file, story_data)
+
+            story_index.add_story(story_id, username)
+
+            # Update user data with new story
+            with open(user_file, "r") as f:
+                user_data = json.load(f)
+
+            user_data["stories"].append({
+                "id": story_id,
+                "created_at": story_data["created_at"],
+                "last_updated": story_data["last_updated"],
+                "world_description": world_description[:50] + "..." if len(world_description) > 50 else world_description
+            })
+
+            atomic_write_json(user_file, user_data)
+
+            return {"success": True, "message": "Story created successfully", "story_data": story_data}
+        except Exception as e:
+            return {"success": False, "message": f"Error creating story: {str(e)}"}
+
+    def get_story(self, username: str, story_id: str) -> Dict[str, Any]:
+        story_file = story_file_path(username, story_id)
+
+        if not os.path.exists(story_file):
+            return {"success": False, "message": "Story not found"}
+
+        try:
+            story_data = load_story_file(story_file)
+
+            return {"success": True, "story_data": story_data}
+        except Exception as e:
+            return {"success": False, "message": f"Error retrieving story: {str(e)}"}
+
+    def get_history_page(self, username: str, story_id: str, before: Optional[int] = None,
+                         limit: int = HISTORY_PAGE_SIZE, include_tools: bool = False) -> Dict[str, Any]:
+        story_file = story_file_path(username, story_id)
+        if not os.path.exists(story_file):
+            return {"success": False, "message": "Story not found"}
+        try:
+            ensure_index(story_file, lambda: load_story_file(story_file).get("chat_history", []))
+            page = read_page(story_file, before, limit, lambda message: is_visible_message(message, include_tools))
+            return history_page(page, limit)
+        except Exception as e:
+            return {"success": False, "message": f"Error retrieving history: {str(e)}"}
+
+    def find_story_owner(self, story_id: str) -> Optional[str]:
+        entry = story_index.find_story(story_id)
+        if entry is None or not os.path.exists(entry["path"]):
+            return None
+        return entry["username"]
+
+    def update_story(self, username: str, story_id: str, chat_history: List) -> Dict[str, Any]:
+        story_file = story_file_path(username, story_id)
+
+        if not os.path.exists(story_file):
+            return {"success": False, "message": "Story not found"}
+
+        try:
+            story_data = load_story_file(story_file)
+
+            # Update chat history and last_updated
+            story_data["chat_history"] = chat_history
+            story_data["last_updated"] = datetime.now().isoformat()
+
+            atomic_write_json(story_file, story_data)
+            clear_journal(story_file)
+            drop_index(story_file)
+
+            # Also update the last_updated in the user's stories list
+            user_file = user_file_path(username)
+            with open(user_file, "r") as f:
+                user_data = json.load(f)
+
+            for story in user_data["stories"]:
+                if story["id"] == story_id:
+                    story["last_updated"] = story_data["last_updated"]
+                    break
+
+            atomic_write_json(user_file, user_data)
+
+            return {"success": True, "message": "Story updated successfully"}
+        except Exception as e:
+            return {"success": False, "message": f"Error updating story: {str(e)}"}
+
+    def update_story_with_character(self, username: str, story_id: str, story_update: Dict[str, Any]) -> Dict[str, Any]:
+        story_file = story_file_path(username, story_id)
+        if not os.path.exists(story_file):
+            logger.warning("Story file %s does not exist at save time", story_file)
+            return {"success": False, "message": "Story not found"}
+        try:
+            story_data = load_story_file(story_file)
+            # Update character and chat_history
+            story_data["character"] = story_update.get("character")
+            story_data["chat_history"] = story_update.get("chat_history")
+            story_data["last_updated"] = story_data.get("last_updated")
+            atomic_write_json(story_file, story_data)
+            clear_journal(story_file)
+            drop_index(story_file)
+            # Sizes only: the story itself is already on disk
+            logger.debug("Saved story %s to %s: %d messages, character %s", story_id, story_file,
+                         len(story_data["chat_history"] or ()), "set" if story_data["character"] else "unset")
+            return {"success": True, "message": "Story updated successfully"}
+        except Exception as e:
+            logger.error("Error updating story %s: %s", story_id, e)
+            return {"success": False, "message": f"Error updating story: {str(e)}"}
+
+    def append_story_changes(self, username: str, story_id: str, start: int, messages: List[Dict[str, Any]],
+                             character: Optional[Dict[str, Any]] = None, truncate: bool = False) -> Dict[str, Any]:
+        story_file = story_file_path(username, story_id)
+        if not os.path.exists(story_file):
+            logger.warning("Story file %s does not exist at save time", story_file)
+            return {"success": False, "message": "Story not found"}
+        try:
+            records = [message_record(start + i, msg) for i, msg in enumerate(messages)]
+            if truncate:
+                records.append(truncate_record(start + len(messages)))
+            if character is not None:
+                records.append(character_record(character))
+            append_records(story_file, records)
+            try:
+                update_index(story_file, start, messages, truncate)
+            except Exception as e:
+                # The index was dropped and is rebuilt on the next read; the save itself succeeded
+                logger.warning("Error updating history index of %s: %s", story_id, e)
+            logger.debug("Appended %d records to story %s", len(records), story_id)
+            return {"success": True, "message": "Story updated successfully"}
+        except Exception as e:
+            logger.error("Error updating story %s: %s", story_id, e)
+            return {"success": False, "message": f"Error updating story: {str(e)}"}
+
+    def delete_story(self, username: str, story_id: str) -> Dict[str, Any]:
+        user_dir = os.path.join(USERS_DIR, username.lower())
+        story_file = os.path.join(user_dir, f"{story_id}.json")
+        user_file = user_file_path(username)
+        try:
+            if os.path.exists(story_file):
+                os.remove(story_file)
+                logger.debug("Removed story file %s", story_file)
+            else:
+                logger.info("Story file %s does not exist", story_file)
+            clear_journal(story_file)
+            drop_index(story_file, deleted=True)
+            story_index.remove_story(story_id)
+            # Remove from user JSON
+            if os.path.exists(user_file):
+                with open(user_file, "r") as f:
+                    user_data = json.load(f)
+                user_data["stories"] = [s for s in user_data.get("stories", []) if s["id"] != story_id]
+                atomic_write_json(user_file, user_data)
+            else:
+                logger.info("User file %s does not exist", user_file)
+            logger.info("Deleted story %s of %s", story_id, username)
+            return {"success": True}
+        except Exception as e:
+            logger.error("Error deleting story %s: %s", story_id, e)
+            return {"success": False, "message": str(e)}
@@ -0,0 +1,178 @@
+"""
+Story leases shared by every worker process on this host.
+
+A worker must hold a story's lease before it keeps that story's session in
+memory and writes it. Leases live in a small SQLite database, expire after
+SESSION_LEASE_TTL seconds unless renewed, and carry a version that is bumped
+whenever ownership moves to another worker; a worker whose cached session
+has an older version rebuilds it from storage. Released leases keep their
+row, so versions never go backwards.
+"""
+import os
+import time
+import socket
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, Float, String, case, create_engine, event, inspect, select, update
+)
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.dialects.sqlite import insert
+
+from web.user_management import USERS_DIR
+
+LEASE_DB_PATH = os.environ.get("SESSION_LEASE_DB") or os.path.join(USERS_DIR, "leases.db")
+# Seconds a lease stays valid without being renewed
+SESSION_LEASE_TTL = float(os.environ.get("SESSION_LEASE_TTL", "30"))
+
+metadata = MetaData()
+
+leases_table = Table(
+    "leases", metadata,
+    Column("story_id", String, primary_key=True),
+    Column("owner", String, nullable=False),
+    Column("expires_at", Float, nullable=False),
+    Column("version", Integer, nullable=False),
+    Column("handoff_requested", Integer, nullable=False, default=0),
+)
+
+
+@dataclass
+class Lease:
+    story_id: str
+    owner: str
+    version: int
+    expires_at: float
+    handoff_requested: bool = False
+
+
+class LeaseStore:
+    """
+    Args:
+        path: SQLite database shared by the workers
+        ttl: Seconds a lease stays valid without being renewed
+        worker_id: Owner name of this worker; defaults to WORKER_ID or host:pid
+    """
+
+    def __init__(self, path: str = None, ttl: float = SESSION_LEASE_TTL, worker_id: str = None):
+        self.path = path or LEASE_DB_PATH
+        self.ttl = ttl
+        self._worker_id = worker_id
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.engine = create_engine(f"sqlite:///{self.path}", connect_args={"timeout": 30})
+        event.listen(self.engine, "connect", self._on_connect)
+        try:
+            metadata.create_all(self.engine)
+        except OperationalError:
+            # Another worker created the table between the check and the create
+            if not inspect(self.engine).has_table("leases"):
+                raise
+
+    @property
+    def worker_id(self) -> str:
+        # Resolved on use, so workers forked after the store was created get their own id
+        return self._worker_id or os.environ.get("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+    @staticmethod
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    def acquire(self, story_id: str) -> Optional[Lease]:
+        """
+        Takes the lease on a story if it is free, expired or already ours.
+
+        Returns:
+            The lease, or None if another worker holds it.
+        """
+        now = time.time()
+        owner = self.worker_id
+        statement = insert(leases_table).values(
+            story_id=story_id, owner=owner, expires_at=now + self.ttl, version=1, handoff_requested=0
+        )
+        excluded = statement.excluded
+        statement = statement.on_conflict_do_update(
+            index_elements=[leases_table.c.story_id],
+            set_={
+                "version": case((leases_table.c.owner == excluded.owner, leases_table.c.version),
+                                else_=leases_table.c.version + 1),
+                "owner": excluded.owner,
+                "expires_at": excluded.expires_at,
+                "handoff_requested": 0,
+            },
+            where=(leases_table.c.owner == excluded.owner) | (leases_table.c.expires_at < now),
+        ).returning(leases_table.c.version, leases_table.c.expires_at)
+        with self.engine.begin() as conn:
+            row = conn.execute(statement).first()
+        if row is None:
+            return None
+        return Lease(story_id, owner, row.version, row.expires_at)
+
+    def renew(self, lease: Lease) -> bool:
+        """
+        Extends a lease we still hold and refreshes its handoff_requested flag.
+
+        Returns:
+            False if the lease was lost (expired and taken by another worker).
+        """
+        expires_at = time.time() + self.ttl
+        with self.engine.begin() as conn:
+            row = conn.execute(
+                update(leases_table)
+                .where(leases_table.c.story_id == lease.story_id,
+                       leases_table.c.owner == lease.owner,
+                       leases_table.c.version == lease.version)
+                .values(expires_at=expires_at)
+                .returning(leases_table.c.handoff_requested)
+            ).first()
+        if row is None:
+            return False
+        lease.expires_at = expires_at
+        lease.handoff_requested = bool(row.handoff_requested)
+        return True
+
+    def release(self, lease: Lease):
+        """Gives the lease up; the row stays so the version keeps counting."""
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(leases_table)
+                .where(leases_table.c.story_id == lease.story_id,
+                       leases_table.c.owner == lease.owner,
+                       leases_table.c.version == lease.version)
+                .values(expires_at=0, handoff_requested=0)
+            )
+
+    def request_handoff(self, story_id: str):
+        """Asks the worker holding a story's lease to let it go."""
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(leases_table)
+                .where(leases_table.c.story_id == story_id)
+                .values(handoff_requested=1)
+            )
+
+    def holder(self, story_id: str) -> Optional[Lease]:
+        """Returns the current (unexpired) lease on a story, if any."""
+        with self.engine.connect() as conn:
+            row = conn.execute(select(leases_table).where(leases_table.c.story_id == story_id)).first()
+        if row is None or row.expires_at < time.time():
+            return None
+        return Lease(row.story_id, row.owner, row.version, row.expires_at, bool(row.handoff_requested))
+
+
+_lease_store: Optional[LeaseStore] = None
+
+
+def get_lease_store() -> LeaseStore:
+    global _lease_store
+    if _lease_store is None:
+        _lease_store = LeaseStore()
+    return _lease_store
+
+
+def set_lease_store(store: Optional[LeaseStore]):
+    global _lease_store
+    _lease_store = store
@@ -0,0 +1,54 @@
+"""
+Imports an existing JSON users tree into the SQLite backend.
+
+    python -m web.storage.migrate [--users-dir users] [--sqlite-path users/storage.db]
+
+Users and stories already present in the database are skipped, so the
+migration can be re-run safely.
+"""
+import argparse
+import json
+import os
+
+from web.user_management import USERS_DIR
+from web.storage.sqlite_backend import SqliteStorage, SQLITE_PATH
+from web.utils.story_journal import load_story_file
+
+
+def migrate(users_dir: str, sqlite_path: str) -> dict:
+    """
+    Copies every user, story, message and character from `users_dir` into
+    the database at `sqlite_path`.
+
+    Returns:
+        Dict with the number of users and stories imported
+    """
+    storage = SqliteStorage(sqlite_path)
+    counts = {"users": 0, "stories": 0}
+    for user_file in sorted(os.listdir(users_dir)):
+        if not user_file.endswith(".json") or user_file.startswith("."):
+            continue
+        with open(os.path.join(users_dir, user_file), "r") as f:
+            user_data = json.load(f)
+        username = user_data.get("username", user_file[:-5])
+        result = storage.create_user(username, user_data["password_hash"], created_at=user_data.get("created_at"))
+        if result["success"]:
+            counts["users"] += 1
+
+        user_dir = os.path.join(users_dir, user_file[:-5])
+        for story in user_data.get("stories", []):
+            story_data = load_story_file(os.path.join(user_dir, f"{story['id']}.json"))
+            if story_data is None or storage.find_story_owner(story["id"]) is not None:
+                continue
+            storage.import_story(username, {**story_data, "id": story["id"]})
+            counts["stories"] += 1
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import the JSON users tree into SQLite")
+    parser.add_argument("--users-dir", default=USERS_DIR)
+    parser.add_argument("--sqlite-path", default=SQLITE_PATH)
+    args = parser.parse_args()
+    counts = migrate(args.users_dir, args.sqlite_path)
+    print(f"Imported {counts['users']} users and {counts['stories']} stories into {args.sqlite_path}")
@@ -0,0 +1,326 @@
+import os
+import json
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+
+from sqlalchemy import (
+    MetaData, Table, Column, ForeignKey, Index, Integer, String, Text,
+    create_engine, event, select, insert, update, delete, and_, or_, not_, func
+)
+
+from web.user_management import USERS_DIR
+from web.storage.backend import (
+    StorageBackend, HISTORY_PAGE_SIZE, TOOL_MESSAGE_PREFIXES, STORY_START_PREFIX, STORY_START_MESSAGE, history_page
+)
+from web.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+SQLITE_PATH = os.environ.get("SQLITE_PATH") or os.path.join(USERS_DIR, "storage.db")
+
+metadata = MetaData()
+
+users_table = Table(
+    "users", metadata,
+    Column("username", String, primary_key=True),  # lower-cased login name
+    Column("display_name", String, nullable=False),
+    Column("password_hash", String, nullable=False),
+    Column("created_at", String, nullable=False),
+)
+
+stories_table = Table(
+    "stories", metadata,
+    Column("id", String, primary_key=True),
+    Column("owner", String, ForeignKey("users.username", ondelete="CASCADE"), nullable=False),
+    Column("created_at", String, nullable=False),
+    Column("last_updated", String, nullable=False),
+    Column("world_description", Text, nullable=False),
+    Column("character_description", Text, nullable=False),
+    Index("ix_stories_owner_last_updated", "owner", "last_updated"),
+)
+
+messages_table = Table(
+    "messages", metadata,
+    Column("story_id", String, ForeignKey("stories.id", ondelete="CASCADE"), primary_key=True),
+    Column("seq", Integer, primary_key=True),
+    Column("role", String, nullable=False),
+    Column("content", Text, nullable=False),
+    Column("extra", Text),  # any other message fields, as JSON
+)
+
+characters_table = Table(
+    "characters", metadata,
+    Column("story_id", String, ForeignKey("stories.id", ondelete="CASCADE"), primary_key=True),
+    Column("data", Text, nullable=False),
+    Column("updated_at", String, nullable=False),
+)
+
+
+def _story_summary(world_description: str) -> str:
+    return world_description[:50] + "..." if len(world_description) > 50 else world_description
+
+
+def _message_row(story_id: str, seq: int, message: Dict[str, Any]) -> Dict[str, Any]:
+    extra = {k: v for k, v in message.items() if k not in ("role", "content")}
+    return {
+        "story_id": story_id,
+        "seq": seq,
+        "role": message.get("role", ""),
+        "content": message.get("content") or "",
+        "extra": json.dumps(extra) if extra else None,
+    }
+
+
+def _message_from_row(row) -> Dict[str, Any]:
+    message = {"role": row.role, "content": row.content}
+    if row.extra:
+        message.update(json.loads(row.extra))
+    return message
+
+
+def _starts_with(column, prefix: str):
+    # Case-sensitive, like str.startswith (LIKE is not)
+    return func.substr(column, 1, len(prefix)) == prefix
+
+
+def _visible_messages(include_tools: bool):
+    """SQL version of backend.is_visible_message."""
+    role = func.lower(messages_table.c.role)
+    content = func.trim(messages_table.c.content, " \t\r\n")
+    human = and_(role == "human", content != STORY_START_MESSAGE, not_(_starts_with(content, STORY_START_PREFIX)))
+    ai = and_(role.like("ai%"), content != "")
+    if not include_tools:
+        ai = and_(ai, *(not_(_starts_with(messages_table.c.content, prefix)) for prefix in TOOL_MESSAGE_PREFIXES))
+    return or_(human, ai)
+
+
+class SqliteStorage(StorageBackend):
+    """
+    SQLite storage with indexed tables for users, stories, messages and
+    character snapshots. The database runs in WAL mode so readers never
+    block the writer.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or SQLITE_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.engine = create_engine(f"sqlite:///{self.path}")
+        event.listen(self.engine, "connect", self._on_connect)
+        metadata.create_all(self.engine)
+
+    @staticmethod
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    def create_user(self, username: str, password_hash: str, created_at: str = None) -> Dict[str, Any]:
+        with self.engine.begin() as conn:
+            exists = conn.execute(
+                select(users_table.c.username).where(users_table.c.username == username.lower())
+            ).first()
+            if exists:
+                return {"success": False, "message": "Username already exists"}
+            conn.execute(insert(users_table).values(
+                username=username.lower(),
+                display_name=username,
+                password_hash=password_hash,
+                created_at=created_at or datetime.now().isoformat(),
+            ))
+        return {"success": True, "message": "User registered successfully"}
+
+    def get_user(self, username: str) -> Optional[Dict[str, Any]]:
+        with self.engine.connect() as conn:
+            row = conn.execute(select(users_table).where(users_table.c.username == username.lower())).first()
+        if row is None:
+            return None
+        return {
+            "username": row.display_name,
+            "password_hash": row.password_hash,
+            "created_at": row.created_at,
+            "stories": self.get_user_stories(username),
+        }
+
+    def get_user_stories(self, username: str) -> List[Dict[str, Any]]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(stories_table.c.id, stories_table.c.created_at, stories_table.c.last_updated, stories_table.c.world_description)
+                .where(stories_table.c.owner == username.lower())
+                .order_by(stories_table.c.created_at)
+            ).all()
+        return [{
+            "id": row.id,
+            "created_at": row.created_at,
+            "last_updated": row.last_updated,
+            "world_description": _story_summary(row.world_description),
+        } for row in rows]
+
+    def create_story(self, username: str, world_description: str, character_description: str) -> Dict[str, Any]:
+        try:
+            with self.engine.begin() as conn:
+                exists = conn.execute(
+                    select(users_table.c.username).where(users_table.c.username == username.lower())
+                ).first()
+                if not exists:
+                    return {"success": False, "message": "User not found"}
+                now = datetime.now().isoformat()
+                story_data = {
+                    "id": str(uuid.uuid4()),
+                    "created_at": now,
+                    "last_updated": now,
+                    "world_description": world_description,
+                    "character_description": character_description,
+                    "chat_history": []
+                }
+                conn.execute(insert(stories_table).values(
+                    id=story_data["id"],
+                    owner=username.lower(),
+                    created_at=story_data["created_at"],
+                    last_updated=story_data["last_updated"],
+                    world_description=world_description,
+                    character_description=character_description,
+                ))
+            return {"success": True, "message": "Story created successfully", "story_data": story_data}
+        except Exception as e:
+            return {"success": False, "message": f"Error creating story: {str(e)}"}
+
+    def import_story(self, username: str, story_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Stores a complete story as-is, keeping its id and timestamps (used by migrations)."""
+        now = datetime.now().isoformat()
+        with self.engine.begin() as conn:
+            conn.execute(insert(stories_table).values(
+                id=story_data["id"],
+                owner=username.lower(),
+                created_at=story_data.get("created_at") or now,
+                last_updated=story_data.get("last_updated") or now,
+                world_description=story_data.get("world_description", ""),
+                character_description=story_data.get("character_description", ""),
+            ))
+            self._replace_messages(conn, story_data["id"], 0, story_data.get("chat_history") or [])
+            if story_data.get("character") is not None:
+                self._set_character(conn, story_data["id"], story_data["character"])
+        return {"success": True, "message": "Story imported successfully"}
+
+    def get_story(self, username: str, story_id: str) -> Dict[str, Any]:
+        try:
+            with self.engine.connect() as conn:
+                story = conn.execute(select(stories_table).where(and_(
+                    stories_table.c.id == story_id, stories_table.c.owner == username.lower()
+                ))).first()
+                if story is None:
+                    return {"success": False, "message": "Story not found"}
+                rows = conn.execute(
+                    select(messages_table).where(messages_table.c.story_id == story_id).order_by(messages_table.c.seq)
+                ).all()
+                character = conn.execute(
+                    select(characters_table.c.data).where(characters_table.c.story_id == story_id)
+                ).scalar()
+            story_data = {
+                "id": story.id,
+                "created_at": story.created_at,
+                "last_updated": story.last_updated,
+                "world_description": story.world_description,
+                "character_description": story.character_description,
+                "chat_history": [_message_from_row(row) for row in rows],
+            }
+            if character is not None:
+                story_data["character"] = json.loads(character)
+            return {"success": True, "story_data": story_data}
+        except Exception as e:
+            return {"success": False, "message": f"Error retrieving story: {str(e)}"}
+
+    def get_history_page(self, username: str, story_id: str, before: Optional[int] = None,
+                         limit: int = HISTORY_PAGE_SIZE, include_tools: bool = False) -> Dict[str, Any]:
+        try:
+            with self.engine.connect() as conn:
+                owner = conn.execute(select(stories_table.c.owner).where(stories_table.c.id == story_id)).scalar()
+                if owner != username.lower():
+                    return {"success": False, "message": "Story not found"}
+                query = select(messages_table).where(messages_table.c.story_id == story_id,
+                                                     _visible_messages(include_tools))
+                if before is not None:
+                    query = query.where(messages_table.c.seq < before)
+                rows = conn.execute(query.order_by(messages_table.c.seq.desc()).limit(limit + 1)).all()
+            return history_page([dict(_message_from_row(row), seq=row.seq) for row in rows], limit)
+        except Exception as e:
+            return {"success": False, "message": f"Error retrieving history: {str(e)}"}
+
+    def find_story_owner(self, story_id: str) -> Optional[str]:
+        with self.engine.connect() as conn:
+            return conn.execute(select(stories_table.c.owner).where(stories_table.c.id == story_id)).scalar()
+
+    def _touch(self, conn, story_id: str) -> bool:
+        result = conn.execute(
+            update(stories_table).where(stories_table.c.id == story_id)
+            .values(last_updated=datetime.now().isoformat())
+        )
+        return result.rowcount > 0
+
+    def _replace_messages(self, conn, story_id: str, start: int, new_messages: List[Dict[str, Any]]):
+        conn.execute(delete(messages_table).where(and_(messages_table.c.story_id == story_id, messages_table.c.seq >= start)))
+        if new_messages:
+            conn.execute(insert(messages_table), [
+                _message_row(story_id, start + i, msg) for i, msg in enumerate(new_messages)
+            ])
+
+    def _set_character(self, conn, story_id: str, character: Dict[str, Any]):
+        now = datetime.now().isoformat()
+        data = json.dumps(character)
+        updated = conn.execute(
+            update(characters_table).where(characters_table.c.story_id == story_id).values(data=data, updated_at=now)
+        )
+        if updated.rowcount == 0:
+            conn.execute(insert(characters_table).values(story_id=story_id, data=data, updated_at=now))
+
+    def update_story(self, username: str, story_id: str, chat_history: List) -> Dict[str, Any]:
+        try:
+            with self.engine.begin() as conn:
+                if not self._touch(conn, story_id):
+                    return {"success": False, "message": "Story not found"}
+                self._replace_messages(conn, story_id, 0, chat_history)
+            return {"success": True, "message": "Story updated successfully"}
+        except Exception as e:
+            return {"success": False, "message": f"Error updating story: {str(e)}"}
+
+    def update_story_with_character(self, username: str, story_id: str, story_update: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            with self.engine.begin() as conn:
+                if not self._touch(conn, story_id):
+                    return {"success": False, "message": "Story not found"}
+                self._replace_messages(conn, story_id, 0, story_update.get("chat_history") or [])
+                if story_update.get("character") is not None:
+                    self._set_character(conn, story_id, story_update["character"])
+            return {"success": True, "message": "Story updated successfully"}
+        except Exception as e:
+            logger.error("Error updating story %s: %s", story_id, e)
+            return {"success": False, "message": f"Error updating story: {str(e)}"}
+
+    def append_story_changes(self, username: str, story_id: str, start: int, messages: List[Dict[str, Any]],
+                             character: Optional[Dict[str, Any]] = None, truncate: bool = False) -> Dict[str, Any]:
+        try:
+            with self.engine.begin() as conn:
+                if not self._touch(conn, story_id):
+                    return {"success": False, "message": "Story not found"}
+                # Deleting from `start` drops both replaced and truncated messages
+                if messages or truncate:
+                    self._replace_messages(conn, story_id, start, messages)
+                if character is not None:
+                    self._set_character(conn, story_id, character)
+            return {"success": True, "message": "Story updated successfully"}
+        except Exception as e:
+            logger.error("Error updating story %s: %s", story_id, e)
+            return {"success": False, "message": f"Error updating story: {str(e)}"}
+
+    def delete_story(self, username: str, story_id: str) -> Dict[str, Any]:
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(delete(stories_table).where(and_(
+                    stories_table.c.id == story_id, stories_table.c.owner == username.lower()
+                )))
+            return {"success": True}
+        except Exception as e:
+            logger.error("Error deleting story %s: %s", story_id, e)
+            return {"success": False, "message": str(e)}
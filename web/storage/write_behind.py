@@ -0,0 +1,127 @@
+"""
+Write-behind save scheduler.
+
+Routes call `save_scheduler.request_save(session)` whenever a session may have
+changed. Requests made within SAVE_COALESCE_WINDOW seconds of each other are
+merged into a single write, clean sessions are not written at all, and
+pending saves are flushed on disconnect, eviction and server shutdown.
+"""
+import os
+import time
+import asyncio
+import weakref
+from collections import deque
+from typing import Dict, Any
+
+from web.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds to wait after the first save request before writing, merging later requests
+SAVE_COALESCE_WINDOW = float(os.environ.get("SAVE_COALESCE_WINDOW", "0.5"))
+# Durations of the latest writes, kept for the percentiles in stats()
+SAVE_LATENCY_SAMPLES = 1000
+
+
+class SaveScheduler:
+    def __init__(self, window: float = SAVE_COALESCE_WINDOW):
+        self.window = window
+        self._pending: Dict[str, asyncio.Task] = {}
+        # Writes running now; a flush waits for them, as the session is no longer dirty once one starts
+        self._writing: Dict[str, asyncio.Task] = {}
+        self._sessions = weakref.WeakValueDictionary()
+        self.saves_requested = 0
+        self.saves_written = 0
+        self.saves_skipped = 0
+        self.save_errors = 0
+        self._latencies = deque(maxlen=SAVE_LATENCY_SAMPLES)
+
+    def request_save(self, session):
+        """Schedules a save of `session`, merging it with any save already pending."""
+        self.saves_requested += 1
+        self._sessions[session.session_id] = session
+        if session.session_id in self._pending:
+            return
+        self._pending[session.session_id] = asyncio.create_task(self._delayed_save(session))
+
+    async def _delayed_save(self, session):
+        try:
+            await asyncio.sleep(self.window)
+        except asyncio.CancelledError:
+            return
+        # Once writing starts the save is no longer pending; a flush waits for it in _writing
+        self._pending.pop(session.session_id, None)
+        await self._save_now(session)
+
+    async def _save_now(self, session):
+        """Waits for a write of `session` already running, then writes whatever changed since."""
+        running = self._writing.get(session.session_id)
+        if running is not None:
+            # Shielded: a caller going away must not abort a write half way
+            await asyncio.shield(running)
+        await asyncio.shield(self._writer(session))
+
+    def _writer(self, session) -> asyncio.Task:
+        """The running write of `session`, started if there is none."""
+        session_id = session.session_id
+        task = self._writing.get(session_id)
+        if task is None:
+            task = self._writing[session_id] = asyncio.create_task(self._write(session))
+
+            def done(finished):
+                if self._writing.get(session_id) is finished:
+                    del self._writing[session_id]
+            task.add_done_callback(done)
+        return task
+
+    async def _write(self, session):
+        if not session.dirty:
+            self.saves_skipped += 1
+            return
+        start = time.perf_counter()
+        try:
+            result = await session.save_session()
+        except Exception as e:
+            self.save_errors += 1
+            logger.error("Error saving session %s: %s", session.session_id, e)
+            return
+        if result is None:
+            self.saves_skipped += 1
+        elif result.get("success"):
+            self.saves_written += 1
+            self._latencies.append(time.perf_counter() - start)
+        else:
+            self.save_errors += 1
+
+    async def flush(self, session):
+        """
+        Writes `session` now if it has unsaved changes, cancelling its pending save.
+        Returns once every change made before the call is in storage, including
+        one a save already running is writing.
+        """
+        task = self._pending.pop(session.session_id, None)
+        if task is not None:
+            task.cancel()
+        await self._save_now(session)
+
+    async def flush_all(self):
+        """Flushes every known session, e.g. on server shutdown."""
+        for session in list(self._sessions.values()):
+            await self.flush(session)
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+        return {
+            "saves_requested": self.saves_requested,
+            "saves_written": self.saves_written,
+            "saves_skipped": self.saves_skipped,
+            "save_errors": self.save_errors,
+            "saves_pending": len(self._pending),
+            "saves_writing": len(self._writing),
+            "save_p50_ms": round(latencies[len(latencies) // 2] * 1000, 3) if latencies else 0.0,
+            "save_p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 3) if latencies else 0.0,
+            "save_max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        }
+
+
+save_scheduler = SaveScheduler()
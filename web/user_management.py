@@ -1,12 +1,11 @@
 import os
-import json
 import hashlib
 from typing import Dict, List, Optional, Any, Union
-import uuid
-from datetime import datetime
+
+from web.storage.backend import get_storage
 
 # Path to the users directory
-USERS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "users")
+USERS_DIR = os.environ.get("USERS_DIR") or os.path.join(os.path.dirname(os.path.dirname(__file__)), "users")
 
 def ensure_user_directories():
     """Ensure the users directory exists"""
@@ -30,31 +29,7 @@ def register_user(username: str, password: str) -> Dict[str, Any]:
     Returns:
         Dict with status and message
     """
-    ensure_user_directories()
-    
-    # Check if username already exists
-    user_file = os.path.join(USERS_DIR, f"{username.lower()}.json")
-    if os.path.exists(user_file):
-        return {"success": False, "message": "Username already exists"}
-    
-    # Create user data
-    user_data = {
-        "username": username,
-        "password_hash": hash_password(password),
-        "created_at": datetime.now().isoformat(),
-        "stories": []
-    }
-    
-    # Create user directory
-    user_dir = os.path.join(USERS_DIR, username.lower())
-    if not os.path.exists(user_dir):
-        os.makedirs(user_dir)
-    
-    # Save user data
-    with open(user_file, "w") as f:
-        json.dump(user_data, f, indent=2)
-    
-    return {"success": True, "message": "User registered successfully"}
+    return get_storage().create_user(username, hash_password(password))
 
 
 def authenticate_user(username: str, password: str) -> Dict[str, Any]:
@@ -68,14 +43,10 @@ def authenticate_user(username: str, password: str) -> Dict[str, Any]:
     Returns:
         Dict with status and message
     """
-    user_file = os.path.join(USERS_DIR, f"{username.lower()}.json")
-    
-    if not os.path.exists(user_file):
-        return {"success": False, "message": "Invalid username or password"}
-    
     try:
-        with open(user_file, "r") as f:
-            user_data = json.load(f)
+        user_data = get_storage().get_user(username)
+        if user_data is None:
+            return {"success": False, "message": "Invalid username or password"}
         
         if user_data["password_hash"] == hash_password(password):
             return {"success": True, "message": "Login successful", "user_data": user_data}
@@ -89,24 +60,7 @@ def get_user_stories(username: str) -> List[Dict[str, Any]]:
     """
     Get all stories for a user, only returning those with an existing story file.
     """
-    user_file = os.path.join(USERS_DIR, f"{username.lower()}.json")
-    user_dir = os.path.join(USERS_DIR, username.lower())
-
-    if not os.path.exists(user_file):
-        return []
-
-    try:
-        with open(user_file, "r") as f:
-            user_data = json.load(f)
-        stories = user_data.get("stories", [])
-        filtered_stories = []
-        for story in stories:
-            story_file = os.path.join(user_dir, f"{story['id']}.json")
-            if os.path.exists(story_file):
-                filtered_stories.append(story)
-        return filtered_stories
-    except Exception:
-        return []
+    return get_storage().get_user_stories(username)
 
 
 def create_story(username: str, world_description: str, character_description: str) -> Dict[str, Any]:
@@ -121,52 +75,7 @@ def create_story(username: str, world_description: str, character_description: s
     Returns:
         Dict with status and story data
     """
-    user_file = os.path.join(USERS_DIR, f"{username.lower()}.json")
-    
-    if not os.path.exists(user_file):
-        return {"success": False, "message": "User not found"}
-    
-    try:
-        # Generate a unique ID for the story
-        story_id = str(uuid.uuid4())
-        
-        # Create story data
-        story_data = {
-            "id": story_id,
-            "created_at": datetime.now().isoformat(),
-            "last_updated": datetime.now().isoformat(),
-            "world_description": world_description,
-            "character_description": character_description,
-            "chat_history": []
-        }
-        
-        # Create story directory if it doesn't exist
-        user_dir = os.path.join(USERS_DIR, username.lower())
-        if not os.path.exists(user_dir):
-            os.makedirs(user_dir)
-        
-        # Save story data
-        story_file = os.path.join(user_dir, f"{story_id}.json")
-        with open(story_file, "w") as f:
-            json.dump(story_data, f, indent=2)
-        
-        # Update user data with new story
-        with open(user_file, "r") as f:
-            user_data = json.load(f)
-        
-        user_data["stories"].append({
-            "id": story_id,
-            "created_at": story_data["created_at"],
-            "last_updated": story_data["last_updated"],
-            "world_description": world_description[:50] + "..." if len(world_description) > 50 else world_description
-        })
-        
-        with open(user_file, "w") as f:
-            json.dump(user_data, f, indent=2)
-        
-        return {"success": True, "message": "Story created successfully", "story_data": story_data}
-    except Exception as e:
-        return {"success": False, "message": f"Error creating story: {str(e)}"}
+    return get_storage().create_story(username, world_description, character_description)
 
 
 def get_story(username: str, story_id: str) -> Dict[str, Any]:
@@ -180,18 +89,7 @@ def get_story(username: str, story_id: str) -> Dict[str, Any]:
     Returns:
         Dict with story data or error message
     """
-    story_file = os.path.join(USERS_DIR, username.lower(), f"{story_id}.json")
-    
-    if not os.path.exists(story_file):
-        return {"success": False, "message": "Story not found"}
-    
-    try:
-        with open(story_file, "r") as f:
-            story_data = json.load(f)
-        
-        return {"success": True, "story_data": story_data}
-    except Exception as e:
-        return {"success": False, "message": f"Error retrieving story: {str(e)}"}
+    return get_storage().get_story(username, story_id)
 
 
 def update_story(username: str, story_id: str, chat_history: List) -> Dict[str, Any]:
@@ -206,35 +104,18 @@ def update_story(username: str, story_id: str, chat_history: List) -> Dict[str,
     Returns:
         Dict with status and message
     """
-    story_file = os.path.join(USERS_DIR, username.lower(), f"{story_id}.json")
-    
-    if not os.path.exists(story_file):
-        return {"success": False, "message": "Story not found"}
+    return get_storage().update_story(username, story_id, chat_history)
+
+
+def delete_story(username: str, story_id: str) -> Dict[str, Any]:
+    """
+    Delete a story and remove it from the user's story list
     
-    try:
-        with open(story_file, "r") as f:
-            story_data = json.load(f)
-        
-        # Update chat history and last_updated
-        story_data["chat_history"] = chat_history
-        story_data["last_updated"] = datetime.now().isoformat()
-        
-        with open(story_file, "w") as f:
-            json.dump(story_data, f, indent=2)
-        
-        # Also update the last_updated in the user's stories list
-        user_file = os.path.join(USERS_DIR, f"{username.lower()}.json")
-        with open(user_file, "r") as f:
-            user_data = json.load(f)
-        
-        for story in user_data["stories"]:
-            if story["id"] == story_id:
-                story["last_updated"] = story_data["last_updated"]
-                break
-        
-        with open(user_file, "w") as f:
-            json.dump(user_data, f, indent=2)
+    Args:
+        username: The username
+        story_id: The story ID
         
-        return {"success": True, "message": "Story updated successfully"}
-    except Exception as e:
-        return {"success": False, "message": f"Error updating story: {str(e)}"}
+    Returns:
+        Dict with status and message
+    """
+    return get_storage().delete_story(username, story_id)
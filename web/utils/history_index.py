@@ -0,0 +1,222 @@
+"""
+Offset index over a JSON story's chat history, for reading pages of it.
+
+Next to each story file the JSON backend keeps `<story>.history.jsonl`,
+one serialized message per line, and `<story>.history.idx`, the byte
+offset of each line as 8-byte unsigned integers. Reading the messages
+before a given position seeks straight to them, so a page costs the size
+of the page rather than the size of the story.
+
+The index is a cache of the story file and journal, which stay
+authoritative. It is rebuilt from the story when it is missing, and
+dropped whenever an update to it fails.
+
+Every worker process may read a story's history while the one holding its
+lease updates it, so index reads and writes also hold `<story>.history.lock`
+(an flock, where the platform has one).
+"""
+import os
+import json
+import uuid
+import threading
+from array import array
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # No flock (Windows): index access is only serialized within the process
+    fcntl = None
+
+# Messages read from disk per step while scanning back for visible ones
+SCAN_BLOCK = 64
+
+# Index reads and writes run on the storage I/O threads; one at a time, so no read sees a half-done update
+_lock = threading.RLock()
+# Lock files held by the thread owning _lock, with their nesting depth (flock is not reentrant)
+_held: Dict[str, list] = {}
+
+
+def index_paths(story_file: str) -> Tuple[str, str]:
+    base, _ = os.path.splitext(story_file)
+    return f"{base}.history.jsonl", f"{base}.history.idx"
+
+
+def lock_path(story_file: str) -> str:
+    base, _ = os.path.splitext(story_file)
+    return f"{base}.history.lock"
+
+
+@contextmanager
+def _locked(story_file: str):
+    """Holds the story's index against the other threads and worker processes."""
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        path = lock_path(story_file)
+        held = _held.get(path)
+        if held is not None:
+            held[1] += 1
+            try:
+                yield
+            finally:
+                held[1] -= 1
+            return
+        f = open(path, "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            _held[path] = [f, 1]
+            try:
+                yield
+            finally:
+                del _held[path]
+        finally:
+            # Closing the file releases the flock
+            f.close()
+
+
+def has_index(story_file: str) -> bool:
+    return all(os.path.exists(path) for path in index_paths(story_file))
+
+
+def drop_index(story_file: str, deleted: bool = False):
+    """
+    Removes the index; it is rebuilt from the story on the next read.
+
+    Args:
+        story_file: Path to the story snapshot file
+        deleted: The story itself was deleted; its lock file goes too
+    """
+    with _locked(story_file):
+        for path in index_paths(story_file):
+            if os.path.exists(path):
+                os.remove(path)
+    if deleted and os.path.exists(lock_path(story_file)):
+        os.remove(lock_path(story_file))
+
+
+def _count(idx_path: str) -> int:
+    return os.path.getsize(idx_path) // 8
+
+
+def _offsets(idx_path: str, start: int, stop: int) -> array:
+    offsets = array("Q")
+    with open(idx_path, "rb") as f:
+        f.seek(start * 8)
+        offsets.frombytes(f.read((stop - start) * 8))
+    return offsets
+
+
+def rebuild_index(story_file: str, history: List[Dict[str, Any]]):
+    """Writes the index for a full chat history."""
+    with _locked(story_file):
+        data_path, idx_path = index_paths(story_file)
+        # Names of this writer's own, so no other process can swap in a half-written file
+        suffix = f".{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        offsets = array("Q")
+        position = 0
+        try:
+            with open(data_path + suffix, "wb") as f:
+                for message in history:
+                    line = (json.dumps(message) + "\n").encode("utf-8")
+                    offsets.append(position)
+                    f.write(line)
+                    position += len(line)
+            with open(idx_path + suffix, "wb") as f:
+                offsets.tofile(f)
+            os.replace(data_path + suffix, data_path)
+            os.replace(idx_path + suffix, idx_path)
+        finally:
+            for path in (data_path + suffix, idx_path + suffix):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def ensure_index(story_file: str, load_history: Callable[[], List[Dict[str, Any]]]):
+    """Builds the index from `load_history()` if the story has none."""
+    # Loading under the lock means a save either lands before the load or updates the new index
+    with _locked(story_file):
+        if not has_index(story_file):
+            rebuild_index(story_file, load_history())
+
+
+def update_index(story_file: str, start: int, messages: List[Dict[str, Any]], truncate: bool = False):
+    """
+    Applies an appended save to the index: saved messages from `start` on are
+    replaced by `messages` (and dropped if there are none and `truncate` is set).
+
+    Does nothing if the story has no index yet; it is built on the first read.
+    """
+    with _locked(story_file):
+        if not has_index(story_file):
+            return
+        data_path, idx_path = index_paths(story_file)
+        try:
+            count = _count(idx_path)
+            if start > count:
+                # The index missed earlier saves; rebuild it from the story on the next read
+                drop_index(story_file)
+                return
+            if start < count and (messages or truncate):
+                cut = _offsets(idx_path, start, start + 1)[0]
+                with open(data_path, "r+b") as f:
+                    f.truncate(cut)
+                with open(idx_path, "r+b") as f:
+                    f.truncate(start * 8)
+            if not messages:
+                return
+            position = os.path.getsize(data_path)
+            offsets = array("Q")
+            lines = []
+            for message in messages:
+                line = (json.dumps(message) + "\n").encode("utf-8")
+                offsets.append(position)
+                lines.append(line)
+                position += len(line)
+            with open(data_path, "ab") as f:
+                f.write(b"".join(lines))
+            with open(idx_path, "ab") as f:
+                offsets.tofile(f)
+        except Exception:
+            drop_index(story_file)
+            raise
+
+
+def read_page(story_file: str, before: Optional[int], limit: int,
+              keep: Callable[[Dict[str, Any]], bool]) -> List[Dict[str, Any]]:
+    """
+    Reads up to `limit` + 1 messages before position `before`, newest first; the
+    extra one tells whether there is an older page.
+
+    Args:
+        story_file: Path to the story snapshot file
+        before: Position to read back from (exclusive); None for the end of the history
+        limit: Page size
+        keep: Filter applied to each message; rejected messages do not count against `limit`
+
+    Returns:
+        The messages, each with its position as "seq"
+    """
+    with _locked(story_file):
+        data_path, idx_path = index_paths(story_file)
+        count = _count(idx_path)
+        stop = count if before is None else max(0, min(before, count))
+        page = []
+        with open(data_path, "rb") as data:
+            while stop > 0 and len(page) <= limit:
+                start = max(0, stop - SCAN_BLOCK)
+                offsets = _offsets(idx_path, start, stop)
+                data.seek(offsets[0])
+                end = _offsets(idx_path, stop, stop + 1)[0] if stop < count else None
+                block = data.read() if end is None else data.read(end - offsets[0])
+                lines = block.split(b"\n")
+                for seq in range(stop - 1, start - 1, -1):
+                    message = json.loads(lines[seq - start])
+                    if keep(message):
+                        page.append(dict(message, seq=seq))
+                        if len(page) > limit:
+                            break
+                stop = start
+        return page
@@ -0,0 +1,124 @@
+"""
+Leveled logging for the web app, on top of the standard logging module.
+
+Modules log through `get_logger(__name__)` with %-style arguments, which are
+only formatted when a record is actually emitted; anything costly to build
+for a message goes behind `logger.isEnabledFor(...)`. Levels are set for
+every `web.*` logger at once and per module (a prefix of logger names):
+
+    LOG_LEVEL=INFO
+    LOG_LEVELS=web.storage=DEBUG,web.game.session=WARNING
+
+Hot paths are sampled per logger: LOG_SAMPLE=web.game.executor=10 keeps one
+in ten of that logger's records below WARNING, counted per call site.
+Warnings and errors are always kept.
+"""
+import os
+import sys
+import logging
+import threading
+from typing import Dict, Optional
+
+# Level of every web.* logger without a level of its own
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+# Per module levels, "logger.name=LEVEL,..."
+LOG_LEVELS = os.environ.get("LOG_LEVELS", "")
+# Per logger sampling of records below WARNING, "logger.name=N,..." keeps one in N
+LOG_SAMPLE = os.environ.get("LOG_SAMPLE", "web.game.executor=10,web.game.session=100")
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+ROOT_LOGGER = "web"
+
+_lock = threading.Lock()
+_configured = False
+# Loggers given a level or a sampler by the last configure(), to undo on the next one
+_tuned: Dict[str, Optional["SampleFilter"]] = {}
+
+
+def parse_settings(value: str) -> Dict[str, str]:
+    """Parses "name=value,name=value" settings."""
+    settings = {}
+    for item in value.split(","):
+        name, separator, setting = item.partition("=")
+        if separator and name.strip():
+            settings[name.strip()] = setting.strip()
+    return settings
+
+
+class StderrHandler(logging.StreamHandler):
+    """Writes to whatever sys.stderr is when a record is emitted, even if it was replaced since."""
+
+    def __init__(self):
+        super().__init__(sys.stderr)
+
+    @property
+    def stream(self):
+        return sys.stderr
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class SampleFilter(logging.Filter):
+    """Keeps the first and then one in `every` records below WARNING of each call site."""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self._seen: Dict[tuple, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.every == 1:
+            return True
+        site = (record.pathname, record.lineno)
+        seen = self._seen.get(site, 0)
+        self._seen[site] = seen + 1
+        return seen % self.every == 0
+
+
+def configure(level: Optional[str] = None, levels: Optional[str] = None, sample: Optional[str] = None,
+              stream=None):
+    """
+    Applies the logging settings, replacing earlier ones.
+
+    Args:
+        level: Level of every web.* logger; defaults to LOG_LEVEL
+        levels: Per module levels; defaults to LOG_LEVELS
+        sample: Per logger sampling; defaults to LOG_SAMPLE
+        stream: Where records are written; defaults to stderr
+    """
+    global _configured
+    with _lock:
+        root = logging.getLogger(ROOT_LOGGER)
+        for handler in [h for h in root.handlers if getattr(h, "web_handler", False)]:
+            root.removeHandler(handler)
+        handler = logging.StreamHandler(stream) if stream is not None else StderrHandler()
+        handler.web_handler = True
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        root.addHandler(handler)
+        root.setLevel((level or LOG_LEVEL).upper())
+        # The app's records are written once, here, whatever the server configures for the root logger
+        root.propagate = False
+
+        for name, sampler in _tuned.items():
+            logger = logging.getLogger(name)
+            logger.setLevel(logging.NOTSET)
+            if sampler is not None:
+                logger.removeFilter(sampler)
+        _tuned.clear()
+        for name, module_level in parse_settings(LOG_LEVELS if levels is None else levels).items():
+            logging.getLogger(name).setLevel(module_level.upper())
+            _tuned[name] = None
+        for name, every in parse_settings(LOG_SAMPLE if sample is None else sample).items():
+            sampler = SampleFilter(int(every))
+            logging.getLogger(name).addFilter(sampler)
+            _tuned[name] = sampler
+        _configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    """The logger for a module (pass `__name__`); applies the settings from the environment once."""
+    if not _configured:
+        configure()
+    return logging.getLogger(name)
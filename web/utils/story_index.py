@@ -0,0 +1,168 @@
+"""
+Persistent story id -> owner index.
+
+The index is an append-only log in USERS_DIR so that finding the owner of a
+story never requires listing every user. Rebuild it for an existing tree with:
+
+    python -m web.utils.story_index rebuild
+"""
+import os
+import sys
+import json
+import threading
+from typing import Dict, Optional, Any
+
+from web.user_management import USERS_DIR
+
+INDEX_FILE = os.path.join(USERS_DIR, ".story_index.jsonl")
+
+_entries: Dict[str, Dict[str, str]] = {}
+_offset = 0
+# (device, inode) of the index file _offset belongs to; a rebuild replaces the file
+_file_id = None
+_loaded = False
+_lock = threading.Lock()
+
+
+def _apply(record: Dict[str, Any]):
+    if record.get("op") == "put":
+        _entries[record["id"]] = {"username": record["username"], "path": record["path"]}
+    elif record.get("op") == "del":
+        _entries.pop(record["id"], None)
+
+
+def _read_tail():
+    """Applies index records written since the last read (possibly by another worker)."""
+    global _offset, _file_id
+    if not os.path.exists(INDEX_FILE):
+        return
+    with open(INDEX_FILE, "rb") as f:
+        stat = os.fstat(f.fileno())
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id != _file_id or stat.st_size < _offset:
+            # Rebuilt (possibly by another process) since the last read; our offset means nothing in it
+            _entries.clear()
+            _offset = 0
+            _file_id = file_id
+        f.seek(_offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                # Partial record still being written
+                break
+            _offset += len(line)
+            try:
+                _apply(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+
+
+def _ensure_loaded():
+    global _loaded
+    if _loaded:
+        return
+    if not os.path.exists(INDEX_FILE):
+        rebuild_index()
+    _read_tail()
+    _loaded = True
+
+
+def _append(record: Dict[str, Any]):
+    os.makedirs(USERS_DIR, exist_ok=True)
+    with open(INDEX_FILE, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def add_story(story_id: str, username: str):
+    """Records `username` as the owner of `story_id`."""
+    record = {
+        "op": "put",
+        "id": story_id,
+        "username": username.lower(),
+        "path": os.path.join(username.lower(), f"{story_id}.json"),
+    }
+    with _lock:
+        _ensure_loaded()
+        _append(record)
+        _read_tail()
+
+
+def remove_story(story_id: str):
+    """Removes a deleted story from the index."""
+    with _lock:
+        _ensure_loaded()
+        _append({"op": "del", "id": story_id})
+        _read_tail()
+
+
+def find_story(story_id: str) -> Optional[Dict[str, str]]:
+    """
+    Looks up a story by id.
+
+    Returns:
+        Dict with the owner's username and the absolute story file path, or None
+    """
+    with _lock:
+        _ensure_loaded()
+        entry = _entries.get(story_id)
+        if entry is None:
+            # Another worker may have created it since we last looked
+            _read_tail()
+            entry = _entries.get(story_id)
+    if entry is None:
+        return None
+    return {"username": entry["username"], "path": os.path.join(USERS_DIR, entry["path"])}
+
+
+def find_story_owner(story_id: str) -> Optional[str]:
+    """Returns the username owning `story_id`, or None if it is unknown."""
+    entry = find_story(story_id)
+    return entry["username"] if entry else None
+
+
+def rebuild_index() -> int:
+    """
+    Rebuilds the index from the story files on disk.
+
+    Returns:
+        Number of indexed stories
+    """
+    global _offset, _file_id
+    records = []
+    if os.path.isdir(USERS_DIR):
+        for user_file in sorted(os.listdir(USERS_DIR)):
+            if not user_file.endswith(".json") or user_file.startswith("."):
+                continue
+            username = user_file[:-5]
+            user_dir = os.path.join(USERS_DIR, username)
+            if not os.path.isdir(user_dir):
+                continue
+            for story_file in sorted(os.listdir(user_dir)):
+                if not story_file.endswith(".json"):
+                    continue
+                story_id = story_file[:-5]
+                records.append({
+                    "op": "put",
+                    "id": story_id,
+                    "username": username,
+                    "path": os.path.join(username, story_file),
+                })
+    os.makedirs(USERS_DIR, exist_ok=True)
+    tmp_file = f"{INDEX_FILE}.tmp"
+    with open(tmp_file, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    os.replace(tmp_file, INDEX_FILE)
+    _entries.clear()
+    _offset = 0
+    _file_id = None
+    return len(records)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python -m web.utils.story_index rebuild")
+        sys.exit(1)
+    with _lock:
+        count = rebuild_index()
+        _read_tail()
+    print(f"Indexed {count} stories in {INDEX_FILE}")
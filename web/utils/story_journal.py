@@ -0,0 +1,150 @@
+import os
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+
+# Number of journal records after which the story snapshot is rewritten
+# and the journal truncated.
+JOURNAL_COMPACT_EVERY = int(os.environ.get("STORY_JOURNAL_COMPACT_EVERY", "200"))
+
+# Whether journal appends are fsynced before a save is reported as written
+JOURNAL_FSYNC = os.environ.get("STORY_JOURNAL_FSYNC", "1") == "1"
+
+# Cached record count per journal file, so appends never have to re-read the log
+_record_counts: Dict[str, int] = {}
+
+
+def journal_path(story_file: str) -> str:
+    """Returns the journal file that belongs to a story snapshot file."""
+    base, _ = os.path.splitext(story_file)
+    return f"{base}.journal.jsonl"
+
+
+def atomic_write_json(path: str, data: Dict[str, Any]):
+    """
+    Writes JSON atomically: to a temporary file that is fsynced and then
+    renamed over `path`, so readers see either the old or the new content.
+    """
+    tmp_file = f"{path}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+
+
+def message_record(seq: int, message: Dict[str, Any]) -> Dict[str, Any]:
+    """Journal record for a single chat message at position `seq`."""
+    return {"op": "message", "seq": seq, **message}
+
+
+def truncate_record(seq: int) -> Dict[str, Any]:
+    """Journal record dropping every message from position `seq` onwards."""
+    return {"op": "truncate", "seq": seq}
+
+
+def character_record(character: Dict[str, Any]) -> Dict[str, Any]:
+    """Journal record replacing the saved character data."""
+    return {"op": "character", "data": character}
+
+
+def _count_records(path: str) -> int:
+    if path not in _record_counts:
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                _record_counts[path] = sum(1 for _ in f)
+        else:
+            _record_counts[path] = 0
+    return _record_counts[path]
+
+
+def apply_record(story_data: Dict[str, Any], record: Dict[str, Any]):
+    """Applies one journal record to an in-memory story."""
+    history = story_data.setdefault("chat_history", [])
+    op = record.get("op")
+    if op == "message":
+        seq = record["seq"]
+        message = {k: v for k, v in record.items() if k not in ("op", "seq", "ts")}
+        # A record always describes the message at `seq`; anything after it is stale
+        del history[seq:]
+        history.append(message)
+    elif op == "truncate":
+        del history[record["seq"]:]
+    elif op == "character":
+        story_data["character"] = record.get("data")
+    if "ts" in record:
+        story_data["last_updated"] = record["ts"]
+
+
+def replay_journal(story_data: Dict[str, Any], path: str) -> Dict[str, Any]:
+    """Replays the journal at `path` on top of a loaded snapshot."""
+    if not os.path.exists(path):
+        return story_data
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn final line from an interrupted append; nothing after it is valid
+                break
+            apply_record(story_data, record)
+    return story_data
+
+
+def load_story_file(story_file: str) -> Optional[Dict[str, Any]]:
+    """
+    Loads a story from its snapshot and replays the journal tail.
+
+    Returns:
+        The story data, or None if the story does not exist.
+    """
+    if not os.path.exists(story_file):
+        return None
+    with open(story_file, "r") as f:
+        story_data = json.load(f)
+    return replay_journal(story_data, journal_path(story_file))
+
+
+def compact_story_file(story_file: str):
+    """Folds the journal into the snapshot and truncates the journal."""
+    story_data = load_story_file(story_file)
+    if story_data is None:
+        return
+    atomic_write_json(story_file, story_data)
+    clear_journal(story_file)
+
+
+def clear_journal(story_file: str):
+    """Drops the journal of a story, e.g. after its snapshot was fully rewritten."""
+    path = journal_path(story_file)
+    if os.path.exists(path):
+        os.remove(path)
+    _record_counts[path] = 0
+
+
+def append_records(story_file: str, records: List[Dict[str, Any]]):
+    """
+    Appends records to the story journal, compacting it once it grows past
+    JOURNAL_COMPACT_EVERY records.
+
+    Args:
+        story_file: Path to the story snapshot file
+        records: Journal records to append
+    """
+    if not records:
+        return
+    path = journal_path(story_file)
+    count = _count_records(path)
+    ts = datetime.now().isoformat()
+    lines = "".join(json.dumps({**record, "ts": ts}) + "\n" for record in records)
+    with open(path, "a") as f:
+        f.write(lines)
+        if JOURNAL_FSYNC:
+            f.flush()
+            os.fsync(f.fileno())
+    _record_counts[path] = count + len(records)
+    if _record_counts[path] >= JOURNAL_COMPACT_EVERY:
+        compact_story_file(story_file)
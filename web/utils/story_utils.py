@@ -1,29 +1,69 @@
 import os
-import json
-from web.user_management import USERS_DIR
+from web.storage.backend import get_storage, HISTORY_PAGE_SIZE, HISTORY_PAGE_MAX
+
+# "journal" appends each change to the story, "snapshot" rewrites the whole story on every save
+STORY_SAVE_MODE = os.environ.get("STORY_SAVE_MODE", "journal")
+
+
+def load_story(username, story_id):
+    """
+    Loads a story with its full chat history. Returns None if it does not exist.
+    """
+    result = get_storage().get_story(username, story_id)
+    return result.get("story_data") if result.get("success") else None
+
+
+def find_story(story_id):
+    """
+    Finds a story by id alone.
+
+    Returns:
+        (username, story_data), or (None, None) if there is no such story
+    """
+    username = get_storage().find_story_owner(story_id)
+    if username is None:
+        return None, None
+    story_data = load_story(username, story_id)
+    if story_data is None:
+        return None, None
+    return username, story_data
+
 
 def update_story_with_character(username, story_id, story_update):
     """
     Updates the story file with character data and chat history.
     """
-    story_file = os.path.join(USERS_DIR, username.lower(), f"{story_id}.json")
-    print(f"Saving story to: {story_file}")
-    print(f"Character data: {story_update.get('character')}")
-    print(f"Chat history: {story_update.get('chat_history')}")
-    if not os.path.exists(story_file):
-        print("Story file does not exist at save time")
+    return get_storage().update_story_with_character(username, story_id, story_update)
+
+
+def append_story_changes(username, story_id, start, messages, character=None, truncate=False):
+    """
+    Appends changes to the story instead of rewriting it.
+
+    Args:
+        username: The username
+        story_id: The story ID
+        start: Position in the chat history of the first message in `messages`;
+            any previously saved message at or after it is replaced
+        messages: Serialized messages to store from `start` onwards
+        character: New character data, or None if it did not change
+        truncate: Whether saved messages past the new ones must be dropped
+    """
+    return get_storage().append_story_changes(username, story_id, start, messages, character, truncate)
+
+
+def get_history_page(story_id, before=None, limit=None, include_tools=False):
+    """
+    Returns one page of a story's visible messages, newest first.
+
+    Args:
+        story_id: The story ID
+        before: Cursor (next_cursor of the previous page), or None for the newest page
+        limit: Page size, capped at HISTORY_PAGE_MAX
+        include_tools: Also return the descriptive tool call messages
+    """
+    username = get_storage().find_story_owner(story_id)
+    if username is None:
         return {"success": False, "message": "Story not found"}
-    try:
-        with open(story_file, "r") as f:
-            story_data = json.load(f)
-        # Update character and chat_history
-        story_data["character"] = story_update.get("character")
-        story_data["chat_history"] = story_update.get("chat_history")
-        story_data["last_updated"] = story_data.get("last_updated")
-        with open(story_file, "w") as f:
-            json.dump(story_data, f, indent=2)
-        print("Story file after save:", json.dumps(story_data, indent=2))
-        return {"success": True, "message": "Story updated successfully"}
-    except Exception as e:
-        print(f"Error updating story: {e}")
-        return {"success": False, "message": f"Error updating story: {str(e)}"}
+    limit = max(1, min(limit or HISTORY_PAGE_SIZE, HISTORY_PAGE_MAX))
+    return get_storage().get_history_page(username, story_id, before, limit, include_tools)
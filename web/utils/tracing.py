@@ -0,0 +1,208 @@
+"""
+Per-turn spans, aggregated into histograms for the /metrics endpoint.
+
+Code under measurement wraps itself in `tracer.span(name, **tags)` (a
+context manager usable with `with` and `async with`) or reports a duration
+it measured itself with `tracer.observe(name, seconds, **tags)`. Every
+finished span is added to the `span_seconds` histogram of its name and tags,
+except the session tag, which would make one series per story. While a turn
+runs under `tracer.turn(session)`, its spans (with every tag) are also
+collected into `session.last_turn_trace`.
+
+With TRACING=0 `span` returns a shared no-op and `observe` returns at once.
+"""
+import os
+import re
+import time
+import bisect
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from web.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# Whether spans are recorded at all
+TRACING = os.environ.get("TRACING", "1") == "1"
+
+# Upper bounds (seconds) of the span histogram buckets
+SPAN_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Prefix of every exported metric name
+METRIC_PREFIX = "airpg_"
+_INVALID_NAME = re.compile(r"[^a-zA-Z0-9_]")
+
+# Spans of the turn being run in the current task (and the tasks it starts)
+_turn_spans: contextvars.ContextVar[Optional[List[Dict[str, Any]]]] = contextvars.ContextVar(
+    "turn_spans", default=None)
+
+
+def model_name(runnable) -> str:
+    """Name of the model behind a (possibly tool-bound) runnable."""
+    model = getattr(runnable, "bound", runnable)
+    return getattr(model, "model_name", None) or type(model).__name__
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("tracer", "name", "tags", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, tags: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.tags = tags
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.tags["error"] = exc_type.__name__
+        self.tracer.observe(self.name, time.perf_counter() - self.start, **self.tags)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+class Histogram:
+    """Bucket counts, sum and count of the observations of one series."""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * buckets
+        self.total = 0.0
+        self.count = 0
+
+
+class Tracer:
+    """
+    Args:
+        enabled: Record spans; when False every call is a no-op
+        buckets: Upper bounds of the histogram buckets, in seconds
+    """
+
+    def __init__(self, enabled: bool = TRACING, buckets: Tuple[float, ...] = SPAN_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        # (span name, sorted tags without the session) -> histogram
+        self._series: Dict[Tuple, Histogram] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def span(self, name: str, **tags):
+        """Times the block as span `name`."""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, tags)
+
+    def observe(self, name: str, seconds: float, **tags):
+        """Records a span measured by the caller."""
+        if not self.enabled:
+            return
+        spans = _turn_spans.get()
+        if spans is not None:
+            spans.append({"span": name, "ms": round(seconds * 1000, 3), **tags})
+        tags.pop("session", None)
+        key = (name, tuple(sorted((k, str(v)) for k, v in tags.items() if v is not None)))
+        histogram = self._series.get(key)
+        if histogram is None:
+            histogram = self._series[key] = Histogram(len(self.buckets) + 1)
+        histogram.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        histogram.total += seconds
+        histogram.count += 1
+
+    @contextmanager
+    def turn(self, session):
+        """Collects the spans of one turn into `session.last_turn_trace`, and times the turn."""
+        if not self.enabled:
+            yield
+            return
+        spans: List[Dict[str, Any]] = []
+        token = _turn_spans.set(spans)
+        try:
+            with self.span("turn", session=getattr(session, "session_id", None)):
+                yield
+        finally:
+            _turn_spans.reset(token)
+            session.last_turn_trace = spans
+
+    def register(self, name: str, collector: Callable[[], Dict[str, Any]]):
+        """Exports the numbers of `collector()` (e.g. a stats() method) as gauges named after `name`."""
+        self._collectors[name] = collector
+
+    def reset(self):
+        self._series.clear()
+
+    def exposition(self) -> str:
+        """Every span histogram and registered collector, in the Prometheus text format."""
+        lines = []
+        if self._series:
+            metric = f"{METRIC_PREFIX}span_seconds"
+            lines.append(f"# HELP {metric} Duration of traced spans.")
+            lines.append(f"# TYPE {metric} histogram")
+            for (name, tags), histogram in sorted(self._series.items()):
+                labels = (("span", name),) + tags
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+                lines.append(f"{metric}_bucket{format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{metric}_sum{format_labels(labels)} {histogram.total!r}")
+                lines.append(f"{metric}_count{format_labels(labels)} {histogram.count}")
+        for name, collector in self._collectors.items():
+            try:
+                values = collector()
+            except Exception as e:
+                logger.error("Error collecting %s metrics: %s", name, e)
+                continue
+            for key, value in flatten(values):
+                metric = f"{METRIC_PREFIX}{name}_{key}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def flatten(values: Dict[str, Any], prefix: str = ""):
+    """(name, number) pairs of a stats dict; nested dicts add their key to the name."""
+    for key, value in values.items():
+        name = _INVALID_NAME.sub("_", f"{prefix}{key}")
+        if isinstance(value, dict):
+            yield from flatten(value, f"{name}_")
+        elif isinstance(value, bool):
+            yield name, int(value)
+        elif isinstance(value, (int, float)):
+            yield name, value
+
+
+def format_labels(labels) -> str:
+    escaped = (
+        f'{key}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+tracer = Tracer()